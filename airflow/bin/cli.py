@@ -61,6 +61,7 @@ from airflow.models import (
 )
 from airflow.ti_deps.dep_context import (DepContext, SCHEDULER_DEPS)
 from airflow.utils import cli as cli_utils, db
+from airflow.utils.dag_file_cache import collect_dag_structures, get_dag_file_cache
 from airflow.utils.net import get_hostname
 from airflow.utils.log.logging_mixin import (LoggingMixin, redirect_stderr,
                                              redirect_stdout)
@@ -612,13 +613,22 @@ def rotate_fernet_key(args):
 
 @cli_utils.action_logging
 def list_dags(args):
-    dagbag = DagBag(process_subdir(args.subdir))
     s = textwrap.dedent("""\n
     -------------------------------------------------------------------
     DAGS
     -------------------------------------------------------------------
     {dag_list}
     """)
+    if get_dag_file_cache() and not args.report:
+        # Only the DAG IDs are needed, the unchanged files are not executed
+        dag_ids = [dag.dag_id for dag in collect_dag_structures(
+            process_subdir(args.subdir),
+            include_examples=conf.getboolean('core', 'LOAD_EXAMPLES'),
+            safe_mode=conf.getboolean('core', 'DAG_DISCOVERY_SAFE_MODE'))]
+        print(s.format(dag_list="\n".join(sorted(set(dag_ids)))))
+        return
+
+    dagbag = DagBag(process_subdir(args.subdir))
     dag_list = "\n".join(sorted(dagbag.dags))
     print(s.format(dag_list=dag_list))
     if args.report:
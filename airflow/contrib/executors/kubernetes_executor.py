@@ -22,6 +22,9 @@ from queue import Empty
 import re
 import json
 import multiprocessing
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 from dateutil import parser
 from uuid import uuid4
 import kubernetes
@@ -34,6 +37,7 @@ from airflow.contrib.kubernetes.worker_configuration import WorkerConfiguration
 from airflow.executors.base_executor import BaseExecutor
 from airflow.executors import Executors
 from airflow.models import KubeResourceVersion, KubeWorkerIdentifier, TaskInstance
+from airflow.settings import Stats
 from airflow.utils.state import State
 from airflow.utils.db import provide_session, create_session
 from airflow import configuration, settings
@@ -116,6 +120,43 @@ class KubernetesExecutorConfig:
         }
 
 
+class AdaptiveBatchSize(object):
+    """
+    Number of worker pods to create per sync. It is halved when the Kubernetes
+    API throttles pod creation (HTTP 429) or answers slower than the target
+    latency, and grows by a quarter when a full batch was created within it.
+
+    :param initial: the batch size to start with
+    :type initial: int
+    :param maximum: the largest batch size
+    :type maximum: int
+    :param target_latency: the slowest acceptable pod creation, in seconds
+    :type target_latency: float
+    """
+
+    def __init__(self, initial, maximum, target_latency):
+        self.maximum = max(1, initial, maximum)
+        self.value = min(max(1, initial), self.maximum)
+        self.target_latency = target_latency
+
+    def update(self, batch_size, latencies, throttled):
+        """
+        Adjust the batch size after a batch of pod creations.
+
+        :param batch_size: the number of pods the batch tried to create
+        :type batch_size: int
+        :param latencies: the latencies of the successful pod creations, in
+            seconds
+        :type latencies: list[float]
+        :param throttled: whether the API throttled any of the pod creations
+        :type throttled: bool
+        """
+        if throttled or (latencies and max(latencies) > self.target_latency):
+            self.value = max(1, self.value // 2)
+        elif batch_size >= self.value and len(latencies) == batch_size:
+            self.value = min(self.maximum, self.value + max(1, self.value // 4))
+
+
 class KubeConfig:
     core_section = 'core'
     kubernetes_section = 'kubernetes'
@@ -148,6 +189,12 @@ class KubeConfig:
             self.kubernetes_section, 'delete_worker_pods')
         self.worker_pods_creation_batch_size = conf.getint(
             self.kubernetes_section, 'worker_pods_creation_batch_size')
+        self.worker_pods_creation_max_batch_size = conf.getint(
+            self.kubernetes_section, 'worker_pods_creation_max_batch_size')
+        self.worker_pods_creation_target_latency = conf.getfloat(
+            self.kubernetes_section, 'worker_pods_creation_target_latency')
+        self.worker_pods_api_threads = conf.getint(
+            self.kubernetes_section, 'worker_pods_api_threads')
         self.worker_service_account_name = conf.get(
             self.kubernetes_section, 'worker_service_account_name')
         self.image_pull_secrets = conf.get(self.kubernetes_section, 'image_pull_secrets')
@@ -377,6 +424,113 @@ class KubernetesJobWatcher(multiprocessing.Process, LoggingMixin, object):
             )
 
 
+class KubernetesPodIndex(LoggingMixin):
+    """
+    In-memory index of the worker pods of this scheduler, by the dag_id, task_id
+    and execution_date labels of the pods. It is filled with a single list of the
+    pods on first use, then kept up to date with the pods this scheduler creates
+    and deletes and the pods the watcher reports, so that checking whether a
+    task instance has a pod does not need a call to the Kubernetes API.
+
+    :param kube_client: the Kubernetes client
+    :type kube_client: kubernetes.client.CoreV1Api
+    :param namespace: the namespace of the worker pods
+    :type namespace: str
+    :param worker_uuid: the UUID of this scheduler, set on its worker pods
+    :type worker_uuid: str
+    :param kube_client_request_args: extra arguments of the API calls
+    :type kube_client_request_args: dict
+    """
+
+    def __init__(self, kube_client, namespace, worker_uuid, kube_client_request_args=None):
+        self.kube_client = kube_client
+        self.namespace = namespace
+        self.worker_uuid = worker_uuid
+        self.kube_client_request_args = kube_client_request_args
+        # Names of the pods by index key, and index key by pod name. None until
+        # the pods are first listed.
+        self._pods = None
+        self._pod_keys = None
+        # Pods are created and deleted from several threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels_to_index_key(labels):
+        try:
+            return labels['dag_id'], labels['task_id'], labels['execution_date']
+        except (KeyError, TypeError):
+            return None
+
+    def _add(self, pod_id, index_key):
+        self._pods.setdefault(index_key, set()).add(pod_id)
+        self._pod_keys[pod_id] = index_key
+
+    def _list_pods(self):
+        kwargs = {'label_selector': 'airflow-worker={}'.format(self.worker_uuid)}
+        if self.kube_client_request_args:
+            kwargs.update(self.kube_client_request_args)
+        pod_list = self.kube_client.list_namespaced_pod(self.namespace, **kwargs)
+        self._pods = {}
+        self._pod_keys = {}
+        for pod in pod_list.items:
+            index_key = self._labels_to_index_key(pod.metadata.labels)
+            if index_key:
+                self._add(pod.metadata.name, index_key)
+        self.log.info('Indexed %s worker pods', len(self._pod_keys))
+
+    def add(self, pod_id, labels):
+        """
+        Record a worker pod. Does nothing until the pods were first listed, the
+        list will include the pod.
+
+        :param pod_id: the name of the pod
+        :type pod_id: str
+        :param labels: the labels of the pod
+        :type labels: dict
+        """
+        index_key = self._labels_to_index_key(labels)
+        with self._lock:
+            if self._pods is not None and index_key:
+                self._add(pod_id, index_key)
+
+    def remove(self, pod_id):
+        """
+        Forget a deleted worker pod.
+
+        :param pod_id: the name of the pod
+        :type pod_id: str
+        """
+        with self._lock:
+            if self._pods is None or pod_id not in self._pod_keys:
+                return
+            index_key = self._pod_keys.pop(pod_id)
+            pod_ids = self._pods[index_key]
+            pod_ids.discard(pod_id)
+            if not pod_ids:
+                del self._pods[index_key]
+
+    def has_pod(self, dag_id, task_id, execution_date):
+        """
+        :param dag_id: the ID of the DAG
+        :type dag_id: str
+        :param task_id: the ID of the task
+        :type task_id: str
+        :param execution_date: the execution date of the task instance
+        :type execution_date: datetime.datetime
+        :return: whether the task instance has a worker pod
+        :rtype: bool
+        """
+        index_key = (
+            AirflowKubernetesScheduler._make_safe_label_value(dag_id),
+            AirflowKubernetesScheduler._make_safe_label_value(task_id),
+            AirflowKubernetesScheduler._datetime_to_label_safe_datestring(execution_date)
+        )
+        with self._lock:
+            if self._pods is None:
+                self._list_pods()
+            return index_key in self._pods
+
+
 class AirflowKubernetesScheduler(LoggingMixin):
     def __init__(self, kube_config, task_queue, result_queue, kube_client, worker_uuid):
         self.log.debug("Creating Kubernetes executor")
@@ -391,6 +545,9 @@ class AirflowKubernetesScheduler(LoggingMixin):
         self._manager = multiprocessing.Manager()
         self.watcher_queue = self._manager.Queue()
         self.worker_uuid = worker_uuid
+        self.pod_index = KubernetesPodIndex(
+            self.kube_client, self.namespace, self.worker_uuid,
+            self.kube_config.kube_client_request_args)
         self.kube_watcher = self._make_kube_watcher()
 
     def _make_kube_watcher(self):
@@ -422,9 +579,10 @@ class AirflowKubernetesScheduler(LoggingMixin):
         dag_id, task_id, execution_date, try_number = key
         self.log.debug("Kubernetes running for command %s", command)
         self.log.debug("Kubernetes launching image %s", self.kube_config.kube_image)
+        pod_id = self._create_pod_id(dag_id, task_id)
         pod = self.worker_configuration.make_pod(
             namespace=self.namespace, worker_uuid=self.worker_uuid,
-            pod_id=self._create_pod_id(dag_id, task_id),
+            pod_id=pod_id,
             dag_id=self._make_safe_label_value(dag_id),
             task_id=self._make_safe_label_value(task_id),
             try_number=try_number,
@@ -433,6 +591,7 @@ class AirflowKubernetesScheduler(LoggingMixin):
         )
         # the watcher will monitor pods, so we do not block.
         self.launcher.run_pod_async(pod, **self.kube_config.kube_client_request_args)
+        self.pod_index.add(pod_id, pod.labels)
         self.log.debug("Kubernetes Job created!")
 
     def delete_pod(self, pod_id):
@@ -445,6 +604,7 @@ class AirflowKubernetesScheduler(LoggingMixin):
                 # If the pod is already deleted
                 if e.status != 404:
                     raise
+            self.pod_index.remove(pod_id)
 
     def sync(self):
         """
@@ -468,6 +628,7 @@ class AirflowKubernetesScheduler(LoggingMixin):
 
     def process_watcher_task(self, task):
         pod_id, state, labels, resource_version = task
+        self.pod_index.add(pod_id, labels)
         self.log.info(
             'Attempting to finish pod; pod_id: %s; state: %s; labels: %s',
             pod_id, state, labels
@@ -628,6 +789,10 @@ class KubernetesExecutor(BaseExecutor, LoggingMixin):
         self.kube_client = None
         self.worker_uuid = None
         self._manager = multiprocessing.Manager()
+        # Threads to create and delete worker pods concurrently, and the
+        # number of pods to create per sync. Both are set up on first use.
+        self._api_pool = None
+        self._pod_creation_batch_size = None
         super(KubernetesExecutor, self).__init__(parallelism=self.kube_config.parallelism)
 
     @provide_session
@@ -643,6 +808,9 @@ class KubernetesExecutor(BaseExecutor, LoggingMixin):
         the task
         will be rescheduled
 
+        The pods are looked up in the pod index of the scheduler, which lists the
+        worker pods once rather than once per "Queued" task
+
         This will not be necessary in a future version of airflow in which there is
         proper support
         for State.LAUNCHED
@@ -655,24 +823,9 @@ class KubernetesExecutor(BaseExecutor, LoggingMixin):
             len(queued_tasks)
         )
 
+        pod_index = self.kube_scheduler.pod_index
         for task in queued_tasks:
-            dict_string = (
-                "dag_id={},task_id={},execution_date={},airflow-worker={}".format(
-                    AirflowKubernetesScheduler._make_safe_label_value(task.dag_id),
-                    AirflowKubernetesScheduler._make_safe_label_value(task.task_id),
-                    AirflowKubernetesScheduler._datetime_to_label_safe_datestring(
-                        task.execution_date
-                    ),
-                    self.worker_uuid
-                )
-            )
-            kwargs = dict(label_selector=dict_string)
-            if self.kube_config.kube_client_request_args:
-                for key, value in self.kube_config.kube_client_request_args.iteritems():
-                    kwargs[key] = value
-            pod_list = self.kube_client.list_namespaced_pod(
-                self.kube_config.kube_namespace, **kwargs)
-            if len(pod_list.items) == 0:
+            if not pod_index.has_pod(task.dag_id, task.task_id, task.execution_date):
                 self.log.info(
                     'TaskInstance: %s found in queued state but was not launched, '
                     'rescheduling', task
@@ -753,43 +906,129 @@ class KubernetesExecutor(BaseExecutor, LoggingMixin):
             self.log.debug('self.queued: %s', self.queued_tasks)
         self.kube_scheduler.sync()
 
-        last_resource_version = None
+        all_results = []
         while True:
             try:
-                results = self.result_queue.get_nowait()
-                try:
-                    key, state, pod_id, resource_version = results
-                    last_resource_version = resource_version
-                    self.log.info('Changing state of %s to %s', results, state)
-                    try:
-                        self._change_state(key, state, pod_id)
-                    except Exception as e:
-                        self.log.exception('Exception: %s when attempting ' +
-                                           'to change state of %s to %s, re-queueing.', e, results, state)
-                        self.result_queue.put(results)
-                finally:
-                    self.result_queue.task_done()
+                all_results.append(self.result_queue.get_nowait())
+                self.result_queue.task_done()
             except Empty:
                 break
 
+        # Delete the pods of the finished tasks concurrently, then change the
+        # states in the order the watcher reported them
+        pod_deletion_errors = self._delete_pods(
+            set(pod_id for _, state, pod_id, _ in all_results if state != State.RUNNING))
+
+        last_resource_version = None
+        for results in all_results:
+            key, state, pod_id, resource_version = results
+            last_resource_version = resource_version
+            self.log.info('Changing state of %s to %s', results, state)
+            try:
+                if pod_id in pod_deletion_errors:
+                    raise pod_deletion_errors[pod_id]
+                self._change_state(key, state, pod_id, pod_deleted=True)
+            except Exception as e:
+                self.log.exception('Exception: %s when attempting ' +
+                                   'to change state of %s to %s, re-queueing.', e, results, state)
+                self.result_queue.put(results)
+
         KubeResourceVersion.checkpoint_resource_version(last_resource_version)
 
-        for _ in range(self.kube_config.worker_pods_creation_batch_size):
+        self._create_pods()
+
+    def _get_api_pool(self):
+        """
+        :return: the threads used to create and delete worker pods, started on
+            first use
+        :rtype: multiprocessing.pool.ThreadPool
+        """
+        if self._api_pool is None:
+            self._api_pool = ThreadPool(
+                processes=max(1, self.kube_config.worker_pods_api_threads))
+        return self._api_pool
+
+    def _delete_pod(self, pod_id):
+        try:
+            self.kube_scheduler.delete_pod(pod_id)
+        except Exception as e:
+            return pod_id, e
+        return pod_id, None
+
+    def _delete_pods(self, pod_ids):
+        """
+        Delete worker pods concurrently.
+
+        :param pod_ids: the IDs of the pods to delete
+        :type pod_ids: set[str]
+        :return: the errors of the pods that could not be deleted, by pod ID
+        :rtype: dict[str, Exception]
+        """
+        if not pod_ids:
+            return {}
+        return {pod_id: error
+                for pod_id, error in self._get_api_pool().map(self._delete_pod, pod_ids)
+                if error is not None}
+
+    def _run_next(self, task):
+        start_time = time.time()
+        try:
+            self.kube_scheduler.run_next(task)
+        except Exception as e:
+            # The task is re-queued, whatever the error
+            return task, time.time() - start_time, e
+        return task, time.time() - start_time, None
+
+    def _create_pods(self):
+        """
+        Create the worker pods of a batch of queued tasks concurrently. The size
+        of the batch adapts to the latency and throttling of the Kubernetes API.
+        """
+        if self._pod_creation_batch_size is None:
+            self._pod_creation_batch_size = AdaptiveBatchSize(
+                self.kube_config.worker_pods_creation_batch_size,
+                self.kube_config.worker_pods_creation_max_batch_size,
+                self.kube_config.worker_pods_creation_target_latency)
+
+        batch_size = self._pod_creation_batch_size.value
+        tasks = []
+        for _ in range(batch_size):
             try:
-                task = self.task_queue.get_nowait()
-                try:
-                    self.kube_scheduler.run_next(task)
-                except ApiException:
-                    self.log.exception('ApiException when attempting to run task, re-queueing.')
-                    self.task_queue.put(task)
-                finally:
-                    self.task_queue.task_done()
+                tasks.append(self.task_queue.get_nowait())
+                self.task_queue.task_done()
             except Empty:
                 break
-
-    def _change_state(self, key, state, pod_id):
+        Stats.gauge('executor.kubernetes.pod_creation_backlog', self.task_queue.qsize())
+        if not tasks:
+            return
+
+        latencies = []
+        throttled = False
+        for task, latency, error in self._get_api_pool().map(self._run_next, tasks):
+            Stats.timing('executor.kubernetes.pod_creation_latency', latency * 1000)
+            if error is None:
+                latencies.append(latency)
+            else:
+                if isinstance(error, ApiException):
+                    throttled = throttled or error.status == 429
+                    self.log.error('ApiException when attempting to run task, '
+                                   're-queueing: %s', error)
+                else:
+                    self.log.error('%s when attempting to run task, re-queueing: %s',
+                                   error.__class__.__name__, error)
+                self.task_queue.put(task)
+
+        self._pod_creation_batch_size.update(len(tasks), latencies, throttled)
+        if self._pod_creation_batch_size.value != batch_size:
+            self.log.info('Creating up to %s worker pods per sync',
+                          self._pod_creation_batch_size.value)
+        Stats.gauge('executor.kubernetes.pod_creation_batch_size',
+                    self._pod_creation_batch_size.value)
+
+    def _change_state(self, key, state, pod_id, pod_deleted=False):
         if state != State.RUNNING:
-            self.kube_scheduler.delete_pod(pod_id)
+            if not pod_deleted:
+                self.kube_scheduler.delete_pod(pod_id)
             try:
                 self.log.info('Deleted pod: %s', str(key))
                 self.running.pop(key)
@@ -804,4 +1043,8 @@ class KubernetesExecutor(BaseExecutor, LoggingMixin):
         self.result_queue.join()
         if self.kube_scheduler:
             self.kube_scheduler.terminate()
+        if self._api_pool is not None:
+            self._api_pool.close()
+            self._api_pool.join()
+            self._api_pool = None
         self._manager.shutdown()
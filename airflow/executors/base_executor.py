@@ -17,9 +17,19 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import heapq
+import itertools
+import numbers
+import select
+import time
 from builtins import range
 from collections import OrderedDict
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # Python 2
+    from collections import MutableMapping
+
 # To avoid circular imports
 import airflow.utils.dag_processing
 from airflow import configuration
@@ -29,6 +39,96 @@ from airflow.utils.state import State
 
 PARALLELISM = configuration.conf.getint('core', 'PARALLELISM')
 
+# Marks the heap entries of the keys removed from an IndexedPriorityQueue
+_REMOVED = object()
+
+
+class IndexedPriorityQueue(MutableMapping):
+    """
+    Mapping from task instance key to ``(command, priority, queue,
+    simple_task_instance)`` that also keeps its keys in a heap by descending
+    priority, first in first out for equal priorities. Setting a key is
+    O(log n), removing one is O(1) and popping the highest priority key is
+    O(log n) amortized. Iteration follows insertion order.
+
+    Values that are not such tuples, or whose priority is not a number, are
+    queued with priority 0.
+    """
+
+    def __init__(self):
+        self._values = OrderedDict()
+        # Map from key to its [negated priority, sequence number, key] heap entry
+        self._entries = {}
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self._entries[key][2] = _REMOVED
+        priority = value[1] if isinstance(value, tuple) else 0
+        if not isinstance(priority, numbers.Number):
+            priority = 0
+        entry = [-priority, next(self._counter), key]
+        self._entries[key] = entry
+        self._values[key] = value
+        heapq.heappush(self._heap, entry)
+
+    def __delitem__(self, key):
+        del self._values[key]
+        self._entries.pop(key)[2] = _REMOVED
+        # Drop the removed entries once they make up most of the heap
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = list(self._entries.values())
+            heapq.heapify(self._heap)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def clear(self):
+        self._values.clear()
+        self._entries.clear()
+        self._heap = []
+
+    def pop_highest_priority(self):
+        """
+        Remove and return the key with the highest priority and its value.
+
+        :rtype: (tuple, tuple)
+        :raises KeyError: if the queue is empty
+        """
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            key = entry[2]
+            if key is not _REMOVED:
+                del self._entries[key]
+                return key, self._values.pop(key)
+        raise KeyError('pop from an empty priority queue')
+
+    def peek_highest_priority(self, n):
+        """
+        Return the ``n`` keys with the highest priority and their values,
+        highest priority first, without removing them.
+
+        :rtype: list[(tuple, tuple)]
+        """
+        entries = []
+        while self._heap and len(entries) < n:
+            entry = heapq.heappop(self._heap)
+            if entry[2] is not _REMOVED:
+                entries.append(entry)
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        return [(entry[2], self._values[entry[2]]) for entry in entries]
+
 
 class BaseExecutor(LoggingMixin):
 
@@ -42,7 +142,7 @@ class BaseExecutor(LoggingMixin):
         :type parallelism: int
         """
         self.parallelism = parallelism
-        self.queued_tasks = OrderedDict()
+        self.queued_tasks = IndexedPriorityQueue()
         self.running = {}
         self.event_buffer = {}
 
@@ -111,6 +211,32 @@ class BaseExecutor(LoggingMixin):
         """
         pass
 
+    def event_fileno(self):
+        """
+        Executors that get the state changes of their tasks through a pipe can
+        expose it so that the caller can wait for them instead of sleeping.
+
+        :return: a file descriptor that is readable when there are task state
+            changes to sync, None if the executor does not have one
+        :rtype: int
+        """
+        return None
+
+    def wait_for_events(self, timeout):
+        """
+        Wait until there are task state changes to sync, at most timeout
+        seconds. Sleeps for timeout seconds if the executor does not expose
+        a file descriptor to wait on.
+
+        :param timeout: the maximum number of seconds to wait
+        :type timeout: float
+        """
+        fileno = self.event_fileno()
+        if fileno is None:
+            time.sleep(timeout)
+        else:
+            select.select([fileno], [], [], timeout)
+
     def heartbeat(self):
         # Triggering new jobs
         if not self.parallelism:
@@ -142,13 +268,9 @@ class BaseExecutor(LoggingMixin):
         :param open_slots: Number of open slots
         :return:
         """
-        sorted_queue = sorted(
-            [(k, v) for k, v in self.queued_tasks.items()],
-            key=lambda x: x[1][1],
-            reverse=True)
         for i in range(min((open_slots, len(self.queued_tasks)))):
-            key, (command, _, queue, simple_ti) = sorted_queue.pop(0)
-            self.queued_tasks.pop(key)
+            key, (command, _, queue, simple_ti) = \
+                self.queued_tasks.pop_highest_priority()
             self.running[key] = command
             self.execute_async(key=key,
                                command=command,
@@ -22,15 +22,20 @@ import os
 import subprocess
 import time
 import traceback
-from multiprocessing import Pool, cpu_count
+from collections import namedtuple
+from multiprocessing import Pool, TimeoutError, cpu_count
 
 from celery import Celery
 from celery import states as celery_states
+from celery.backends.base import KeyValueStoreBackend
+from celery.backends.database import DatabaseBackend, Task as TaskDb, session_cleanup
 
 from airflow import configuration
 from airflow.config_templates.default_celery import DEFAULT_CELERY_CONFIG
 from airflow.exceptions import AirflowException
 from airflow.executors.base_executor import BaseExecutor
+from airflow.settings import Stats
+from airflow.utils.helpers import chunks
 from airflow.utils.log.logging_mixin import LoggingMixin
 from airflow.utils.module_loading import import_string
 from airflow.utils.timeout import timeout
@@ -40,6 +45,20 @@ CELERY_FETCH_ERR_MSG_HEADER = 'Error fetching Celery task state'
 
 CELERY_SEND_ERR_MSG_HEADER = 'Error sending Celery task'
 
+# How long to wait for a Celery operation (sending a task or fetching its state)
+OPERATION_TIMEOUT = 2
+
+# How many task ids to look up per query on a database result backend, to
+# stay below the bound parameter limits of SQLite and MSSQL
+BULK_STATE_FETCH_CHUNK_SIZE = 500
+
+# Tasks handed to the sync pool to be sent to Celery, whose send results were
+# not all read yet: the results iterator, the keys of the tasks whose result is
+# not known, the backend to give their AsyncResults, when the send started and
+# when to give up on the results
+PendingSend = namedtuple('PendingSend', ['results', 'keys', 'celery_backend',
+                                         'start_time', 'deadline'])
+
 '''
 To start the celery worker, run the command:
 airflow worker
@@ -100,7 +119,7 @@ def fetch_celery_task_state(celery_task):
     """
 
     try:
-        with timeout(seconds=2):
+        with timeout(seconds=OPERATION_TIMEOUT):
             # Accessing state property of celery task will make actual network request
             # to get the current state of the task.
             res = (celery_task[0], celery_task[1].state)
@@ -114,7 +133,7 @@ def fetch_celery_task_state(celery_task):
 def send_task_to_executor(task_tuple):
     key, simple_ti, command, queue, task = task_tuple
     try:
-        with timeout(seconds=2):
+        with timeout(seconds=OPERATION_TIMEOUT):
             result = task.apply_async(args=[command], queue=queue)
     except Exception as e:
         exception_traceback = "Celery Task ID: {}\n{}".format(key,
@@ -139,13 +158,19 @@ class CeleryExecutor(BaseExecutor):
 
         # Celery doesn't support querying the state of multiple tasks in parallel
         # (which can become a bottleneck on bigger clusters) so we use
-        # a multiprocessing pool to speed this up.
+        # a multiprocessing pool to speed this up. The same long lived pool is
+        # used to send tasks.
         # How many worker processes are created for checking celery task state.
         self._sync_parallelism = configuration.getint('celery', 'SYNC_PARALLELISM')
         if self._sync_parallelism == 0:
             self._sync_parallelism = max(1, cpu_count() - 1)
 
+        # Fetch the states of all the tasks with a single request to the result
+        # backend when it supports it, instead of one request per task.
+        self._bulk_state_fetch = configuration.getboolean('celery', 'BULK_STATE_FETCH')
+
         self._sync_pool = None
+        self._pending_send = None
         self.tasks = {}
         self.last_state = {}
 
@@ -155,6 +180,37 @@ class CeleryExecutor(BaseExecutor):
             self._sync_parallelism
         )
 
+    def _get_sync_pool(self):
+        """
+        :return: the pool used to send tasks and fetch their states, started
+            on first use. Its worker processes are replaced by the pool when
+            they die.
+        :rtype: multiprocessing.Pool
+        """
+        if self._sync_pool is None:
+            self._sync_pool = Pool(processes=self._sync_parallelism)
+        return self._sync_pool
+
+    def _reset_sync_pool(self):
+        """
+        Terminate the pool, for instance after a worker process died in the
+        middle of an operation. A new pool is started on next use.
+        """
+        if self._pending_send is not None:
+            self._abandon_pending_send()
+        if self._sync_pool is not None:
+            self._sync_pool.terminate()
+            self._sync_pool.join()
+            self._sync_pool = None
+
+    @staticmethod
+    def _pool_timeout(chunksize):
+        """
+        :return: how long to wait for a chunk of operations sent to the pool
+        :rtype: int
+        """
+        return OPERATION_TIMEOUT * (chunksize + 1)
+
     def _num_tasks_per_send_process(self, to_send_count):
         """
         How many Celery tasks should each worker process send.
@@ -182,19 +238,20 @@ class CeleryExecutor(BaseExecutor):
         :param open_slots: Number of open slots
         :return:
         """
-        sorted_queue = sorted(
-            [(k, v) for k, v in self.queued_tasks.items()],
-            key=lambda x: x[1][1],
-            reverse=True)
+        if self._pending_send is not None:
+            # Read the results of the previous send without waiting, no new
+            # tasks are sent until all of them are known
+            self._collect_send_results(timeout=0)
+            if self._pending_send is not None:
+                return
 
         task_tuples_to_send = []
 
-        for i in range(min((open_slots, len(self.queued_tasks)))):
-            key, (command, _, queue, simple_ti) = sorted_queue.pop(0)
+        for key, (command, _, queue, simple_ti) in \
+                self.queued_tasks.peek_highest_priority(open_slots):
             task_tuples_to_send.append((key, simple_ti, command, queue,
                                         execute_command))
 
-        cached_celery_backend = None
         if task_tuples_to_send:
             tasks = [t[4] for t in task_tuples_to_send]
 
@@ -202,60 +259,173 @@ class CeleryExecutor(BaseExecutor):
             # for all tasks.
             cached_celery_backend = tasks[0].backend
 
-        if task_tuples_to_send:
             # Use chunking instead of a work queue to reduce context switching
             # since tasks are roughly uniform in size
             chunksize = self._num_tasks_per_send_process(len(task_tuples_to_send))
-            num_processes = min(len(task_tuples_to_send), self._sync_parallelism)
 
-            send_pool = Pool(processes=num_processes)
-            key_and_async_results = send_pool.map(
+            start_time = time.time()
+            # Results are handled as soon as each chunk is sent
+            key_and_async_results = self._get_sync_pool().imap_unordered(
                 send_task_to_executor,
                 task_tuples_to_send,
                 chunksize=chunksize)
+            # Each send times out after OPERATION_TIMEOUT in the pool, so the
+            # results only stop coming if a worker process of the pool died
+            self._pending_send = PendingSend(
+                results=key_and_async_results,
+                keys={t[0] for t in task_tuples_to_send},
+                celery_backend=cached_celery_backend,
+                start_time=start_time,
+                deadline=start_time + 3 * self._pool_timeout(chunksize))
+            self._collect_send_results(self._pool_timeout(chunksize))
+
+    def _collect_send_results(self, timeout):
+        """
+        Handle the results of the tasks handed to the sync pool to be sent.
+        The tasks whose result is not known yet stay queued, and are not sent
+        again, as Celery may have received them already.
+
+        :param timeout: how long to wait for each result
+        :type timeout: float
+        """
+        pending_send = self._pending_send
+        while pending_send.keys:
+            try:
+                key, command, result = pending_send.results.next(timeout)
+            except TimeoutError:
+                if time.time() < pending_send.deadline:
+                    self.log.warning("Still sending %s tasks to Celery",
+                                     len(pending_send.keys))
+                    return
+                self.log.error("Timed out sending tasks to Celery, "
+                               "restarting the sync pool")
+                self._reset_sync_pool()
+                return
+            pending_send.keys.discard(key)
+            if isinstance(result, ExceptionWithTraceback):
+                self.log.error(
+                    CELERY_SEND_ERR_MSG_HEADER + ":%s\n%s\n", result.exception, result.traceback
+                )
+            elif result is not None:
+                # Only pops when enqueued successfully, otherwise keep it
+                # and expect scheduler loop to deal with it.
+                self.queued_tasks.pop(key)
+                result.backend = pending_send.celery_backend
+                self.running[key] = command
+                self.tasks[key] = result
+                self.last_state[key] = celery_states.PENDING
+
+        self._pending_send = None
+        self.log.debug('Sent all tasks.')
+        Stats.timing('executor.celery.send_latency',
+                     (time.time() - pending_send.start_time) * 1000)
+
+    def _abandon_pending_send(self):
+        """
+        Give up on the results of the tasks being sent. Celery may or may not
+        have received them, so rather than sending them again, which could
+        run them twice, they are reported as failed to the scheduler.
+        """
+        for key in self._pending_send.keys:
+            self.log.error("Could not tell whether task %s was sent to Celery, "
+                           "failing it", key)
+            self.queued_tasks.pop(key, None)
+            self.fail(key)
+        self._pending_send = None
+
+    def _fetch_states_in_bulk(self):
+        """
+        Fetch the states of all the running tasks with a single request to the
+        result backend: a query on the task table per chunk of
+        BULK_STATE_FETCH_CHUNK_SIZE tasks for database backends, a MGET for
+        key-value store backends like Redis. Tasks the backend does
+        not know about yet are PENDING.
+
+        :return: a list of tuples of the Celery task key and the Celery state of
+            the task, None if the result backend does not support bulk fetching
+        :rtype: list[tuple[str, str]]
+        """
+        backend = app.backend
+        task_ids = [(result.task_id, key) for key, result in self.tasks.items()]
+        celery_task_ids = [task_id for task_id, _ in task_ids]
+
+        if isinstance(backend, DatabaseBackend):
+            session = backend.ResultSession()
+            states = {}
+            with session_cleanup(session):
+                for chunk in chunks(celery_task_ids, BULK_STATE_FETCH_CHUNK_SIZE):
+                    states.update(
+                        session.query(TaskDb.task_id, TaskDb.status)
+                        .filter(TaskDb.task_id.in_(chunk))
+                        .all())
+        elif isinstance(backend, KeyValueStoreBackend):
+            values = backend.mget([backend.get_key_for_task(task_id)
+                                   for task_id in celery_task_ids])
+            states = {task_id: backend.decode_result(value)['status']
+                      for task_id, value in zip(celery_task_ids, values)
+                      if value is not None}
+        else:
+            return None
+
+        return [(key, states.get(task_id, celery_states.PENDING))
+                for task_id, key in task_ids]
+
+    def _fetch_states_with_pool(self):
+        """
+        Fetch the state of each running task with its own request to the
+        result backend, in parallel in the sync pool.
 
-            send_pool.close()
-            send_pool.join()
-            self.log.debug('Sent all tasks.')
-
-            for key, command, result in key_and_async_results:
-                if isinstance(result, ExceptionWithTraceback):
-                    self.log.error(
-                        CELERY_SEND_ERR_MSG_HEADER + ":%s\n%s\n", result.exception, result.traceback
-                    )
-                elif result is not None:
-                    # Only pops when enqueued successfully, otherwise keep it
-                    # and expect scheduler loop to deal with it.
-                    self.queued_tasks.pop(key)
-                    result.backend = cached_celery_backend
-                    self.running[key] = command
-                    self.tasks[key] = result
-                    self.last_state[key] = celery_states.PENDING
+        :return: a list of tuples of the Celery task key and the Celery state of
+            the task, or ExceptionWithTraceback for the tasks whose state could
+            not be fetched. None if the pool timed out or is busy sending tasks.
+        :rtype: list[tuple[str, str] | ExceptionWithTraceback]
+        """
+        if self._pending_send is not None:
+            # The pool is busy sending tasks, fetching the states now would
+            # only queue up behind them
+            self.log.debug("Sending tasks to Celery, skipping fetching their states")
+            return None
 
-    def sync(self):
         num_processes = min(len(self.tasks), self._sync_parallelism)
-        if num_processes == 0:
-            self.log.debug("No task to query celery, skipping sync")
-            return
-
         self.log.debug("Inquiring about %s celery task(s) using %s processes",
                        len(self.tasks), num_processes)
 
-        # Recreate the process pool each sync in case processes in the pool die
-        self._sync_pool = Pool(processes=num_processes)
-
         # Use chunking instead of a work queue to reduce context switching since tasks are
         # roughly uniform in size
         chunksize = self._num_tasks_per_fetch_process()
 
         self.log.debug("Waiting for inquiries to complete...")
-        task_keys_to_states = self._sync_pool.map(
-            fetch_celery_task_state,
-            self.tasks.items(),
-            chunksize=chunksize)
-        self._sync_pool.close()
-        self._sync_pool.join()
+        try:
+            task_keys_to_states = self._get_sync_pool().map_async(
+                fetch_celery_task_state,
+                list(self.tasks.items()),
+                chunksize=chunksize).get(self._pool_timeout(chunksize))
+        except TimeoutError:
+            self.log.error("Timed out fetching Celery task states, "
+                           "restarting the sync pool")
+            self._reset_sync_pool()
+            return None
         self.log.debug("Inquiries completed.")
+        return task_keys_to_states
+
+    def sync(self):
+        if not self.tasks:
+            self.log.debug("No task to query celery, skipping sync")
+            return
+
+        start_time = time.time()
+        task_keys_to_states = None
+        if self._bulk_state_fetch:
+            try:
+                task_keys_to_states = self._fetch_states_in_bulk()
+            except Exception:
+                self.log.exception("Error fetching Celery task states in bulk, "
+                                   "fetching them one at a time")
+        if task_keys_to_states is None:
+            task_keys_to_states = self._fetch_states_with_pool()
+            if task_keys_to_states is None:
+                return
+        Stats.timing('executor.celery.fetch_latency', (time.time() - start_time) * 1000)
 
         for key_and_state in task_keys_to_states:
             if isinstance(key_and_state, ExceptionWithTraceback):
@@ -291,4 +461,10 @@ class CeleryExecutor(BaseExecutor):
                     task.state not in celery_states.READY_STATES
                     for task in self.tasks.values()]):
                 time.sleep(5)
+        while self._pending_send is not None:
+            self._collect_send_results(OPERATION_TIMEOUT)
         self.sync()
+        if self._sync_pool is not None:
+            self._sync_pool.close()
+            self._sync_pool.join()
+            self._sync_pool = None
@@ -19,7 +19,7 @@
 
 import distributed
 import subprocess
-import warnings
+from queue import Empty, Queue
 
 from airflow import configuration
 from airflow.executors.base_executor import BaseExecutor
@@ -28,6 +28,11 @@ from airflow.executors.base_executor import BaseExecutor
 class DaskExecutor(BaseExecutor):
     """
     DaskExecutor submits tasks to a Dask Distributed cluster.
+
+    The priority weight of the tasks is their Dask priority. With
+    ``[dask] queue_resources`` the tasks of a queue other than the default
+    queue only run on the workers that have a resource named after the queue,
+    e.g. ``dask-worker --resources "gpu=2"`` for the ``gpu`` queue.
     """
     def __init__(self, cluster_address=None):
         if cluster_address is None:
@@ -40,6 +45,8 @@ class DaskExecutor(BaseExecutor):
         self.tls_ca = configuration.get('dask', 'tls_ca')
         self.tls_key = configuration.get('dask', 'tls_key')
         self.tls_cert = configuration.get('dask', 'tls_cert')
+        self.queue_resources = configuration.conf.getboolean('dask', 'queue_resources')
+        self.default_queue = configuration.conf.get('celery', 'default_queue')
         super(DaskExecutor, self).__init__(parallelism=0)
 
     def start(self):
@@ -56,23 +63,45 @@ class DaskExecutor(BaseExecutor):
 
         self.client = distributed.Client(self.cluster_address, security=security)
         self.futures = {}
+        # The futures are put here by the client when they are done, so that
+        # sync only looks at the finished ones
+        self.done_futures = Queue()
 
-    def execute_async(self, key, command, queue=None, executor_config=None):
-        if queue is not None:
-            warnings.warn(
-                'DaskExecutor does not support queues. '
-                'All tasks will be run in the same cluster'
-            )
+    def trigger_tasks(self, open_slots):
+        """
+        Overwrite trigger_tasks function from BaseExecutor to pass the priority
+        of the tasks to Dask
+
+        :param open_slots: Number of open slots
+        :return:
+        """
+        for i in range(min((open_slots, len(self.queued_tasks)))):
+            key, (command, priority, queue, simple_ti) = \
+                self.queued_tasks.pop_highest_priority()
+            self.running[key] = command
+            self.execute_async(key=key,
+                               command=command,
+                               queue=queue,
+                               executor_config=simple_ti.executor_config,
+                               priority=priority)
 
+    def execute_async(self, key, command, queue=None, executor_config=None, priority=0):
         def airflow_run():
             return subprocess.check_call(command, shell=True, close_fds=True)
 
-        future = self.client.submit(airflow_run, pure=False)
+        kwargs = {'pure': False, 'priority': priority}
+        if self.queue_resources and queue and queue != self.default_queue:
+            kwargs['resources'] = {queue: 1}
+        future = self.client.submit(airflow_run, **kwargs)
         self.futures[future] = key
+        future.add_done_callback(self.done_futures.put)
 
     def _process_future(self, future):
         if future.done():
-            key = self.futures[future]
+            key = self.futures.pop(future, None)
+            if key is None:
+                # Already processed
+                return
             if future.exception():
                 self.log.error("Failed to execute task: %s", repr(future.exception()))
                 self.fail(key)
@@ -81,11 +110,13 @@ class DaskExecutor(BaseExecutor):
                 self.fail(key)
             else:
                 self.success(key)
-            self.futures.pop(future)
 
     def sync(self):
-        # make a copy so futures can be popped during iteration
-        for future in self.futures.copy():
+        while True:
+            try:
+                future = self.done_futures.get_nowait()
+            except Empty:
+                break
             self._process_future(future)
 
     def end(self):
@@ -38,18 +38,33 @@ the LocalExecutor, the worker processes are running waiting for tasks, once the
 LocalExecutor receives the call to shutdown the executor a poison token is sent to the
 workers to terminate them. Processes used in this strategy are of class QueuedLocalWorker.
 
+With `[core] local_executor_fork_tasks` enabled, the workers don't start a new python
+interpreter for each `airflow run` command: they fork and run the command in the child,
+which already has airflow imported. The workers of the limited parallelism strategy keep
+the DAGs they parsed, so the child only parses the DAG file again when it changed.
+
 Arguably, `SequentialExecutor` could be thought as a LocalExecutor with limited
 parallelism of just 1 worker, i.e. `self.parallelism = 1`.
 This option could lead to the unification of the executor implementations, running
 locally, into just one `LocalExecutor` with multiple modes.
 """
 
+import errno
+import fcntl
 import multiprocessing
+import os
+import signal
 import subprocess
+import sys
 
 from builtins import range
-from queue import Empty
 
+try:
+    from multiprocessing import SimpleQueue
+except ImportError:  # Python 2
+    from multiprocessing.queues import SimpleQueue
+
+from airflow import configuration, settings
 from airflow.executors.base_executor import BaseExecutor
 from airflow.utils.log.logging_mixin import LoggingMixin
 from airflow.utils.state import State
@@ -60,16 +75,23 @@ class LocalWorker(multiprocessing.Process, LoggingMixin):
     """LocalWorker Process implementation to run airflow commands. Executes the given
     command and puts the result into a result queue when done, terminating execution."""
 
-    def __init__(self, result_queue):
+    def __init__(self, result_queue, event_fd=None):
         """
         :param result_queue: the queue to store result states tuples (key, State)
-        :type result_queue: multiprocessing.Queue
+        :type result_queue: multiprocessing.SimpleQueue
+        :param event_fd: the write end of a pipe to write a byte to after each
+            result, None for no signal
+        :type event_fd: int
         """
         super(LocalWorker, self).__init__()
         self.daemon = True
         self.result_queue = result_queue
+        self.event_fd = event_fd
         self.key = None
         self.command = None
+        self.fork_tasks = configuration.conf.getboolean('core', 'local_executor_fork_tasks')
+        # The DagBags of the DAG folders or files the worker ran tasks from
+        self._dagbags = {}
 
     def execute_work(self, key, command):
         """
@@ -82,6 +104,22 @@ class LocalWorker(multiprocessing.Process, LoggingMixin):
         if key is None:
             return
         self.log.info("%s running %s", self.__class__.__name__, command)
+        try:
+            if self.fork_tasks and list(command[:2]) == ['airflow', 'run']:
+                state = self._execute_work_in_fork(command)
+            else:
+                state = self._execute_work_in_subprocess(command)
+        except Exception:
+            # The executor waits for a result of every command
+            self.log.exception("Failed to execute task %s.", command)
+            state = State.FAILED
+        # The put of a SimpleQueue is written to its pipe right away, so the
+        # result can be read once the signal byte is
+        self.result_queue.put((key, state))
+        if self.event_fd is not None:
+            os.write(self.event_fd, b'\0')
+
+    def _execute_work_in_subprocess(self, command):
         try:
             subprocess.check_call(command, close_fds=True)
             state = State.SUCCESS
@@ -90,7 +128,75 @@ class LocalWorker(multiprocessing.Process, LoggingMixin):
             self.log.error("Failed to execute task %s.", str(e))
             # TODO: Why is this commented out?
             # raise e
-        self.result_queue.put((key, state))
+        return state
+
+    def _execute_work_in_fork(self, command):
+        """
+        Runs an ``airflow run`` command in a forked child of the worker, the same
+        way the CLI would run it but without starting a new interpreter.
+        """
+        from airflow.bin import cli  # Avoid circular import
+
+        try:
+            args = cli.CLIFactory.get_parser().parse_args(command[1:])
+            dag = self._get_dag(args)
+        except (SystemExit, Exception):
+            # argparse exits on the commands it can't parse
+            self.log.exception("Failed to parse the command %s.", command)
+            return State.FAILED
+
+        pid = os.fork()
+        if pid == 0:
+            return_code = 1
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                # The CLI creates a new engine. Keep the engine of the worker
+                # referenced until the child exits, so that the connections it
+                # shares with the worker are never closed from the child.
+                worker_engine = settings.engine  # noqa: F841
+                cli.run(args, dag=dag)
+                return_code = 0
+            except SystemExit as e:
+                return_code = 0 if not e.code else 1
+            except Exception:
+                self.log.exception("Failed to execute task %s.", command)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(return_code)
+
+        _, status = os.waitpid(pid, 0)
+        if status != 0:
+            self.log.error("Failed to execute task %s, exit status %s.", command, status)
+            return State.FAILED
+        return State.SUCCESS
+
+    def _get_dag(self, args):
+        """
+        :return: the DAG of the command, from the DagBag the worker keeps for the
+            DAG folder or file of the command, None if the DAG is pickled or
+            could not be loaded. In this case the child loads it.
+        :rtype: airflow.models.DAG
+        """
+        if args.pickle:
+            return None
+        from airflow.bin.cli import process_subdir  # Avoid circular import
+        from airflow.models import DagBag
+
+        try:
+            dag_folder = process_subdir(args.subdir)
+            dagbag = self._dagbags.get(dag_folder)
+            if dagbag is None:
+                dagbag = self._dagbags[dag_folder] = DagBag(dag_folder)
+            else:
+                # Only parses the files that changed since they were last parsed
+                dagbag.collect_dags(dag_folder)
+            return dagbag.dags.get(args.dag_id)
+        except Exception:
+            self.log.exception("Failed to load the DAG %s, the task will load it",
+                               args.dag_id)
+            return None
 
     def run(self):
         self.execute_work(self.key, self.command)
@@ -102,8 +208,9 @@ class QueuedLocalWorker(LocalWorker):
     continue executing commands as they become available in the queue. It will terminate
     execution once the poison token is found."""
 
-    def __init__(self, task_queue, result_queue):
-        super(QueuedLocalWorker, self).__init__(result_queue=result_queue)
+    def __init__(self, task_queue, result_queue, event_fd=None):
+        super(QueuedLocalWorker, self).__init__(result_queue=result_queue,
+                                                event_fd=event_fd)
         self.task_queue = task_queue
 
     def run(self):
@@ -147,7 +254,8 @@ class LocalExecutor(BaseExecutor):
             :param command: the command to execute
             :type command: str
             """
-            local_worker = LocalWorker(self.executor.result_queue)
+            local_worker = LocalWorker(self.executor.result_queue,
+                                       self.executor.event_fd)
             local_worker.key = key
             local_worker.command = command
             self.executor.workers_used += 1
@@ -155,13 +263,13 @@ class LocalExecutor(BaseExecutor):
             local_worker.start()
 
         def sync(self):
-            while not self.executor.result_queue.empty():
-                results = self.executor.result_queue.get()
+            for results in self.executor.read_results():
                 self.executor.change_state(*results)
                 self.executor.workers_active -= 1
 
         def end(self):
             while self.executor.workers_active > 0:
+                self.executor.wait_for_events(timeout=1)
                 self.executor.sync()
 
     class _LimitedParallelism(object):
@@ -172,9 +280,10 @@ class LocalExecutor(BaseExecutor):
             self.executor = executor
 
         def start(self):
-            self.queue = self.executor.manager.Queue()
+            self.queue = multiprocessing.JoinableQueue()
             self.executor.workers = [
-                QueuedLocalWorker(self.queue, self.executor.result_queue)
+                QueuedLocalWorker(self.queue, self.executor.result_queue,
+                                  self.executor.event_fd)
                 for _ in range(self.executor.parallelism)
             ]
 
@@ -190,31 +299,34 @@ class LocalExecutor(BaseExecutor):
             :param command: the command to execute
             :type command: str
             """
+            # Counts the commands that did not return yet
+            self.executor.workers_active += 1
             self.queue.put((key, command))
 
         def sync(self):
-            while True:
-                try:
-                    results = self.executor.result_queue.get_nowait()
-                    try:
-                        self.executor.change_state(*results)
-                    finally:
-                        self.executor.result_queue.task_done()
-                except Empty:
-                    break
+            for results in self.executor.read_results():
+                self.executor.change_state(*results)
+                self.executor.workers_active -= 1
 
         def end(self):
             # Sending poison pill to all worker
             for _ in self.executor.workers:
                 self.queue.put((None, None))
 
-            # Wait for commands to finish
+            # Wait for commands to finish. The results are read as they come in,
+            # a worker can't exit before the results it put were read.
+            while self.executor.workers_active > 0:
+                self.executor.wait_for_events(timeout=1)
+                self.executor.sync()
             self.queue.join()
-            self.executor.sync()
 
     def start(self):
-        self.manager = multiprocessing.Manager()
-        self.result_queue = self.manager.Queue()
+        self.result_queue = SimpleQueue()
+        # The workers write a byte to this pipe after each result, the
+        # executor waits for it to be readable
+        self._event_reader, self.event_fd = os.pipe()
+        flags = fcntl.fcntl(self._event_reader, fcntl.F_GETFL)
+        fcntl.fcntl(self._event_reader, fcntl.F_SETFL, flags | os.O_NONBLOCK)
         self.workers = []
         self.workers_used = 0
         self.workers_active = 0
@@ -229,6 +341,28 @@ class LocalExecutor(BaseExecutor):
     def sync(self):
         self.impl.sync()
 
+    def read_results(self):
+        """
+        :return: the results the workers put in the result queue so far
+        :rtype: list[tuple]
+        """
+        # Drain the signal bytes first. Every result whose byte was read is
+        # in the queue already, the later ones are signalled again.
+        try:
+            while os.read(self._event_reader, 4096):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        results = []
+        while not self.result_queue.empty():
+            results.append(self.result_queue.get())
+        return results
+
+    def event_fileno(self):
+        return self._event_reader
+
     def end(self):
         self.impl.end()
-        self.manager.shutdown()
+        os.close(self._event_reader)
+        os.close(self.event_fd)
@@ -24,10 +24,11 @@ from __future__ import unicode_literals
 
 import os
 import random
-from typing import Iterable
+from typing import Any, Dict, Iterable, List
 
 from airflow.models import Connection
 from airflow.exceptions import AirflowException
+from airflow.utils.cache import TTLCache, get_metadata_cache
 from airflow.utils.db import provide_session
 from airflow.utils.log.logging_mixin import LoggingMixin
 
@@ -42,22 +43,41 @@ class BaseHook(LoggingMixin):
     instances of these systems, and expose consistent methods to interact
     with them.
     """
+    # Connections read from the database by conn_id, see
+    # [core] metadata_cache_ttl
+    _connection_cache = get_metadata_cache('connection')
+
     def __init__(self, source):
         pass
 
     @classmethod
     @provide_session
     def _get_connections_from_db(cls, conn_id, session=None):
-        db = (
-            session.query(Connection)
-            .filter(Connection.conn_id == conn_id)
-            .all()
-        )
-        session.expunge_all()
+        db = BaseHook._connection_cache.get(conn_id)
+        if db is TTLCache.MISSING:
+            db = (
+                session.query(Connection)
+                .filter(Connection.conn_id == conn_id)
+                .all()
+            )
+            session.expunge_all()
+            if db:
+                BaseHook._connection_cache.put(conn_id, db)
         if not db:
             raise AirflowException(
                 "The conn_id `{0}` isn't defined".format(conn_id))
-        return db
+        return list(db)
+
+    @classmethod
+    def invalidate_connection_cache(cls, conn_id=None):
+        """
+        Remove a connection, or all the connections, from the cache of this
+        process, see [core] metadata_cache_ttl.
+
+        :param conn_id: the ID of the connection, None for all the connections
+        :type conn_id: str
+        """
+        BaseHook._connection_cache.invalidate(conn_id)
 
     @classmethod
     def _get_connection_from_env(cls, conn_id):
@@ -76,6 +96,47 @@ class BaseHook(LoggingMixin):
             conns = cls._get_connections_from_db(conn_id)
         return conns
 
+    @classmethod
+    @provide_session
+    def get_many_connections(cls, conn_ids, session=None):
+        # type: (Iterable[str], Any) -> Dict[str, List[Connection]]
+        """
+        Get the connections of a number of conn_ids. The connections that are
+        neither defined in the environment nor cached are read from the
+        database in one query.
+
+        :param conn_ids: the IDs of the connections
+        :return: the connections by conn_id, the conn_ids that are not defined
+            are left out
+        :rtype: dict
+        """
+        conns = {}
+        missing_conn_ids = []
+        for conn_id in set(conn_ids):
+            conn = cls._get_connection_from_env(conn_id)
+            if conn:
+                conns[conn_id] = [conn]
+                continue
+            cached_conns = BaseHook._connection_cache.get(conn_id)
+            if cached_conns is TTLCache.MISSING:
+                missing_conn_ids.append(conn_id)
+            else:
+                conns[conn_id] = list(cached_conns)
+
+        if missing_conn_ids:
+            db = (
+                session.query(Connection)
+                .filter(Connection.conn_id.in_(missing_conn_ids))
+                .all()
+            )
+            session.expunge_all()
+            for conn in db:
+                conns.setdefault(conn.conn_id, []).append(conn)
+            for conn_id in missing_conn_ids:
+                if conn_id in conns:
+                    BaseHook._connection_cache.put(conn_id, list(conns[conn_id]))
+        return conns
+
     @classmethod
     def get_connection(cls, conn_id):  # type: (str) -> Connection
         conn = random.choice(list(cls.get_connections(conn_id)))
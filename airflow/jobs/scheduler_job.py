@@ -29,10 +29,12 @@ import signal
 import sys
 import threading
 import time
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import timedelta
-from time import sleep
+from importlib import import_module
+from multiprocessing.util import Finalize
 
+import psutil
 import six
 from past.builtins import basestring
 from sqlalchemy import and_, func, not_, or_
@@ -42,11 +44,13 @@ from airflow import configuration as conf
 from airflow import executors, models, settings
 from airflow.exceptions import AirflowException
 from airflow.models import DagRun, SlaMiss, errors
+from airflow.models.dagrun import DagRunStateSummary
 from airflow.settings import Stats
-from airflow.ti_deps.dep_context import DepContext, QUEUE_DEPS
+from airflow.ti_deps.dep_context import DepContext, QUEUE_DEPS, evaluate_many
 from airflow.utils import asciiart, helpers, timezone
 from airflow.utils.dag_processing import (AbstractDagFileProcessor,
                                           DagFileProcessorAgent,
+                                          FailureCallbackRequest,
                                           SimpleDag,
                                           SimpleDagBag,
                                           SimpleTaskInstance,
@@ -57,6 +61,121 @@ from airflow.utils.log.logging_mixin import LoggingMixin, StreamLogWriter, set_c
 from airflow.jobs.base_job import BaseJob
 from airflow.utils.state import State
 
+_UNSET = object()
+
+
+class ExecutableTaskInstance(namedtuple('ExecutableTaskInstance', [
+        'dag_id', 'task_id', 'execution_date', 'try_number', 'pool',
+        'priority_weight'])):
+    """
+    Lightweight stand-in for a TaskInstance row, materialized by the set-based
+    scheduling pass instead of full ORM objects.
+    """
+
+    @property
+    def key(self):
+        return self.dag_id, self.task_id, self.execution_date, self.try_number
+
+
+class ConcurrencyLedger(LoggingMixin):
+    """
+    In-memory account of the slots taken by QUEUED and RUNNING task instances
+    per pool, per DAG and per task. The scheduler updates it from the state
+    changes it makes itself and from executor events, and reconciles it with
+    the database every ``reconcile_interval`` seconds to pick up changes made
+    elsewhere (backfills, the UI, the CLI, ...).
+    """
+
+    states = (State.RUNNING, State.QUEUED)
+
+    def __init__(self, reconcile_interval):
+        """
+        :param reconcile_interval: number of seconds after which the ledger is
+            reloaded from the database
+        :type reconcile_interval: int
+        """
+        self._reconcile_interval = reconcile_interval
+        self._last_reconcile_time = None
+        # (dag_id, task_id, execution_date) -> pool of the occupied slot
+        self._slots = {}
+        self._pool_map = defaultdict(int)
+        self._dag_map = defaultdict(int)
+        self._task_map = defaultdict(int)
+
+    def _add(self, dag_id, task_id, execution_date, pool):
+        self._slots[(dag_id, task_id, execution_date)] = pool
+        self._pool_map[pool] += 1
+        self._dag_map[dag_id] += 1
+        self._task_map[(dag_id, task_id)] += 1
+
+    def occupy(self, ti):
+        """
+        Record that a task instance took a slot.
+
+        :param ti: the task instance that was queued
+        :type ti: airflow.models.TaskInstance
+        """
+        if (ti.dag_id, ti.task_id, ti.execution_date) not in self._slots:
+            self._add(ti.dag_id, ti.task_id, ti.execution_date, ti.pool)
+
+    def release(self, dag_id, task_id, execution_date):
+        """
+        Record that a task instance gave its slot back.
+        """
+        pool = self._slots.pop((dag_id, task_id, execution_date), _UNSET)
+        if pool is _UNSET:
+            return
+        self._pool_map[pool] -= 1
+        self._dag_map[dag_id] -= 1
+        self._task_map[(dag_id, task_id)] -= 1
+
+    def invalidate(self):
+        """
+        Force a reconciliation with the database on the next lookup.
+        """
+        self._last_reconcile_time = None
+
+    @provide_session
+    def reconcile(self, session=None):
+        """
+        Reload the ledger from the task instances in the database.
+        """
+        TI = models.TaskInstance
+        rows = (
+            session
+            .query(TI.dag_id, TI.task_id, TI.execution_date, TI.pool)
+            .filter(TI.state.in_(self.states))
+        ).all()
+
+        old_slots = self._slots
+        self._slots = {}
+        self._pool_map = defaultdict(int)
+        self._dag_map = defaultdict(int)
+        self._task_map = defaultdict(int)
+        for dag_id, task_id, execution_date, pool in rows:
+            self._add(dag_id, task_id, execution_date, pool)
+
+        drift = len(set(old_slots.items()) ^ set(self._slots.items()))
+        if drift and self._last_reconcile_time is not None:
+            self.log.info("Concurrency ledger was off by %s slot(s), reconciled", drift)
+        Stats.gauge('scheduler.concurrency_ledger.drift', drift)
+        self._last_reconcile_time = time.time()
+
+    @provide_session
+    def get_usage_maps(self, session=None):
+        """
+        :return: copies of the map from pool to # of used slots, the map from
+         dag_id to # of used slots and the map from (dag_id, task_id) to # of
+         used slots, reconciled with the database first if they are stale
+        :rtype: tuple[dict[str, int], dict[str, int], dict[tuple[str, str], int]]
+        """
+        if (self._last_reconcile_time is None or
+                time.time() - self._last_reconcile_time >= self._reconcile_interval):
+            self.reconcile(session=session)
+        return (defaultdict(int, self._pool_map),
+                defaultdict(int, self._dag_map),
+                defaultdict(int, self._task_map))
+
 
 class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
     """Helps call SchedulerJob.process_file() in a separate process."""
@@ -64,7 +183,8 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
     # Counter that increments everytime an instance of this class is created
     class_creation_counter = 0
 
-    def __init__(self, file_path, pickle_dags, dag_id_white_list, zombies):
+    def __init__(self, file_path, pickle_dags, dag_id_white_list, zombies,
+                 failure_callbacks=None):
         """
         :param file_path: a Python file containing Airflow DAG definitions
         :type file_path: unicode
@@ -74,6 +194,8 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
         :type dag_id_whitelist: list[unicode]
         :param zombies: zombie task instances to kill
         :type zombies: list[airflow.utils.dag_processing.SimpleTaskInstance]
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
         """
         self._file_path = file_path
         # Queue that's used to pass results from the child process.
@@ -84,6 +206,7 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
         self._dag_id_white_list = dag_id_white_list
         self._pickle_dags = pickle_dags
         self._zombies = zombies
+        self._failure_callbacks = failure_callbacks or []
         # The result of Scheduler.process_file(file_path).
         self._result = None
         # Whether the process is done running.
@@ -105,7 +228,8 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
                         pickle_dags,
                         dag_id_white_list,
                         thread_name,
-                        zombies):
+                        zombies,
+                        failure_callbacks):
         """
         Launch a process to process the given file.
 
@@ -125,48 +249,23 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
         :rtype: multiprocessing.Process
         :param zombies: zombie task instances to kill
         :type zombies: list[airflow.utils.dag_processing.SimpleTaskInstance]
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
         """
         def helper():
             # This helper runs in the newly created process
-            log = logging.getLogger("airflow.processor")
-
-            stdout = StreamLogWriter(log, logging.INFO)
-            stderr = StreamLogWriter(log, logging.WARN)
-
-            set_context(log, file_path)
-
             try:
-                # redirect stdout/stderr to log
-                sys.stdout = stdout
-                sys.stderr = stderr
-
                 # Re-configure the ORM engine as there are issues with multiple processes
                 settings.configure_orm()
 
-                # Change the thread name to differentiate log lines. This is
-                # really a separate process, but changing the name of the
-                # process doesn't work, so changing the thread name instead.
-                threading.current_thread().name = thread_name
-                start_time = time.time()
-
-                log.info("Started process (PID=%s) to work on %s",
-                         os.getpid(), file_path)
-                scheduler_job = SchedulerJob(dag_ids=dag_id_white_list, log=log)
-                result = scheduler_job.process_file(file_path,
-                                                    zombies,
-                                                    pickle_dags)
+                result = DagFileProcessor._process_file(file_path,
+                                                        pickle_dags,
+                                                        dag_id_white_list,
+                                                        thread_name,
+                                                        zombies,
+                                                        failure_callbacks)
                 result_queue.put(result)
-                end_time = time.time()
-                log.info(
-                    "Processing %s took %.3f seconds", file_path, end_time - start_time
-                )
-            except Exception:
-                # Log exceptions through the logging framework.
-                log.exception("Got an exception! Propagating...")
-                raise
             finally:
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
                 # We re-initialized the ORM within this Process above so we need to
                 # tear it down manually here
                 settings.dispose_orm()
@@ -177,6 +276,58 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
         p.start()
         return p
 
+    @staticmethod
+    def _process_file(file_path,
+                      pickle_dags,
+                      dag_id_white_list,
+                      thread_name,
+                      zombies,
+                      failure_callbacks):
+        """
+        Process the given file in the current process, with stdout, stderr and
+        the processor logs redirected to the log of the file.
+
+        :return: result of running SchedulerJob.process_file()
+        :rtype: list[airflow.utils.dag_processing.SimpleDag]
+        """
+        log = logging.getLogger("airflow.processor")
+
+        stdout = StreamLogWriter(log, logging.INFO)
+        stderr = StreamLogWriter(log, logging.WARN)
+
+        set_context(log, file_path)
+
+        try:
+            # redirect stdout/stderr to log
+            sys.stdout = stdout
+            sys.stderr = stderr
+
+            # Change the thread name to differentiate log lines. This is
+            # really a separate process, but changing the name of the
+            # process doesn't work, so changing the thread name instead.
+            threading.current_thread().name = thread_name
+            start_time = time.time()
+
+            log.info("Started process (PID=%s) to work on %s",
+                     os.getpid(), file_path)
+            scheduler_job = SchedulerJob(dag_ids=dag_id_white_list, log=log)
+            result = scheduler_job.process_file(file_path,
+                                                zombies,
+                                                pickle_dags,
+                                                failure_callbacks)
+            end_time = time.time()
+            log.info(
+                "Processing %s took %.3f seconds", file_path, end_time - start_time
+            )
+            return result
+        except Exception:
+            # Log exceptions through the logging framework.
+            log.exception("Got an exception! Propagating...")
+            raise
+        finally:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+
     def start(self):
         """
         Launch the process and start processing the DAG.
@@ -187,7 +338,8 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
             self._pickle_dags,
             self._dag_id_white_list,
             "DagFileProcessor{}".format(self._instance_id),
-            self._zombies)
+            self._zombies,
+            self._failure_callbacks)
         self._start_time = timezone.utcnow()
 
     def terminate(self, sigkill=False):
@@ -286,6 +438,355 @@ class DagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
         return self._start_time
 
 
+class DagFileProcessorWorker(LoggingMixin):
+    """
+    A long lived process that processes the DAG files it is sent over a pipe,
+    one after the other. The given modules are imported once when the worker
+    starts instead of once per file. Modules imported by the DAG files stay
+    imported as well, so changes to them are only picked up once the worker
+    is recycled.
+
+    :param preload_modules: the modules to import when the worker starts
+    :type preload_modules: list[unicode]
+    """
+
+    def __init__(self, preload_modules):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=DagFileProcessorWorker._run,
+            args=(child_conn, self._conn, preload_modules),
+            name="DagFileProcessorWorker")
+        # The worker is not daemonic, so that the DAG files can start processes
+        # of their own. DagFileProcessorPool.terminate stops it.
+        self._process.start()
+        child_conn.close()
+        # Number of files processed by this worker
+        self.files_processed = 0
+        # Resident memory of the worker in MB after processing the last file
+        self.rss_mb = 0
+
+    @staticmethod
+    def _run(conn, parent_conn, preload_modules):
+        # This runs in the worker process. Close the parent end of the pipe so
+        # that reading from it fails when the parent goes away.
+        parent_conn.close()
+        log = logging.getLogger("airflow.processor")
+        for module in preload_modules:
+            try:
+                import_module(module)
+            except Exception:
+                log.exception("Could not preload module %s", module)
+
+        # Re-configure the ORM engine as there are issues with multiple processes
+        settings.configure_orm()
+        this_process = psutil.Process(os.getpid())
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    break
+                if request is None:
+                    break
+                try:
+                    result = DagFileProcessor._process_file(*request)
+                except Exception:
+                    result = None
+                conn.send((result, this_process.memory_info().rss / (1024 * 1024)))
+        finally:
+            settings.dispose_orm()
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    @property
+    def exitcode(self):
+        return self._process.exitcode
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def join(self, timeout=None):
+        self._process.join(timeout)
+
+    def submit(self, file_path, pickle_dags, dag_id_white_list, thread_name, zombies,
+               failure_callbacks):
+        """
+        Send a file to process to the worker, see DagFileProcessor._process_file.
+        """
+        self._conn.send((file_path, pickle_dags, dag_id_white_list, thread_name,
+                         zombies, failure_callbacks))
+
+    def poll(self):
+        """
+        :return: whether the result of the file being processed can be read
+            without blocking
+        :rtype: bool
+        """
+        return self._conn.poll()
+
+    def get_result(self):
+        """
+        :return: result of running SchedulerJob.process_file() on the file
+            sent to the worker, None if it failed
+        :rtype: list[airflow.utils.dag_processing.SimpleDag]
+        :raises EOFError: if the worker died
+        """
+        result, self.rss_mb = self._conn.recv()
+        self.files_processed += 1
+        return result
+
+    def stop(self):
+        """
+        Ask the worker to exit once it is done with the file it is processing.
+        """
+        try:
+            self._conn.send(None)
+        except (IOError, OSError):
+            pass
+        self._conn.close()
+
+    def kill(self, sigkill=False):
+        """
+        Terminate (and then kill) the worker.
+
+        :param sigkill: whether to issue a SIGKILL if SIGTERM doesn't work.
+        :type sigkill: bool
+        """
+        self._process.terminate()
+        # Arbitrarily wait 5s for the process to die
+        self._process.join(5)
+        if sigkill and self._process.is_alive():
+            self.log.warning("Killing PID %s", self._process.pid)
+            os.kill(self._process.pid, signal.SIGKILL)
+        self._conn.close()
+
+
+class DagFileProcessorPool(LoggingMixin):
+    """
+    Pool of DagFileProcessorWorkers, started on demand. Workers are recycled
+    once they processed a given number of files or grew above a given
+    resident memory.
+
+    :param preload_modules: the modules the workers import when they start
+    :type preload_modules: list[unicode]
+    :param max_files_per_worker: number of files a worker processes before
+        being recycled, 0 for no limit
+    :type max_files_per_worker: int
+    :param max_worker_rss_mb: resident memory in MB above which a worker is
+        recycled, 0 for no limit
+    :type max_worker_rss_mb: int
+    """
+
+    def __init__(self, preload_modules, max_files_per_worker, max_worker_rss_mb):
+        self._preload_modules = preload_modules
+        self._max_files_per_worker = max_files_per_worker
+        self._max_worker_rss_mb = max_worker_rss_mb
+        self._idle_workers = []
+        # The workers that were started and not recycled
+        self._workers = set()
+        # PID of the process the workers are terminated on exit of
+        self._finalizer_pid = None
+
+    def acquire(self):
+        """
+        :return: an idle worker, a new one if there is none
+        :rtype: DagFileProcessorWorker
+        """
+        while self._idle_workers:
+            worker = self._idle_workers.pop()
+            if worker.is_alive():
+                return worker
+            self._workers.discard(worker)
+
+        if self._finalizer_pid != os.getpid():
+            # The pool is created in the scheduler and used in the DAG file
+            # processor manager. multiprocessing runs the finalizers with an
+            # exit priority before it joins the children of an exiting process,
+            # which would otherwise wait for the idle workers forever.
+            Finalize(self, self.terminate, exitpriority=10)
+            self._finalizer_pid = os.getpid()
+        self._workers = {worker for worker in self._workers if worker.is_alive()}
+        worker = DagFileProcessorWorker(self._preload_modules)
+        self._workers.add(worker)
+        return worker
+
+    def release(self, worker):
+        """
+        Give a worker that is done processing a file back to the pool, or
+        recycle it.
+
+        :param worker: the worker
+        :type worker: DagFileProcessorWorker
+        """
+        if ((self._max_files_per_worker and
+                worker.files_processed >= self._max_files_per_worker) or
+                (self._max_worker_rss_mb and
+                 worker.rss_mb >= self._max_worker_rss_mb)):
+            self.log.debug("Recycling DAG file processor worker %s after %s files "
+                           "(%.0f MB)", worker.pid, worker.files_processed,
+                           worker.rss_mb)
+            worker.stop()
+            self._workers.discard(worker)
+        else:
+            self._idle_workers.append(worker)
+
+    def terminate(self):
+        """
+        Stop all the workers, and kill the ones that do not exit within 5
+        seconds.
+        """
+        workers = list(self._workers)
+        self._idle_workers = []
+        self._workers = set()
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            # Arbitrarily wait 5s for the worker to finish its file
+            worker.join(5)
+            if worker.is_alive():
+                worker.kill(sigkill=True)
+
+
+class PooledDagFileProcessor(AbstractDagFileProcessor, LoggingMixin):
+    """
+    Helps call SchedulerJob.process_file() in a worker of a
+    DagFileProcessorPool instead of a new process.
+    """
+
+    def __init__(self, pool, file_path, pickle_dags, dag_id_white_list, zombies,
+                 failure_callbacks=None):
+        """
+        :param pool: the pool of workers to process the file with
+        :type pool: DagFileProcessorPool
+        :param file_path: a Python file containing Airflow DAG definitions
+        :type file_path: unicode
+        :param pickle_dags: whether to serialize the DAG objects to the DB
+        :type pickle_dags: bool
+        :param dag_id_whitelist: If specified, only look at these DAG ID's
+        :type dag_id_whitelist: list[unicode]
+        :param zombies: zombie task instances to kill
+        :type zombies: list[airflow.utils.dag_processing.SimpleTaskInstance]
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
+        """
+        self._pool = pool
+        self._file_path = file_path
+        self._pickle_dags = pickle_dags
+        self._dag_id_white_list = dag_id_white_list
+        self._zombies = zombies
+        self._failure_callbacks = failure_callbacks or []
+        # The worker processing the file.
+        self._worker = None
+        self._result = None
+        self._done = False
+        self._start_time = None
+        self._instance_id = DagFileProcessor.class_creation_counter
+        DagFileProcessor.class_creation_counter += 1
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    def start(self):
+        """
+        Send the file to a worker of the pool.
+        """
+        self._worker = self._pool.acquire()
+        self._worker.submit(self._file_path,
+                            self._pickle_dags,
+                            self._dag_id_white_list,
+                            "DagFileProcessor{}".format(self._instance_id),
+                            self._zombies,
+                            self._failure_callbacks)
+        self._start_time = timezone.utcnow()
+
+    def terminate(self, sigkill=False):
+        """
+        Terminate (and then kill) the worker processing the file. It is not
+        given back to the pool.
+
+        :param sigkill: whether to issue a SIGKILL if SIGTERM doesn't work.
+        :type sigkill: bool
+        """
+        if self._worker is None:
+            raise AirflowException("Tried to call stop before starting!")
+        self._worker.kill(sigkill)
+
+    @property
+    def pid(self):
+        """
+        :return: the PID of the worker processing the file
+        :rtype: int
+        """
+        if self._worker is None:
+            raise AirflowException("Tried to get PID before starting!")
+        return self._worker.pid
+
+    @property
+    def exit_code(self):
+        """
+        After the file is processed, this can be called to get the exit code of
+        the worker if it died, 1 if processing the file failed and 0 otherwise.
+
+        :return: the exit code
+        :rtype: int
+        """
+        if not self._done:
+            raise AirflowException("Tried to call retcode before process was finished!")
+        if not self._worker.is_alive():
+            return self._worker.exitcode
+        return 0 if self._result is not None else 1
+
+    @property
+    def done(self):
+        """
+        Check if the worker is done processing this file.
+
+        :return: whether the file is processed
+        :rtype: bool
+        """
+        if self._worker is None:
+            raise AirflowException("Tried to see if it's done before starting!")
+
+        if self._done:
+            return True
+
+        if self._worker.poll() or not self._worker.is_alive():
+            self._done = True
+            try:
+                self._result = self._worker.get_result()
+            except EOFError:
+                self.log.warning("DAG file processor worker %s died while "
+                                 "processing %s", self._worker.pid, self._file_path)
+            else:
+                self._pool.release(self._worker)
+            return True
+
+        return False
+
+    @property
+    def result(self):
+        """
+        :return: result of running SchedulerJob.process_file()
+        :rtype: airflow.utils.dag_processing.SimpleDag
+        """
+        if not self.done:
+            raise AirflowException("Tried to get the result before it's done!")
+        return self._result
+
+    @property
+    def start_time(self):
+        """
+        :return: when this started to process the file
+        :rtype: datetime
+        """
+        if self._start_time is None:
+            raise AirflowException("Tried to get start time before it started!")
+        return self._start_time
+
+
 class SchedulerJob(BaseJob):
     """
     This SchedulerJob runs for a specific time interval and schedules the jobs
@@ -356,6 +857,16 @@ class SchedulerJob(BaseJob):
             self.using_sqlite = True
 
         self.max_tis_per_query = conf.getint('scheduler', 'max_tis_per_query')
+        self.set_based_scheduling = conf.getboolean('scheduler', 'set_based_scheduling')
+        self.max_tis_per_loop = conf.getint('scheduler', 'max_tis_per_loop')
+
+        self.bulk_dag_run_processing = conf.getboolean('scheduler',
+                                                       'bulk_dag_run_processing')
+
+        self.concurrency_ledger = None
+        if conf.getboolean('scheduler', 'use_concurrency_ledger'):
+            self.concurrency_ledger = ConcurrencyLedger(
+                conf.getint('scheduler', 'concurrency_ledger_reconcile_interval'))
         if run_duration is None:
             self.run_duration = conf.getint('scheduler',
                                             'run_duration')
@@ -737,21 +1248,110 @@ class SchedulerJob(BaseJob):
                                                 State.UP_FOR_RETRY,
                                                 State.UP_FOR_RESCHEDULE))
 
-            # this loop is quite slow as it uses are_dependencies_met for
-            # every task (in ti.is_runnable). This is also called in
-            # update_state above which has already checked these tasks
             for ti in tis:
-                task = dag.get_task(ti.task_id)
-
                 # fixme: ti.task is transient but needs to be set
-                ti.task = task
-
-                if ti.are_dependencies_met(
-                        dep_context=DepContext(flag_upstream_failed=True),
-                        session=session):
+                ti.task = dag.get_task(ti.task_id)
+
+            # The dependencies of all task instances of the run are evaluated
+            # against a single snapshot of the task instance states of the run
+            failed_dep_statuses = evaluate_many(
+                tis,
+                dep_context=DepContext(flag_upstream_failed=True),
+                session=session)
+            for ti in tis:
+                if not failed_dep_statuses[ti.key]:
                     self.log.debug('Queuing task: %s', ti)
                     task_instances_list.append(ti.key)
 
+    @provide_session
+    def _process_task_instances_bulk(self, dags, task_instances_list, session=None):
+        """
+        Bulk variant of ``_process_task_instances`` for all the DAGs of a file.
+        The RUNNING DagRuns of the DAGs and their task instances are loaded with
+        two queries, the DagRuns are verified, updated and their task instances
+        evaluated against that snapshot, and the changes are committed at once.
+
+        :param dags: the DAGs to schedule the tasks of
+        :type dags: list[airflow.models.DAG]
+        :param task_instances_list: A list to add the keys of the task instances
+            that should run to
+        :type task_instances_list: list[tuple]
+        """
+        TI = models.TaskInstance
+        dag_ids = [dag.dag_id for dag in dags]
+        dag_runs = (
+            session
+            .query(DagRun)
+            .filter(DagRun.dag_id.in_(dag_ids), DagRun.state == State.RUNNING)
+            .order_by(DagRun.execution_date)
+        ).all()
+        tis = (
+            session
+            .query(TI)
+            .join(DagRun, and_(TI.dag_id == DagRun.dag_id,
+                               TI.execution_date == DagRun.execution_date))
+            .filter(DagRun.dag_id.in_(dag_ids), DagRun.state == State.RUNNING)
+        ).all()
+
+        runs_by_dag_id = defaultdict(list)
+        for run in dag_runs:
+            runs_by_dag_id[run.dag_id].append(run)
+        tis_by_run = defaultdict(list)
+        for ti in tis:
+            tis_by_run[(ti.dag_id, ti.execution_date)].append(ti)
+
+        for dag in dags:
+            active_dag_runs = []
+            for run in runs_by_dag_id[dag.dag_id]:
+                self.log.info("Examining DAG run %s", run)
+                # don't consider runs that are executed in the future
+                if run.execution_date > timezone.utcnow():
+                    self.log.error(
+                        "Execution date is in future: %s",
+                        run.execution_date
+                    )
+                    continue
+
+                if len(active_dag_runs) >= dag.max_active_runs:
+                    self.log.info("Number of active dag runs reached max_active_run.")
+                    break
+
+                # skip backfill dagruns for now as long as they are not really scheduled
+                if run.is_backfill:
+                    continue
+
+                run.dag = dag
+                run_tis = tis_by_run[(run.dag_id, run.execution_date)]
+                if dag.partial:
+                    run_tis = [ti for ti in run_tis if ti.task_id in dag.task_dict]
+                run.verify_integrity(tis=run_tis, commit=False, session=session)
+                run.update_state(tis=run_tis, commit=False, session=session)
+                if run.state == State.RUNNING:
+                    active_dag_runs.append((run, run_tis))
+
+            for run, run_tis in active_dag_runs:
+                self.log.debug("Examining active DAG run: %s", run)
+                tis_to_examine = []
+                for ti in run_tis:
+                    if ti.state in (State.NONE, State.UP_FOR_RETRY,
+                                    State.UP_FOR_RESCHEDULE):
+                        ti.task = dag.get_task(ti.task_id)
+                        tis_to_examine.append(ti)
+
+                failed_dep_statuses = evaluate_many(
+                    tis_to_examine,
+                    dep_context=DepContext(
+                        flag_upstream_failed=True,
+                        dagrun_state_summary=DagRunStateSummary(
+                            dag, run.execution_date, run_tis)),
+                    session=session)
+                for ti in tis_to_examine:
+                    if not failed_dep_statuses[ti.key]:
+                        self.log.debug('Queuing task: %s', ti)
+                        task_instances_list.append(ti.key)
+
+        session.commit()
+
     @provide_session
     def _change_state_for_tis_without_dagrun(self,
                                              simple_dag_bag,
@@ -809,6 +1409,8 @@ class SchedulerJob(BaseJob):
                 "Set %s task instances to state=%s as their associated DagRun was not in RUNNING state",
                 tis_changed, new_state
             )
+            if self.concurrency_ledger:
+                self.concurrency_ledger.invalidate()
 
     @provide_session
     def __get_concurrency_maps(self, states, session=None):
@@ -838,32 +1440,60 @@ class SchedulerJob(BaseJob):
         return dag_map, task_map
 
     @provide_session
-    def _find_executable_task_instances(self, simple_dag_bag, states, session=None):
+    def _get_slot_usage_maps(self, states, session=None):
         """
-        Finds TIs that are ready for execution with respect to pool limits,
-        dag concurrency, executor state, and priority.
+        Get the pool, DAG and task concurrency maps with a single grouped query.
+
+        :param states: List of states to query for
+        :type states: list[airflow.utils.state.State]
+        :return: A map from pool to # of task instances, a map from dag_id to
+         # of task instances and a map from (dag_id, task_id) to # of task
+         instances in the given state list
+        :rtype: tuple[dict[str, int], dict[str, int], dict[tuple[str, str], int]]
+        """
+        if self.concurrency_ledger and \
+                set(states) == set(self.concurrency_ledger.states):
+            return self.concurrency_ledger.get_usage_maps(session=session)
 
+        TI = models.TaskInstance
+        usage_query = (
+            session
+            .query(TI.pool, TI.dag_id, TI.task_id, func.count('*'))
+            .filter(TI.state.in_(states))
+            .group_by(TI.pool, TI.dag_id, TI.task_id)
+        ).all()
+        pool_map = defaultdict(int)
+        dag_map = defaultdict(int)
+        task_map = defaultdict(int)
+        for pool, dag_id, task_id, count in usage_query:
+            pool_map[pool] += count
+            dag_map[dag_id] += count
+            task_map[(dag_id, task_id)] += count
+        return pool_map, dag_map, task_map
+
+    @staticmethod
+    def _filter_executable_ti_query(ti_query, simple_dag_bag, states):
+        """
+        Restrict a TaskInstance query to the task instances in the given states
+        that belong to the DAGs of the SimpleDagBag, are not part of a backfill
+        and whose DAG is not paused.
+
+        :param ti_query: query selecting TaskInstance entities or columns
+        :type ti_query: sqlalchemy.orm.query.Query
         :param simple_dag_bag: TaskInstances associated with DAGs in the
-            simple_dag_bag will be fetched from the DB and executed
+            simple_dag_bag will be fetched from the DB
         :type simple_dag_bag: airflow.utils.dag_processing.SimpleDagBag
-        :param executor: the executor that runs task instances
-        :type executor: BaseExecutor
-        :param states: Execute TaskInstances in these states
+        :param states: Only consider TaskInstances in these states
         :type states: tuple[airflow.utils.state.State]
-        :return: list[airflow.models.TaskInstance]
+        :rtype: sqlalchemy.orm.query.Query
         """
         from airflow.jobs.backfill_job import BackfillJob  # Avoid circular import
-        executable_tis = []
 
-        # Get all task instances associated with scheduled
-        # DagRuns which are not backfilled, in the given states,
-        # and the dag is not paused
         TI = models.TaskInstance
         DR = models.DagRun
         DM = models.DagModel
         ti_query = (
-            session
-            .query(TI)
+            ti_query
             .filter(TI.dag_id.in_(simple_dag_bag.dag_ids))
             .outerjoin(
                 DR,
@@ -883,6 +1513,36 @@ class SchedulerJob(BaseJob):
             )
         else:
             ti_query = ti_query.filter(TI.state.in_(states))
+        return ti_query
+
+    @provide_session
+    def _find_executable_task_instances(self, simple_dag_bag, states, session=None):
+        """
+        Finds TIs that are ready for execution with respect to pool limits,
+        dag concurrency, executor state, and priority.
+
+        :param simple_dag_bag: TaskInstances associated with DAGs in the
+            simple_dag_bag will be fetched from the DB and executed
+        :type simple_dag_bag: airflow.utils.dag_processing.SimpleDagBag
+        :param executor: the executor that runs task instances
+        :type executor: BaseExecutor
+        :param states: Execute TaskInstances in these states
+        :type states: tuple[airflow.utils.state.State]
+        :return: list[airflow.models.TaskInstance], or
+            list[ExecutableTaskInstance] if set based scheduling is enabled
+        """
+        if self.set_based_scheduling:
+            return self._find_executable_task_instances_set_based(
+                simple_dag_bag, states, session=session)
+
+        executable_tis = []
+
+        # Get all task instances associated with scheduled
+        # DagRuns which are not backfilled, in the given states,
+        # and the dag is not paused
+        TI = models.TaskInstance
+        ti_query = self._filter_executable_ti_query(
+            session.query(TI), simple_dag_bag, states)
 
         task_instances_to_examine = ti_query.all()
 
@@ -907,8 +1567,14 @@ class SchedulerJob(BaseJob):
 
         states_to_count_as_running = [State.RUNNING, State.QUEUED]
         # dag_id to # of running tasks and (dag_id, task_id) to # of running tasks.
-        dag_concurrency_map, task_concurrency_map = self.__get_concurrency_maps(
-            states=states_to_count_as_running, session=session)
+        pool_usage_map = None
+        if self.concurrency_ledger:
+            pool_usage_map, dag_concurrency_map, task_concurrency_map = \
+                self._get_slot_usage_maps(states=states_to_count_as_running,
+                                          session=session)
+        else:
+            dag_concurrency_map, task_concurrency_map = self.__get_concurrency_maps(
+                states=states_to_count_as_running, session=session)
 
         # Go through each pool, and queue up a task for execution if there are
         # any open slots in the pool.
@@ -918,7 +1584,12 @@ class SchedulerJob(BaseJob):
                 # Arbitrary:
                 # If queued outside of a pool, trigger no more than
                 # non_pooled_task_slot_count
-                open_slots = models.Pool.default_pool_open_slots()
+                if pool_usage_map is None:
+                    open_slots = models.Pool.default_pool_open_slots()
+                else:
+                    open_slots = (
+                        conf.getint('core', 'non_pooled_task_slot_count') -
+                        pool_usage_map[models.Pool.default_pool_name])
                 pool_name = models.Pool.default_pool_name
             else:
                 if pool not in pools:
@@ -927,8 +1598,10 @@ class SchedulerJob(BaseJob):
                         pool
                     )
                     open_slots = 0
-                else:
+                elif pool_usage_map is None:
                     open_slots = pools[pool].open_slots(session=session)
+                else:
+                    open_slots = pools[pool].slots - pool_usage_map[pool]
 
             num_ready = len(task_instances)
             self.log.info(
@@ -1013,6 +1686,202 @@ class SchedulerJob(BaseJob):
             ti.task_id = copy_task_id
         return executable_tis
 
+    @provide_session
+    def _find_executable_task_instances_set_based(self, simple_dag_bag, states,
+                                                  session=None):
+        """
+        Set based variant of ``_find_executable_task_instances``. Pool, DAG and
+        task concurrency are computed with grouped queries, the candidates are
+        read in priority order in pages of ``max_tis_per_loop`` until that many
+        task instances can be queued, and only the columns needed to queue a
+        task instance are loaded. The candidates of full pools and DAGs are
+        left out of each page by the query, and the pages continue after the
+        last candidate read, so the cost of a page does not grow with the
+        number of candidates.
+
+        :param simple_dag_bag: TaskInstances associated with DAGs in the
+            simple_dag_bag will be fetched from the DB and executed
+        :type simple_dag_bag: airflow.utils.dag_processing.SimpleDagBag
+        :param states: Execute TaskInstances in these states
+        :type states: tuple[airflow.utils.state.State]
+        :return: list[ExecutableTaskInstance]
+        """
+        executable_tis = []
+
+        TI = models.TaskInstance
+        candidate_counts = dict(
+            self._filter_executable_ti_query(
+                session.query(TI.pool, func.count('*')), simple_dag_bag, states
+            ).group_by(TI.pool).all())
+        num_candidates = sum(candidate_counts.values())
+        if num_candidates == 0:
+            self.log.debug("No tasks to consider for execution.")
+            return executable_tis
+
+        pools = {p.pool: p.slots for p in session.query(models.Pool).all()}
+
+        states_to_count_as_running = [State.RUNNING, State.QUEUED]
+        pool_usage_map, dag_concurrency_map, task_concurrency_map = \
+            self._get_slot_usage_maps(states=states_to_count_as_running,
+                                      session=session)
+
+        open_slots_map = {}
+        for pool in candidate_counts:
+            if not pool:
+                # Same accounting as Pool.default_pool_open_slots
+                open_slots_map[pool] = (
+                    conf.getint('core', 'non_pooled_task_slot_count') -
+                    pool_usage_map[models.Pool.default_pool_name])
+            elif pool not in pools:
+                self.log.warning(
+                    "Tasks using non-existent pool '%s' will not be scheduled",
+                    pool
+                )
+                open_slots_map[pool] = 0
+            else:
+                open_slots_map[pool] = pools[pool] - pool_usage_map[pool]
+        num_queued_map = defaultdict(int)
+
+        ti_query = self._filter_executable_ti_query(
+            session.query(TI.dag_id, TI.task_id, TI.execution_date, TI._try_number,
+                          TI.state, TI.pool, TI.priority_weight),
+            simple_dag_bag, states
+        )
+        last_row = None
+        while True:
+            # The candidates of the pools and DAGs that are full are not read,
+            # and neither are the candidates of the previous pages
+            page_query = self._exclude_full_pools_and_dags(
+                ti_query, simple_dag_bag, open_slots_map, dag_concurrency_map)
+            if last_row is not None:
+                page_query = page_query.filter(self._after_executable_ti(last_row))
+            page_query = page_query.order_by(
+                TI.priority_weight.desc(), TI.execution_date, TI.dag_id, TI.task_id)
+            if self.max_tis_per_loop > 0:
+                page_query = page_query.limit(self.max_tis_per_loop)
+            rows = page_query.all()
+
+            for dag_id, task_id, execution_date, try_number, state, pool, \
+                    priority_weight in rows:
+                if len(executable_tis) >= self.max_tis_per_loop > 0:
+                    break
+
+                # Pools and DAGs can fill up within a page
+                if open_slots_map.get(pool, 0) <= 0:
+                    continue
+
+                simple_dag = simple_dag_bag.get_dag(dag_id)
+                if dag_concurrency_map[dag_id] >= simple_dag.concurrency:
+                    self.log.debug(
+                        "Not executing %s.%s since DAG %s reached its task "
+                        "concurrency limit of %s",
+                        dag_id, task_id, dag_id, simple_dag.concurrency
+                    )
+                    continue
+
+                task_concurrency_limit = simple_dag.get_task_special_arg(
+                    task_id, 'task_concurrency')
+                if (task_concurrency_limit is not None and
+                        task_concurrency_map[(dag_id, task_id)] >= task_concurrency_limit):
+                    self.log.debug("Not executing %s.%s since the task concurrency for"
+                                   " this task has been reached.", dag_id, task_id)
+                    continue
+
+                # The try number of a task instance that is not running is the
+                # next try, see TaskInstance.try_number
+                if state != State.RUNNING:
+                    try_number += 1
+                task_instance = ExecutableTaskInstance(
+                    dag_id, task_id, execution_date, try_number, pool, priority_weight)
+                if self.executor.has_task(task_instance):
+                    self.log.debug(
+                        "Not handling task %s as the executor reports it is running",
+                        task_instance.key
+                    )
+                    continue
+
+                executable_tis.append(task_instance)
+                open_slots_map[pool] -= 1
+                num_queued_map[pool] += 1
+                dag_concurrency_map[dag_id] += 1
+                task_concurrency_map[(dag_id, task_id)] += 1
+
+            if (self.max_tis_per_loop <= 0 or
+                    len(executable_tis) >= self.max_tis_per_loop or
+                    len(rows) < self.max_tis_per_loop):
+                break
+            last_row = rows[-1]
+
+        self.log.info("%s tasks up for execution", num_candidates)
+
+        for pool, open_slots in open_slots_map.items():
+            num_starving_tasks = 0
+            if open_slots <= 0:
+                num_starving_tasks = candidate_counts[pool] - num_queued_map[pool]
+            Stats.gauge('pool.starving_tasks.{pool_name}'.format(
+                pool_name=pool or models.Pool.default_pool_name),
+                num_starving_tasks)
+
+        self.log.info("Found %s task instances to queue", len(executable_tis))
+        return executable_tis
+
+    @staticmethod
+    def _exclude_full_pools_and_dags(ti_query, simple_dag_bag, open_slots_map,
+                                     dag_concurrency_map):
+        """
+        Restrict a TaskInstance query to the task instances whose pool has open
+        slots and whose DAG did not reach its concurrency.
+
+        :param ti_query: query selecting TaskInstance columns
+        :type ti_query: sqlalchemy.orm.query.Query
+        :param simple_dag_bag: the DAGs of the task instances
+        :type simple_dag_bag: airflow.utils.dag_processing.SimpleDagBag
+        :param open_slots_map: the open slots by pool
+        :type open_slots_map: dict[str, int]
+        :param dag_concurrency_map: the running task instances by dag_id
+        :type dag_concurrency_map: dict[str, int]
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        TI = models.TaskInstance
+        full_pools = [pool for pool, open_slots in open_slots_map.items()
+                      if open_slots <= 0]
+        named_full_pools = [pool for pool in full_pools if pool]
+        if named_full_pools:
+            ti_query = ti_query.filter(or_(TI.pool == None,  # noqa: E711
+                                           TI.pool.notin_(named_full_pools)))
+        if len(named_full_pools) < len(full_pools):
+            # The task instances without a pool share the default pool
+            ti_query = ti_query.filter(TI.pool != None, TI.pool != '')  # noqa: E711
+
+        full_dag_ids = [dag_id for dag_id in simple_dag_bag.dag_ids
+                        if dag_concurrency_map[dag_id] >=
+                        simple_dag_bag.get_dag(dag_id).concurrency]
+        if full_dag_ids:
+            ti_query = ti_query.filter(TI.dag_id.notin_(full_dag_ids))
+        return ti_query
+
+    @staticmethod
+    def _after_executable_ti(row):
+        """
+        Filter on the task instances that come after a task instance in the
+        order candidates are read in: by priority weight descending, then
+        execution date, dag_id and task_id.
+
+        :param row: the dag_id, task_id, execution_date, try number, state, pool
+            and priority weight of the task instance
+        :type row: tuple
+        """
+        TI = models.TaskInstance
+        dag_id, task_id, execution_date = row[:3]
+        priority_weight = row[6]
+        return or_(
+            TI.priority_weight < priority_weight,
+            and_(TI.priority_weight == priority_weight,
+                 or_(TI.execution_date > execution_date,
+                     and_(TI.execution_date == execution_date,
+                          or_(TI.dag_id > dag_id,
+                              and_(TI.dag_id == dag_id, TI.task_id > task_id))))))
+
     @provide_session
     def _change_state_for_executable_task_instances(self, task_instances,
                                                     acceptable_states, session=None):
@@ -1075,6 +1944,9 @@ class SchedulerJob(BaseJob):
             [repr(x) for x in tis_to_set_to_queued])
 
         session.commit()
+        if self.concurrency_ledger:
+            for task_instance in tis_to_set_to_queued:
+                self.concurrency_ledger.occupy(task_instance)
         self.log.info("Setting the following %s tasks to queued state:\n\t%s",
                       len(tis_to_set_to_queued), task_instance_str)
         return simple_task_instances
@@ -1196,6 +2068,11 @@ class SchedulerJob(BaseJob):
                 [repr(x) for x in tis_to_set_to_scheduled])
 
             session.commit()
+            if self.concurrency_ledger:
+                for task_instance in tis_to_set_to_scheduled:
+                    self.concurrency_ledger.release(task_instance.dag_id,
+                                                    task_instance.task_id,
+                                                    task_instance.execution_date)
             self.log.info("Set the following tasks to scheduled state:\n\t%s", task_instance_str)
 
     def _process_dags(self, dagbag, dags, tis_out):
@@ -1214,6 +2091,7 @@ class SchedulerJob(BaseJob):
         :type tis_out: list[TaskInstance]
         :rtype: None
         """
+        dags_to_process = []
         for dag in dags:
             dag = dagbag.get_dag(dag.dag_id)
             if not dag:
@@ -1235,17 +2113,28 @@ class SchedulerJob(BaseJob):
                         'dagrun.schedule_delay.{dag_id}'.format(dag_id=dag.dag_id),
                         schedule_delay)
                 self.log.info("Created %s", dag_run)
+            if self.bulk_dag_run_processing:
+                dags_to_process.append(dag)
+                continue
             self._process_task_instances(dag, tis_out)
             self.manage_slas(dag)
 
+        if dags_to_process:
+            self._process_task_instances_bulk(dags_to_process, tis_out)
+            for dag in dags_to_process:
+                self.manage_slas(dag)
+
     @provide_session
     def _process_executor_events(self, simple_dag_bag, session=None):
         """
-        Respond to executor events.
+        Respond to executor events. The task instances of the events are read
+        in batches of max_tis_per_query, and the failures of the task instances
+        killed externally are handled by the processors of their DAG files,
+        which have the DAGs parsed already.
         """
         # TODO: this shares quite a lot of code with _manage_executor_state
 
-        TI = models.TaskInstance
+        finished_keys = []
         for key, state in list(self.executor.get_event_buffer(simple_dag_bag.dag_ids)
                                    .items()):
             dag_id, task_id, execution_date, try_number = key
@@ -1255,12 +2144,31 @@ class SchedulerJob(BaseJob):
                 dag_id, task_id, execution_date, state, try_number
             )
             if state == State.FAILED or state == State.SUCCESS:
-                qry = session.query(TI).filter(TI.dag_id == dag_id,
-                                               TI.task_id == task_id,
-                                               TI.execution_date == execution_date)
-                ti = qry.first()
+                if self.concurrency_ledger:
+                    self.concurrency_ledger.release(dag_id, task_id, execution_date)
+                finished_keys.append((key, state))
+
+        if not finished_keys:
+            return
+
+        TI = models.TaskInstance
+        failure_callbacks = []
+        chunk_size = self.max_tis_per_query or len(finished_keys)
+        for chunk in helpers.chunks(finished_keys, chunk_size):
+            filter_for_tis = [and_(TI.dag_id == dag_id,
+                                   TI.task_id == task_id,
+                                   TI.execution_date == execution_date)
+                              for (dag_id, task_id, execution_date, _), _ in chunk]
+            tis = {(ti.dag_id, ti.task_id, ti.execution_date): ti
+                   for ti in session.query(TI).filter(or_(*filter_for_tis))}
+
+            for key, state in chunk:
+                dag_id, task_id, execution_date, try_number = key
+                ti = tis.get((dag_id, task_id, execution_date))
                 if not ti:
-                    self.log.warning("TaskInstance %s went missing from the database", ti)
+                    self.log.warning("TaskInstance %s.%s execution_date=%s went "
+                                     "missing from the database",
+                                     dag_id, task_id, execution_date)
                     continue
 
                 # TODO: should we fail RUNNING as well, as we do in Backfills?
@@ -1269,19 +2177,60 @@ class SchedulerJob(BaseJob):
                            "although the task says its {}. Was the task "
                            "killed externally?".format(ti, state, ti.state))
                     self.log.error(msg)
-                    try:
-                        simple_dag = simple_dag_bag.get_dag(dag_id)
-                        dagbag = models.DagBag(simple_dag.full_filepath)
-                        dag = dagbag.get_dag(dag_id)
-                        ti.task = dag.get_task(task_id)
-                        ti.handle_failure(msg)
-                    except Exception:
-                        self.log.error("Cannot load the dag bag to handle failure for %s"
-                                       ". Setting task to FAILED without callbacks or "
-                                       "retries. Do you have enough resources?", ti)
-                        ti.state = State.FAILED
-                        session.merge(ti)
-                        session.commit()
+                    simple_dag = simple_dag_bag.get_dag(dag_id)
+                    failure_callbacks.append(FailureCallbackRequest(
+                        simple_dag.full_filepath, SimpleTaskInstance(ti), msg))
+
+        if not failure_callbacks:
+            return
+        if self.processor_agent:
+            self.processor_agent.send_failure_callbacks(failure_callbacks)
+        else:
+            self._handle_failure_callbacks_in_process(failure_callbacks, session=session)
+
+    @provide_session
+    def _handle_failure_callbacks_in_process(self, failure_callbacks, session=None):
+        """
+        Handle failures of task instances without DAG file processors, parsing
+        each DAG file once.
+
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
+        """
+        failure_callbacks_by_file = defaultdict(list)
+        for request in failure_callbacks:
+            failure_callbacks_by_file[request.full_filepath].append(request)
+
+        for file_path, requests in failure_callbacks_by_file.items():
+            try:
+                dags = models.DagBag(file_path).dags
+            except Exception:
+                self.log.exception("Cannot load the dag bag %s to handle failures. "
+                                   "Do you have enough resources?", file_path)
+                dags = {}
+            self._handle_failure_callbacks(dags, requests, session=session)
+
+    def _handle_unhandled_failure_callbacks(self, all_pending=False):
+        """
+        Set the task instances of the failure callbacks that no DAG file
+        processor could handle to FAILED, e.g. because their DAG file was
+        deleted or could not be parsed.
+
+        :param all_pending: whether to include the failure callbacks the DAG
+            file processors did not handle yet
+        :type all_pending: bool
+        """
+        failure_callbacks = self.processor_agent.harvest_unhandled_failure_callbacks(
+            all_pending=all_pending)
+        if not failure_callbacks:
+            return
+        self.log.warning("Setting %s task instances whose failure could not be "
+                         "handled by a DAG file processor to FAILED",
+                         len(failure_callbacks))
+        try:
+            self._handle_failure_callbacks({}, failure_callbacks)
+        except Exception:
+            self.log.exception("Error handling task instance failures!")
 
     def _execute(self):
         self.log.info("Starting the scheduler")
@@ -1300,11 +2249,30 @@ class SchedulerJob(BaseJob):
         known_file_paths = list_py_file_paths(self.subdir)
         self.log.info("There are %s files in %s", len(known_file_paths), self.subdir)
 
-        def processor_factory(file_path, zombies):
-            return DagFileProcessor(file_path,
-                                    pickle_dags,
-                                    self.dag_ids,
-                                    zombies)
+        if conf.getboolean('scheduler', 'use_dag_processor_pool'):
+            preload_modules = [
+                module.strip() for module in
+                conf.get('scheduler', 'dag_processor_preload_modules').split(',')
+                if module.strip()]
+            processor_pool = DagFileProcessorPool(
+                preload_modules,
+                conf.getint('scheduler', 'dag_processor_max_files_per_worker'),
+                conf.getint('scheduler', 'dag_processor_max_worker_rss_mb'))
+
+            def processor_factory(file_path, zombies, failure_callbacks):
+                return PooledDagFileProcessor(processor_pool,
+                                              file_path,
+                                              pickle_dags,
+                                              self.dag_ids,
+                                              zombies,
+                                              failure_callbacks)
+        else:
+            def processor_factory(file_path, zombies, failure_callbacks):
+                return DagFileProcessor(file_path,
+                                        pickle_dags,
+                                        self.dag_ids,
+                                        zombies,
+                                        failure_callbacks)
 
         # When using sqlite, we do not use async_mode
         # so the scheduler job and DAG parser don't access the DB at the same time.
@@ -1371,6 +2339,7 @@ class SchedulerJob(BaseJob):
             self.log.debug("Harvesting DAG parsing results")
             simple_dags = self.processor_agent.harvest_simple_dags()
             self.log.debug("Harvested {} SimpleDAGs".format(len(simple_dags)))
+            self._handle_unhandled_failure_callbacks()
 
             # Send tasks for execution if available
             simple_dag_bag = SimpleDagBag(simple_dags)
@@ -1429,8 +2398,10 @@ class SchedulerJob(BaseJob):
                 loop_duration)
 
             if not is_unit_test:
-                self.log.debug("Sleeping for %.2f seconds", self._processor_poll_interval)
-                time.sleep(self._processor_poll_interval)
+                # Wakes up early when the executor has task state changes to sync
+                self.log.debug("Waiting for at most %.2f seconds",
+                               self._processor_poll_interval)
+                self.executor.wait_for_events(self._processor_poll_interval)
 
             # Exit early for a test mode, run one additional scheduler loop
             # to reduce the possibility that parsed DAG was put into the queue
@@ -1448,10 +2419,11 @@ class SchedulerJob(BaseJob):
                 self.log.debug(
                     "Sleeping for {0:.2f} seconds to prevent excessive logging"
                     .format(sleep_length))
-                sleep(sleep_length)
+                time.sleep(sleep_length)
 
         # Stop any processors
         self.processor_agent.terminate()
+        self._handle_unhandled_failure_callbacks(all_pending=True)
 
         # Verify that all files were processed, and if so, deactivate DAGs that
         # haven't been touched by the scheduler as they likely have been
@@ -1468,7 +2440,8 @@ class SchedulerJob(BaseJob):
         settings.Session.remove()
 
     @provide_session
-    def process_file(self, file_path, zombies, pickle_dags=False, session=None):
+    def process_file(self, file_path, zombies, pickle_dags=False,
+                     failure_callbacks=None, session=None):
         """
         Process a Python file containing Airflow DAGs.
 
@@ -1481,6 +2454,8 @@ class SchedulerJob(BaseJob):
         4. Record any errors importing the file into ORM
         5. Kill (in ORM) any task instances belonging to the DAGs that haven't
         issued a heartbeat in a while.
+        6. Handle the failures of task instances the executor reported as
+        finished although they were still queued.
 
         Returns a list of SimpleDag objects that represent the DAGs found in
         the file
@@ -1492,6 +2467,8 @@ class SchedulerJob(BaseJob):
         :param pickle_dags: whether serialize the DAGs found in the file and
             save them to the db
         :type pickle_dags: bool
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
         :return: a list of SimpleDags made from the Dags found in the file
         :rtype: list[airflow.utils.dag_processing.SimpleDagBag]
         """
@@ -1504,6 +2481,7 @@ class SchedulerJob(BaseJob):
         except Exception:
             self.log.exception("Failed at reloading the DAG file %s", file_path)
             Stats.incr('dag_file_refresh_error', 1, 1)
+            self._handle_failure_callbacks({}, failure_callbacks or [], session=session)
             return []
 
         if len(dagbag.dags) > 0:
@@ -1511,6 +2489,7 @@ class SchedulerJob(BaseJob):
         else:
             self.log.warning("No viable dags retrieved from %s", file_path)
             self.update_import_errors(session, dagbag)
+            self._handle_failure_callbacks({}, failure_callbacks or [], session=session)
             return []
 
         # Save individual DAGs in the ORM and update DagModel.last_scheduled_time
@@ -1585,9 +2564,53 @@ class SchedulerJob(BaseJob):
             dagbag.kill_zombies(zombies)
         except Exception:
             self.log.exception("Error killing zombies!")
+        try:
+            self._handle_failure_callbacks(dagbag.dags, failure_callbacks or [],
+                                           session=session)
+        except Exception:
+            self.log.exception("Error handling task instance failures!")
 
         return simple_dags
 
+    @provide_session
+    def _handle_failure_callbacks(self, dags, failure_callbacks, session=None):
+        """
+        Handle the failures of task instances, running their callbacks and
+        retries. The task instances whose DAG is not available are set to FAILED
+        without callbacks or retries.
+
+        :param dags: the DAGs parsed from the DAG file of the task instances,
+            by DAG ID
+        :type dags: dict[unicode, airflow.models.DAG]
+        :param failure_callbacks: failures of task instances to handle
+        :type failure_callbacks: list[airflow.utils.dag_processing.FailureCallbackRequest]
+        """
+        TI = models.TaskInstance
+        for request in failure_callbacks:
+            simple_ti = request.simple_task_instance
+            ti = (session.query(TI)
+                  .filter(TI.dag_id == simple_ti.dag_id,
+                          TI.task_id == simple_ti.task_id,
+                          TI.execution_date == simple_ti.execution_date)
+                  .first())
+            # The task instance may have been run again since the executor
+            # reported it
+            if (not ti or ti.state != State.QUEUED or
+                    ti.try_number != simple_ti.try_number):
+                continue
+
+            dag = dags.get(simple_ti.dag_id)
+            if dag is not None and dag.has_task(simple_ti.task_id):
+                ti.task = dag.get_task(simple_ti.task_id)
+                ti.handle_failure(request.msg, session=session)
+            else:
+                self.log.error("Cannot load the DAG to handle failure for %s"
+                               ". Setting task to FAILED without callbacks or "
+                               "retries.", ti)
+                ti.state = State.FAILED
+                session.merge(ti)
+        session.commit()
+
     @provide_session
     def heartbeat_callback(self, session=None):
         Stats.incr('scheduler_heartbeat', 1, 1)
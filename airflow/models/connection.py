@@ -145,6 +145,16 @@ class Connection(Base, LoggingMixin):
         if uri_parts.query:
             self.extra = json.dumps(dict(parse_qsl(uri_parts.query)))
 
+    def _decrypt(self, value):
+        # Decrypt each value once, the connections can be cached and shared,
+        # see BaseHook.get_connections
+        decrypted_values = getattr(self, '_decrypted_values', None)
+        if decrypted_values is None:
+            decrypted_values = self._decrypted_values = {}
+        if value not in decrypted_values:
+            decrypted_values[value] = get_fernet().decrypt(bytes(value, 'utf-8')).decode()
+        return decrypted_values[value]
+
     def get_password(self):
         if self._password and self.is_encrypted:
             fernet = get_fernet()
@@ -152,7 +162,7 @@ class Connection(Base, LoggingMixin):
                 raise AirflowException(
                     "Can't decrypt encrypted password for login={}, \
                     FERNET_KEY configuration is missing".format(self.login))
-            return fernet.decrypt(bytes(self._password, 'utf-8')).decode()
+            return self._decrypt(self._password)
         else:
             return self._password
 
@@ -174,7 +184,7 @@ class Connection(Base, LoggingMixin):
                 raise AirflowException(
                     "Can't decrypt `extra` params for login={},\
                     FERNET_KEY configuration is missing".format(self.login))
-            return fernet.decrypt(bytes(self._extra, 'utf-8')).decode()
+            return self._decrypt(self._extra)
         else:
             return self._extra
 
@@ -39,6 +39,7 @@ from airflow.exceptions import AirflowDagCycleException
 from airflow.executors import get_default_executor
 from airflow.settings import Stats
 from airflow.utils import timezone
+from airflow.utils.dag_file_cache import get_dag_file_cache
 from airflow.utils.dag_processing import list_py_file_paths, correct_maybe_zipped
 from airflow.utils.db import provide_session
 from airflow.utils.helpers import pprinttable
@@ -93,6 +94,7 @@ class DagBag(BaseDagBag, LoggingMixin):
         self.executor = executor
         self.import_errors = {}
         self.has_logged = False
+        self.dag_file_cache = get_dag_file_cache()
 
         self.collect_dags(
             dag_folder=dag_folder,
@@ -268,6 +270,8 @@ class DagBag(BaseDagBag, LoggingMixin):
                             file_last_changed_on_disk
 
         self.file_last_changed[filepath] = file_last_changed_on_disk
+        if self.dag_file_cache and filepath not in self.import_errors:
+            self.dag_file_cache.put(filepath, found_dags)
         return found_dags
 
     @provide_session
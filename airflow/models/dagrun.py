@@ -16,6 +16,7 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+from collections import Counter, defaultdict
 from typing import Optional, cast
 
 import six
@@ -248,17 +249,24 @@ class DagRun(Base, LoggingMixin):
         ).first()
 
     @provide_session
-    def update_state(self, session=None):
+    def update_state(self, tis=None, commit=True, session=None):
         """
         Determines the overall state of the DagRun based on the state
         of its TaskInstances.
 
+        :param tis: the task instances of this DagRun, if they were already loaded
+        :type tis: list[airflow.models.TaskInstance]
+        :param commit: whether to commit the session
+        :type commit: bool
         :return: State
         """
 
         dag = self.get_dag()
 
-        tis = self.get_task_instances(session=session)
+        if tis is None:
+            tis = self.get_task_instances(session=session)
+        else:
+            tis = list(tis)
         self.log.debug("Updating state for %s considering %s task(s)", self, len(tis))
 
         for ti in list(tis):
@@ -269,18 +277,16 @@ class DagRun(Base, LoggingMixin):
                 ti.task = dag.get_task(ti.task_id)
 
         # pre-calculate
-        # db is faster
         start_dttm = timezone.utcnow()
-        unfinished_tasks = self.get_task_instances(
-            state=State.unfinished(),
-            session=session
-        )
+        unfinished_tasks = [t for t in tis if t.state in State.unfinished()]
         none_depends_on_past = all(not t.task.depends_on_past for t in unfinished_tasks)
         none_task_concurrency = all(t.task.task_concurrency is None
                                     for t in unfinished_tasks)
         # small speed up
         if unfinished_tasks and none_depends_on_past and none_task_concurrency:
-            # todo: this can actually get pretty slow: one task costs between 0.01-015s
+            # Trigger rules are evaluated against the upstream states summarized
+            # from the task instances loaded above instead of one query per task
+            state_summary = DagRunStateSummary(dag, self.execution_date, tis)
             no_dependencies_met = True
             for ut in unfinished_tasks:
                 # We need to flag upstream and check for changes because upstream
@@ -290,9 +296,10 @@ class DagRun(Base, LoggingMixin):
                     dep_context=DepContext(
                         flag_upstream_failed=True,
                         ignore_in_retry_period=True,
-                        ignore_in_reschedule_period=True),
+                        ignore_in_reschedule_period=True,
+                        dagrun_state_summary=state_summary),
                     session=session)
-                if deps_met or old_state != ut.current_state(session=session):
+                if deps_met or old_state != ut.state:
                     no_dependencies_met = False
                     break
 
@@ -333,7 +340,8 @@ class DagRun(Base, LoggingMixin):
 
         # todo: determine we want to use with_for_update to make sure to lock the run
         session.merge(self)
-        session.commit()
+        if commit:
+            session.commit()
 
         return self.state
 
@@ -348,20 +356,28 @@ class DagRun(Base, LoggingMixin):
             Stats.timing('dagrun.duration.failed.{}'.format(self.dag_id), duration)
 
     @provide_session
-    def verify_integrity(self, session=None):
+    def verify_integrity(self, tis=None, commit=True, session=None):
         """
         Verifies the DagRun by checking for removed tasks or tasks that are not in the
         database yet. It will set state to removed or add the task if required.
+
+        :param tis: the task instances of this DagRun, if they were already loaded.
+            Task instances created for missing tasks are appended to it.
+        :type tis: list[airflow.models.TaskInstance]
+        :param commit: whether to commit the session
+        :type commit: bool
         """
         from airflow.models.taskinstance import TaskInstance  # Avoid circular import
 
         dag = self.get_dag()
-        tis = self.get_task_instances(session=session)
+        start_dttm = timezone.utcnow()
+        if tis is None:
+            tis = self.get_task_instances(session=session)
 
         # check for removed or restored tasks
-        task_ids = []
+        task_ids = set()
         for ti in tis:
-            task_ids.append(ti.task_id)
+            task_ids.add(ti.task_id)
             task = None
             try:
                 task = dag.get_task(ti.task_id)
@@ -384,18 +400,31 @@ class DagRun(Base, LoggingMixin):
                 ti.state = State.NONE
 
         # check for missing tasks
+        missing_tis = []
+        created_counts = Counter()
         for task in six.itervalues(dag.task_dict):
+            if task.task_id in task_ids:
+                continue
             if task.start_date > self.execution_date and not self.is_backfill:
                 continue
 
-            if task.task_id not in task_ids:
+            created_counts[task.__class__.__name__] += 1
+            missing_tis.append(TaskInstance(task, self.execution_date))
+
+        if missing_tis:
+            # Insert the missing task instances with a single executemany
+            # instead of flushing them one by one
+            session.bulk_save_objects(missing_tis)
+            tis.extend(missing_tis)
+            for operator_name, count in six.iteritems(created_counts):
                 Stats.incr(
-                    "task_instance_created-{}".format(task.__class__.__name__),
-                    1, 1)
-                ti = TaskInstance(task, self.execution_date)
-                session.add(ti)
+                    "task_instance_created-{}".format(operator_name), count, 1)
 
-        session.commit()
+        if commit:
+            session.commit()
+
+        duration = (timezone.utcnow() - start_dttm).total_seconds() * 1000
+        Stats.timing("dagrun.verify-integrity.{}".format(self.dag_id), duration)
 
     @staticmethod
     def get_run(session, dag_id, execution_date):
@@ -444,3 +473,195 @@ class DagRun(Base, LoggingMixin):
             .all()
         )
         return dagruns
+
+
+class DagRunStateSummary(object):
+    """
+    In-memory summary of the task instance states of a DagRun: the number of
+    task instances per state and, for every task, the tallies of its upstream
+    task instances per state. It is built once from the task instances of the
+    run and kept up to date with ``update`` as task instances change state, so
+    that trigger rules can be evaluated without querying the database.
+
+    :param dag: the DAG of the DagRun
+    :type dag: airflow.models.DAG
+    :param execution_date: the execution date of the DagRun
+    :type execution_date: datetime.datetime
+    :param tis: the task instances of the DagRun
+    :type tis: list[airflow.models.TaskInstance]
+    """
+
+    def __init__(self, dag, execution_date, tis):
+        self.dag_id = dag.dag_id
+        self.execution_date = execution_date
+        self._dag = dag
+        self._states = {}
+        self.state_counts = Counter()
+        self._upstream_counts = defaultdict(Counter)
+        for ti in tis:
+            self.update(ti.task_id, ti.state)
+
+        # Loaded on first use, see get_previous_ti and get_num_running_task_instances
+        self._dagrun_exists = None
+        self._previous_dagrun = None
+        self._previous_tis = None
+        self._running_counts = None
+
+    @classmethod
+    @provide_session
+    def from_db(cls, dag, execution_date, session=None):
+        """
+        Builds the summary for the DagRun of the given DAG and execution date
+        from the states of its task instances, fetched with a single query.
+        """
+        from airflow.models.taskinstance import TaskInstance  # Avoid circular import
+        TI = TaskInstance
+        tis = session.query(TI.task_id, TI.state).filter(
+            TI.dag_id == dag.dag_id,
+            TI.execution_date == execution_date,
+        ).all()
+        return cls(dag, execution_date, tis)
+
+    def covers(self, ti):
+        """
+        Whether the given task instance belongs to the summarized DagRun.
+        """
+        return (ti.dag_id == self.dag_id and
+                ti.execution_date == self.execution_date)
+
+    def get_state(self, task_id):
+        return self._states.get(task_id)
+
+    def update(self, task_id, state):
+        """
+        Record the new state of a task instance.
+
+        :param task_id: the task id of the task instance
+        :type task_id: unicode
+        :param state: the new state of the task instance
+        :type state: unicode
+        """
+        known = task_id in self._states
+        old_state = self._states.get(task_id)
+        if known:
+            if old_state == state:
+                return
+            self.state_counts[old_state] -= 1
+        self._states[task_id] = state
+        self.state_counts[state] += 1
+
+        # Task instances of tasks that are not in the DAG (anymore) are
+        # nobody's upstream
+        task = self._dag.task_dict.get(task_id)
+        if task is None:
+            return
+        for downstream_task_id in task.downstream_task_ids:
+            counts = self._upstream_counts[downstream_task_id]
+            if known:
+                counts[old_state] -= 1
+            counts[state] += 1
+
+    def upstream_counts(self, task_id):
+        """
+        :return: the number of successful, skipped, failed, upstream_failed and
+            done upstream task instances of the given task
+        :rtype: tuple[int, int, int, int, int]
+        """
+        counts = self._upstream_counts[task_id]
+        successes = counts[State.SUCCESS]
+        skipped = counts[State.SKIPPED]
+        failed = counts[State.FAILED]
+        upstream_failed = counts[State.UPSTREAM_FAILED]
+        return (successes, skipped, failed, upstream_failed,
+                successes + skipped + failed + upstream_failed)
+
+    def _load_previous_dagrun(self, session):
+        """
+        Loads the previous DagRun, as found by TaskInstance.previous_ti, and all
+        of its task instances with one query.
+        """
+        from airflow.models.taskinstance import TaskInstance  # Avoid circular import
+        TI = TaskInstance
+
+        self._previous_dagrun = None
+        self._previous_tis = {}
+        dr = DagRun.find(dag_id=self.dag_id, execution_date=self.execution_date,
+                         session=session)
+        self._dagrun_exists = bool(dr)
+        if not dr:
+            return
+
+        dr = dr[0]
+        dr.dag = self._dag
+        if self._dag.catchup is True and self._dag.schedule_interval is not None:
+            self._previous_dagrun = dr.get_previous_scheduled_dagrun(session=session)
+        else:
+            self._previous_dagrun = dr.get_previous_dagrun(session=session)
+        if self._previous_dagrun:
+            self._previous_tis = {
+                ti.task_id: ti for ti in session.query(TI).filter(
+                    TI.dag_id == self.dag_id,
+                    TI.execution_date == self._previous_dagrun.execution_date)
+            }
+
+    @provide_session
+    def has_dagrun(self, session=None):
+        """
+        Whether the summarized DagRun exists in the database. The summary can
+        only answer questions about previous DagRuns if it does.
+        """
+        if self._previous_tis is None:
+            self._load_previous_dagrun(session)
+        return self._dagrun_exists
+
+    @provide_session
+    def get_previous_dagrun(self, session=None):
+        """
+        :return: the DagRun the previous task instances belong to, see
+            TaskInstance.previous_ti
+        :rtype: DagRun
+        """
+        if self._previous_tis is None:
+            self._load_previous_dagrun(session)
+        return self._previous_dagrun
+
+    @provide_session
+    def get_previous_ti(self, task_id, session=None):
+        """
+        :return: the task instance of the given task in the previous DagRun, or
+            None if there is none, see TaskInstance.previous_ti
+        :rtype: airflow.models.TaskInstance
+        """
+        if self._previous_tis is None:
+            self._load_previous_dagrun(session)
+        return self._previous_tis.get(task_id)
+
+    @provide_session
+    def are_previous_dependents_done(self, task_id, session=None):
+        """
+        Whether the tasks downstream of the given task all succeeded in the
+        previous DagRun, see TaskInstance.are_dependents_done.
+        """
+        if self._previous_tis is None:
+            self._load_previous_dagrun(session)
+        return all(
+            downstream_task_id in self._previous_tis and
+            self._previous_tis[downstream_task_id].state == State.SUCCESS
+            for downstream_task_id in self._dag.get_task(task_id).downstream_task_ids)
+
+    @provide_session
+    def get_num_running_task_instances(self, task_id, session=None):
+        """
+        The number of RUNNING task instances of the given task over all DagRuns,
+        see TaskInstance.get_num_running_task_instances. The counts of all tasks
+        of the DAG are loaded with one query the first time this is called.
+        """
+        if self._running_counts is None:
+            from airflow.models.taskinstance import TaskInstance  # Avoid circular import
+            TI = TaskInstance
+            self._running_counts = dict(
+                session.query(TI.task_id, func.count('*')).filter(
+                    TI.dag_id == self.dag_id,
+                    TI.state == State.RUNNING,
+                ).group_by(TI.task_id).all())
+        return self._running_counts.get(task_id, 0)
@@ -18,9 +18,9 @@
 # under the License.
 
 import copy
-import functools
 import getpass
 import hashlib
+import json
 import logging
 import math
 import os
@@ -29,8 +29,11 @@ import time
 from datetime import timedelta
 from typing import Optional
 from urllib.parse import quote
+import jinja2
+import jinja2.nodes
 import lazy_object_proxy
 import pendulum
+import six
 
 import dill
 from sqlalchemy import Column, String, Float, Integer, PickleType, Index, func
@@ -197,6 +200,8 @@ class TaskInstance(Base, LoggingMixin):
     def init_on_load(self):
         """ Initialize the attributes that aren't stored in the DB. """
         self.test_mode = False  # can be changed when calling 'run'
+        # XCom values pulled while rendering the templates, see render_templates
+        self._xcom_cache = None
 
     @property
     def try_number(self):
@@ -464,12 +469,11 @@ class TaskInstance(Base, LoggingMixin):
         """
         Clears all XCom data from the database for the task instance
         """
-        session.query(XCom).filter(
-            XCom.dag_id == self.dag_id,
-            XCom.task_id == self.task_id,
-            XCom.execution_date == self.execution_date
-        ).delete()
-        session.commit()
+        self._clear_xcom_cache()
+        XCom.clear(execution_date=self.execution_date,
+                   task_id=self.task_id,
+                   dag_id=self.dag_id,
+                   session=session)
 
     @property
     def key(self):
@@ -1168,6 +1172,10 @@ class TaskInstance(Base, LoggingMixin):
         if configuration.getboolean('core', 'dag_run_conf_overrides_params'):
             self.overwrite_params_with_dag_run_conf(params=params, dag_run=dag_run)
 
+        # Values of the variables referenced by the templates, fetched at once
+        # by render_templates
+        variable_values = {}
+
         class VariableAccessor:
             """
             Wrapper around Variable. This way you can get variables in templates by using
@@ -1177,12 +1185,21 @@ class TaskInstance(Base, LoggingMixin):
                 self.var = None
 
             def __getattr__(self, item):
-                self.var = Variable.get(item)
+                if item in variable_values:
+                    self.var = variable_values[item]
+                else:
+                    self.var = Variable.get(item)
                 return self.var
 
             def __repr__(self):
                 return str(self.var)
 
+            def prefetch(self, keys):
+                """
+                Get the values of a number of variables in one query.
+                """
+                variable_values.update(Variable.get_many(keys))
+
         class VariableJsonAccessor:
             """
             Wrapper around deserialized Variables. This way you can get variables
@@ -1192,7 +1209,10 @@ class TaskInstance(Base, LoggingMixin):
                 self.var = None
 
             def __getattr__(self, item):
-                self.var = Variable.get(item, deserialize_json=True)
+                if item in variable_values:
+                    self.var = json.loads(variable_values[item])
+                else:
+                    self.var = Variable.get(item, deserialize_json=True)
                 return self.var
 
             def __repr__(self):
@@ -1245,20 +1265,65 @@ class TaskInstance(Base, LoggingMixin):
         if dag_run and dag_run.conf:
             params.update(dag_run.conf)
 
+    @classmethod
+    def _find_template_variables(cls, jinja_env, content, keys):
+        """
+        Find the variables that a template references as var.value.<key> or
+        var.json.<key>.
+
+        :param jinja_env: the environment to parse the template with
+        :param content: the template, or a collection of templates
+        :param keys: the set to add the keys of the variables to
+        :type keys: set
+        """
+        if isinstance(content, six.string_types):
+            try:
+                ast = jinja_env.parse(content)
+            except jinja2.TemplateSyntaxError:
+                # Reported when the template is rendered
+                return
+            for node in ast.find_all(jinja2.nodes.Getattr):
+                accessor = node.node
+                if (isinstance(accessor, jinja2.nodes.Getattr) and
+                        accessor.attr in ('value', 'json') and
+                        isinstance(accessor.node, jinja2.nodes.Name) and
+                        accessor.node.name == 'var'):
+                    keys.add(node.attr)
+        elif isinstance(content, (list, tuple)):
+            for element in content:
+                cls._find_template_variables(jinja_env, element, keys)
+        elif isinstance(content, dict):
+            for value in content.values():
+                cls._find_template_variables(jinja_env, value, keys)
+
     def render_templates(self):
         task = self.task
         jinja_context = self.get_template_context()
+
+        # Get the variables the templates reference in one query
+        variable_keys = set()
+        jinja_env = task.get_template_env()
+        for attr in task.__class__.template_fields:
+            self._find_template_variables(jinja_env, getattr(task, attr), variable_keys)
+        if variable_keys:
+            jinja_context['var']['value'].prefetch(variable_keys)
+
         if hasattr(self, 'task') and hasattr(self.task, 'dag'):
             if self.task.dag.user_defined_macros:
                 jinja_context.update(
                     self.task.dag.user_defined_macros)
 
         rt = self.task.render_template  # shortcut to method
-        for attr in task.__class__.template_fields:
-            content = getattr(task, attr)
-            if content:
-                rendered_content = rt(attr, content, jinja_context)
-                setattr(task, attr, rendered_content)
+        # Templates often pull the same XComs, cache them while rendering
+        self._xcom_cache = {}
+        try:
+            for attr in task.__class__.template_fields:
+                content = getattr(task, attr)
+                if content:
+                    rendered_content = rt(attr, content, jinja_context)
+                    setattr(task, attr, rendered_content)
+        finally:
+            self._xcom_cache = None
 
     def email_alert(self, exception):
         exception_html = str(exception).replace('\n', '<br>')
@@ -1335,6 +1400,40 @@ class TaskInstance(Base, LoggingMixin):
             task_id=self.task_id,
             dag_id=self.dag_id,
             execution_date=execution_date or self.execution_date)
+        self._clear_xcom_cache()
+
+    def xcom_push_many(
+            self,
+            values,
+            execution_date=None):
+        """
+        Make a number of XComs available for tasks to pull, writing them in
+        one transaction.
+
+        :param values: the values of the XComs by key
+        :type values: dict
+        :param execution_date: if provided, the XComs will not be visible until
+            this date. See xcom_push.
+        :type execution_date: datetime
+        """
+
+        if execution_date and execution_date < self.execution_date:
+            raise ValueError(
+                'execution_date can not be in the past (current '
+                'execution_date is {}; received {})'.format(
+                    self.execution_date, execution_date))
+
+        XCom.set_many(
+            values,
+            task_id=self.task_id,
+            dag_id=self.dag_id,
+            execution_date=execution_date or self.execution_date)
+        self._clear_xcom_cache()
+
+    def _clear_xcom_cache(self):
+        # Not set on task instances that were never loaded nor initialized
+        if getattr(self, '_xcom_cache', None):
+            self._xcom_cache.clear()
 
     def xcom_pull(
             self,
@@ -1375,17 +1474,58 @@ class TaskInstance(Base, LoggingMixin):
         if dag_id is None:
             dag_id = self.dag_id
 
-        pull_fn = functools.partial(
-            XCom.get_one,
-            execution_date=self.execution_date,
-            key=key,
-            dag_id=dag_id,
-            include_prior_dates=include_prior_dates)
-
         if is_container(task_ids):
-            return tuple(pull_fn(task_id=t) for t in task_ids)
+            task_ids = list(task_ids)
+            values = self._get_xcom_values(task_ids, dag_id, key, include_prior_dates)
+            return tuple(values[t] for t in task_ids)
+        else:
+            return self._get_xcom_values(
+                [task_ids], dag_id, key, include_prior_dates)[task_ids]
+
+    def _get_xcom_values(self, task_ids, dag_id, key, include_prior_dates):
+        """
+        Get the most recent XCom value of each of the tasks. While the
+        templates are rendered, the values are cached until the task instance
+        pushes an XCom, and copies of the cached values are returned.
+
+        :return: the values by task_id, None for the tasks without a matching
+            XCom
+        :rtype: dict
+        """
+        cache = getattr(self, '_xcom_cache', None)
+        values = {}
+        missing_task_ids = []
+        for task_id in task_ids:
+            cache_key = (task_id, dag_id, key, include_prior_dates)
+            if cache is not None and cache_key in cache:
+                values[task_id] = copy.deepcopy(cache[cache_key])
+            elif task_id not in values:
+                values[task_id] = None
+                missing_task_ids.append(task_id)
+
+        if len(missing_task_ids) > 1 and None not in missing_task_ids \
+                and not include_prior_dates:
+            values.update(XCom.get_latest_values(
+                execution_date=self.execution_date,
+                task_ids=missing_task_ids,
+                key=key,
+                dag_id=dag_id))
         else:
-            return pull_fn(task_id=task_ids)
+            # Prior dates can have many XComs per task, get only the most
+            # recent one
+            for task_id in missing_task_ids:
+                values[task_id] = XCom.get_one(
+                    execution_date=self.execution_date,
+                    key=key,
+                    task_id=task_id,
+                    dag_id=dag_id,
+                    include_prior_dates=include_prior_dates)
+
+        if cache is not None:
+            for task_id in missing_task_ids:
+                cache[(task_id, dag_id, key, include_prior_dates)] = copy.deepcopy(
+                    values[task_id])
+        return values
 
     @provide_session
     def get_num_running_task_instances(self, session):
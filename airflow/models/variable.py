@@ -19,7 +19,7 @@
 
 import json
 from builtins import bytes
-from typing import Any
+from typing import Any, Iterable
 
 from sqlalchemy import Column, Integer, String, Text, Boolean
 from sqlalchemy.ext.declarative import declared_attr
@@ -27,6 +27,7 @@ from sqlalchemy.orm import synonym
 
 from airflow.models.base import Base, ID_LEN
 from airflow.models.crypto import get_fernet, InvalidFernetToken
+from airflow.utils.cache import TTLCache, get_metadata_cache
 from airflow.utils.db import provide_session
 from airflow.utils.log.logging_mixin import LoggingMixin
 
@@ -40,6 +41,9 @@ class Variable(Base, LoggingMixin):
     _val = Column('val', Text)
     is_encrypted = Column(Boolean, unique=False, default=False)
 
+    # Decrypted values by key, see [core] metadata_cache_ttl
+    _cache = get_metadata_cache('variable')
+
     def __repr__(self):
         # Hiding the value
         return '{} : {}'.format(self.key, self._val)
@@ -107,17 +111,85 @@ class Variable(Base, LoggingMixin):
         deserialize_json=False,  # type: bool
         session=None
     ):
-        obj = session.query(cls).filter(cls.key == key).first()
-        if obj is None:
+        val = cls._cache.get(key)
+        if val is TTLCache.MISSING:
+            obj = session.query(cls).filter(cls.key == key).first()
+            # The variables that do not exist are cached too
+            val = cls.__NO_DEFAULT_SENTINEL if obj is None else obj.val
+            cls._cache.put(key, val)
+
+        if val is cls.__NO_DEFAULT_SENTINEL:
             if default_var is not cls.__NO_DEFAULT_SENTINEL:
                 return default_var
             else:
                 raise KeyError('Variable {} does not exist'.format(key))
         else:
             if deserialize_json:
-                return json.loads(obj.val)
+                return json.loads(val)
             else:
-                return obj.val
+                return val
+
+    @classmethod
+    @provide_session
+    def get_many(
+        cls,
+        keys,  # type: Iterable[str]
+        deserialize_json=False,  # type: bool
+        session=None
+    ):
+        """
+        Get the values of a number of variables. The variables that are not
+        cached are read in one query.
+
+        :param keys: the keys of the variables
+        :param deserialize_json: deserialize the JSON values
+        :return: the values by key, the variables that do not exist are left out
+        :rtype: dict
+        """
+        vals = {}
+        missing_keys = []
+        for key in set(keys):
+            val = cls._cache.get(key)
+            if val is TTLCache.MISSING:
+                missing_keys.append(key)
+            elif val is not cls.__NO_DEFAULT_SENTINEL:
+                vals[key] = val
+
+        if missing_keys:
+            for obj in session.query(cls).filter(cls.key.in_(missing_keys)):
+                vals[obj.key] = obj.val
+            for key in missing_keys:
+                cls._cache.put(key, vals.get(key, cls.__NO_DEFAULT_SENTINEL))
+
+        if deserialize_json:
+            return {key: json.loads(val) for key, val in vals.items()}
+        return vals
+
+    @classmethod
+    @provide_session
+    def get_by_prefix(
+        cls,
+        prefix,  # type: str
+        deserialize_json=False,  # type: bool
+        session=None
+    ):
+        """
+        Get the values of the variables whose key starts with a prefix, in one
+        query.
+
+        :param prefix: the prefix of the keys
+        :param deserialize_json: deserialize the JSON values
+        :return: the values by key
+        :rtype: dict
+        """
+        vals = {}
+        for obj in session.query(cls).filter(cls.key.startswith(prefix, autoescape=True)):
+            vals[obj.key] = obj.val
+            cls._cache.put(obj.key, obj.val)
+
+        if deserialize_json:
+            return {key: json.loads(val) for key, val in vals.items()}
+        return vals
 
     @classmethod
     @provide_session
@@ -137,11 +209,24 @@ class Variable(Base, LoggingMixin):
         Variable.delete(key)
         session.add(Variable(key=key, val=stored_value))  # type: ignore
         session.flush()
+        cls.invalidate_cache(key)
 
     @classmethod
     @provide_session
     def delete(cls, key, session=None):
         session.query(cls).filter(cls.key == key).delete()
+        cls.invalidate_cache(key)
+
+    @classmethod
+    def invalidate_cache(cls, key=None):
+        """
+        Remove a variable, or all the variables, from the cache of this
+        process, see [core] metadata_cache_ttl.
+
+        :param key: the key of the variable, None for all the variables
+        :type key: str
+        """
+        cls._cache.invalidate(key)
 
     def rotate_fernet_key(self):
         fernet = get_fernet()
@@ -17,18 +17,26 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import codecs
+import errno
+import hashlib
 import json
+import os
 import pickle
+import tempfile
 
 from sqlalchemy import Column, Integer, String, Index, LargeBinary, and_
 from sqlalchemy.orm import reconstructor
 
 from airflow import configuration
+from airflow.configuration import mkdir_p
+from airflow.exceptions import AirflowConfigException
 from airflow.models.base import Base, ID_LEN
 from airflow.utils import timezone
 from airflow.utils.db import provide_session
 from airflow.utils.helpers import as_tuple
 from airflow.utils.log.logging_mixin import LoggingMixin
+from airflow.utils.module_loading import import_string
 from airflow.utils.sqlalchemy import UtcDateTime
 
 
@@ -38,9 +46,14 @@ MAX_XCOM_SIZE = 49344
 XCOM_RETURN_KEY = 'return_value'
 
 
-class XCom(Base, LoggingMixin):
+class BaseXCom(Base, LoggingMixin):
     """
-    Base class for XCom objects.
+    Base class for XCom objects. The values are stored in the metadata
+    database, pickled or as JSON.
+
+    Other XCom backends subclass it and override serialize_value,
+    deserialize_value, orm_deserialize_value and purge to store the values
+    elsewhere, see [core] xcom_backend.
     """
     __tablename__ = "xcom"
 
@@ -65,17 +78,86 @@ class XCom(Base, LoggingMixin):
     """
     @reconstructor
     def init_on_load(self):
+        self.value = self.orm_deserialize_value()
+
+    @classmethod
+    def serialize_value(cls, value, key=None, task_id=None, dag_id=None,
+                        execution_date=None):
+        """
+        Serialize an XCom value into what is stored in the value column.
+
+        :param value: the value
+        :param key: the key of the XCom
+        :type key: str
+        :param task_id: the task that pushes the XCom
+        :type task_id: str
+        :param dag_id: the DAG of the task
+        :type dag_id: str
+        :param execution_date: the execution date of the XCom
+        :type execution_date: datetime.datetime
+        :rtype: bytes
+        """
         enable_pickling = configuration.getboolean('core', 'enable_xcom_pickling')
         if enable_pickling:
-            self.value = pickle.loads(self.value)
-        else:
-            try:
-                self.value = json.loads(self.value.decode('UTF-8'))
-            except (UnicodeEncodeError, ValueError):
-                # For backward-compatibility.
-                # Preventing errors in webserver
-                # due to XComs mixed with pickled and unpickled.
-                self.value = pickle.loads(self.value)
+            return pickle.dumps(value)
+        try:
+            return json.dumps(value).encode('UTF-8')
+        except ValueError:
+            log = LoggingMixin().log
+            log.error("Could not serialize the XCOM value into JSON. "
+                      "If you are using pickles instead of JSON "
+                      "for XCOM, then you need to enable pickle "
+                      "support for XCOM in your airflow config.")
+            raise
+
+    @classmethod
+    def deserialize_value(cls, result):
+        """
+        Deserialize an XCom value.
+
+        :param result: an XCom, or a row with a value column, as stored
+        :return: the value
+        """
+        enable_pickling = configuration.getboolean('core', 'enable_xcom_pickling')
+        if enable_pickling:
+            return pickle.loads(result.value)
+        try:
+            return json.loads(result.value.decode('UTF-8'))
+        except ValueError:
+            log = LoggingMixin().log
+            log.error("Could not deserialize the XCOM value from JSON. "
+                      "If you are using pickles instead of JSON "
+                      "for XCOM, then you need to enable pickle "
+                      "support for XCOM in your airflow config.")
+            raise
+
+    def orm_deserialize_value(self):
+        """
+        Deserialize the value of an XCom loaded from the database, e.g. to list
+        the XComs in the webserver. Backends that store the values elsewhere
+        can override it to avoid fetching them.
+
+        :return: the value of the value attribute of the XCom
+        """
+        enable_pickling = configuration.getboolean('core', 'enable_xcom_pickling')
+        if enable_pickling:
+            return pickle.loads(self.value)
+        try:
+            return json.loads(self.value.decode('UTF-8'))
+        except (UnicodeEncodeError, ValueError):
+            # For backward-compatibility.
+            # Preventing errors in webserver
+            # due to XComs mixed with pickled and unpickled.
+            return pickle.loads(self.value)
+
+    @classmethod
+    def purge(cls, xcom):
+        """
+        Remove what was stored outside the metadata database for an XCom, before
+        its row is deleted. Values stored in the database need nothing.
+
+        :param xcom: a row with a value column, as stored
+        """
 
     def __repr__(self):
         return '<XCom "{key}" ({task_id} @ {execution_date})>'.format(
@@ -100,38 +182,55 @@ class XCom(Base, LoggingMixin):
 
         :return: None
         """
+        cls.set_many({key: value}, execution_date=execution_date, task_id=task_id,
+                     dag_id=dag_id, session=session)
+
+    @classmethod
+    @provide_session
+    def set_many(
+            cls,
+            values,
+            execution_date,
+            task_id,
+            dag_id,
+            session=None):
+        """
+        Store a number of XCom values of a task, replacing the previous values
+        of the same keys, in one transaction.
+
+        :param values: the values by key
+        :type values: dict
+        :return: None
+        """
+        if not values:
+            return
         session.expunge_all()
 
-        enable_pickling = configuration.getboolean('core', 'enable_xcom_pickling')
-        if enable_pickling:
-            value = pickle.dumps(value)
-        else:
-            try:
-                value = json.dumps(value).encode('UTF-8')
-            except ValueError:
-                log = LoggingMixin().log
-                log.error("Could not serialize the XCOM value into JSON. "
-                          "If you are using pickles instead of JSON "
-                          "for XCOM, then you need to enable pickle "
-                          "support for XCOM in your airflow config.")
-                raise
-
-        # remove any duplicate XComs
-        session.query(cls).filter(
-            cls.key == key,
-            cls.execution_date == execution_date,
-            cls.task_id == task_id,
-            cls.dag_id == dag_id).delete()
+        rows = [{'key': key,
+                 'value': cls.serialize_value(value, key=key, task_id=task_id,
+                                              dag_id=dag_id,
+                                              execution_date=execution_date),
+                 'execution_date': execution_date,
+                 'task_id': task_id,
+                 'dag_id': dag_id}
+                for key, value in values.items()]
 
-        session.commit()
+        # remove any duplicate XComs. There is no unique constraint on the
+        # XComs of a task to upsert them against, MySQL cannot index the key
+        # of the XComs along with the dag_id and task_id.
+        filters = [cls.key.in_(list(values)),
+                   cls.execution_date == execution_date,
+                   cls.task_id == task_id,
+                   cls.dag_id == dag_id]
+        # The new values can be stored in the same place as the previous ones
+        new_values = set(row['value'] for row in rows)
+        for result in session.query(cls.value).filter(*filters):
+            if result.value not in new_values:
+                cls.purge(result)
+        session.query(cls).filter(*filters).delete(synchronize_session=False)
 
-        # insert new XCom
-        session.add(XCom(
-            key=key,
-            value=value,
-            execution_date=execution_date,
-            task_id=task_id,
-            dag_id=dag_id))
+        # insert new XComs
+        session.execute(cls.__table__.insert(), rows)
 
         session.commit()
 
@@ -169,19 +268,41 @@ class XCom(Base, LoggingMixin):
 
         result = query.first()
         if result:
-            enable_pickling = configuration.getboolean('core', 'enable_xcom_pickling')
-            if enable_pickling:
-                return pickle.loads(result.value)
-            else:
-                try:
-                    return json.loads(result.value.decode('UTF-8'))
-                except ValueError:
-                    log = LoggingMixin().log
-                    log.error("Could not deserialize the XCOM value from JSON. "
-                              "If you are using pickles instead of JSON "
-                              "for XCOM, then you need to enable pickle "
-                              "support for XCOM in your airflow config.")
-                    raise
+            return cls.deserialize_value(result)
+
+    @classmethod
+    @provide_session
+    def get_latest_values(cls,
+                          execution_date,
+                          task_ids,
+                          key=None,
+                          dag_id=None,
+                          session=None):
+        """
+        Retrieve the most recent XCom value of each of a number of tasks, for
+        an execution date, in one query. Only the values that are returned are
+        deserialized.
+
+        :return: the values by task_id, the tasks without a matching XCom are
+            left out
+        :rtype: dict
+        """
+        filters = [cls.task_id.in_(as_tuple(task_ids)),
+                   cls.execution_date == execution_date]
+        if key:
+            filters.append(cls.key == key)
+        if dag_id:
+            filters.append(cls.dag_id == dag_id)
+
+        query = (
+            session.query(cls.task_id, cls.value).filter(and_(*filters))
+                   .order_by(cls.timestamp.desc()))
+
+        values = {}
+        for result in query:
+            if result.task_id not in values:
+                values[result.task_id] = cls.deserialize_value(result)
+        return values
 
     @classmethod
     @provide_session
@@ -197,6 +318,12 @@ class XCom(Base, LoggingMixin):
         Retrieve an XCom value, optionally meeting certain criteria
         TODO: "pickling" has been deprecated and JSON is preferred.
         "pickling" will be removed in Airflow 2.0.
+
+        :param limit: the maximum number of XComs to return, None for all of
+            them
+        :type limit: int
+        :return: the XComs, the most recent first
+        :rtype: list[XCom]
         """
         filters = []
         if key:
@@ -220,12 +347,145 @@ class XCom(Base, LoggingMixin):
     @classmethod
     @provide_session
     def delete(cls, xcoms, session=None):
-        if isinstance(xcoms, XCom):
+        if isinstance(xcoms, BaseXCom):
             xcoms = [xcoms]
         for xcom in xcoms:
-            if not isinstance(xcom, XCom):
+            if not isinstance(xcom, BaseXCom):
                 raise TypeError(
                     'Expected XCom; received {}'.format(xcom.__class__.__name__)
                 )
+            # The value attribute of loaded XComs is not the stored value
+            for result in session.query(cls.value).filter(cls.id == xcom.id):
+                cls.purge(result)
             session.delete(xcom)
         session.commit()
+
+    @classmethod
+    @provide_session
+    def clear(cls, execution_date, task_id, dag_id, session=None):
+        """
+        Delete all the XComs of a task instance.
+
+        :return: None
+        """
+        filters = [cls.execution_date == execution_date,
+                   cls.task_id == task_id,
+                   cls.dag_id == dag_id]
+        for result in session.query(cls.value).filter(*filters):
+            cls.purge(result)
+        session.query(cls).filter(*filters).delete()
+        session.commit()
+
+
+class FileSystemXCom(BaseXCom):
+    """
+    XCom backend that stores the values in files under
+    [core] xcom_filesystem_folder, with only a reference to the file in the
+    metadata database. The values are written to the files as they are
+    serialized, bytes are written as is, and the files are only read when the
+    value is pulled.
+
+    The folder must be shared by all the workers, and the value of an XCom is
+    overwritten when it is pushed again. The files are deleted along with the
+    XComs.
+
+    The value attribute of the XComs loaded from the database, e.g. by
+    get_many, is the path to the file. Use get_one or get_latest_values to
+    pull the values.
+    """
+
+    REFERENCE_PREFIX = b'xcom-file:'
+
+    @staticmethod
+    def _get_path(key, task_id, dag_id, execution_date, value_format):
+        folder = os.path.expanduser(configuration.conf.get('core', 'xcom_filesystem_folder'))
+        return os.path.join(
+            folder, dag_id, task_id, execution_date.isoformat(),
+            '{}.{}'.format(hashlib.sha1(key.encode('utf-8')).hexdigest(), value_format))
+
+    @classmethod
+    def serialize_value(cls, value, key=None, task_id=None, dag_id=None,
+                        execution_date=None):
+        if isinstance(value, (bytes, bytearray)):
+            value_format = 'raw'
+        elif configuration.getboolean('core', 'enable_xcom_pickling'):
+            value_format = 'pickle'
+        else:
+            value_format = 'json'
+        path = cls._get_path(key, task_id, dag_id, execution_date, value_format)
+        mkdir_p(os.path.dirname(path))
+        # Write to a temporary file first so that readers never see a
+        # partially written value
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if value_format == 'raw':
+                    f.write(value)
+                elif value_format == 'pickle':
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                else:
+                    json.dump(value, codecs.getwriter('utf-8')(f))
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        # The same value is stored for the same file, see BaseXCom.set_many
+        return cls.REFERENCE_PREFIX + json.dumps(
+            {'path': path, 'format': value_format}, sort_keys=True).encode('utf-8')
+
+    @classmethod
+    def _get_reference(cls, value):
+        if value is None or not value.startswith(cls.REFERENCE_PREFIX):
+            return None
+        return json.loads(value[len(cls.REFERENCE_PREFIX):].decode('utf-8'))
+
+    @classmethod
+    def deserialize_value(cls, result):
+        reference = cls._get_reference(result.value)
+        if reference is None:
+            # Stored in the database before the backend was enabled
+            return super(FileSystemXCom, cls).deserialize_value(result)
+        with open(reference['path'], 'rb') as f:
+            if reference['format'] == 'raw':
+                return f.read()
+            elif reference['format'] == 'pickle':
+                return pickle.load(f)
+            return json.load(codecs.getreader('utf-8')(f))
+
+    def orm_deserialize_value(self):
+        reference = self._get_reference(self.value)
+        if reference is None:
+            return super(FileSystemXCom, self).orm_deserialize_value()
+        return reference['path']
+
+    @classmethod
+    def purge(cls, xcom):
+        reference = cls._get_reference(xcom.value)
+        if reference is None:
+            return
+        try:
+            os.remove(reference['path'])
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                log = LoggingMixin().log
+                log.warning("Could not delete the XCom file %s: %s",
+                            reference['path'], e)
+
+
+def resolve_xcom_backend():
+    """
+    :return: the XCom class configured with [core] xcom_backend
+    :rtype: type
+    """
+    xcom_backend = configuration.conf.get('core', 'xcom_backend')
+    if not xcom_backend:
+        return BaseXCom
+    clazz = import_string(xcom_backend)
+    if not issubclass(clazz, BaseXCom):
+        raise AirflowConfigException(
+            "Your custom XCom class `{}` is not a subclass of `{}`.".format(
+                xcom_backend, BaseXCom.__name__))
+    return clazz
+
+
+XCom = resolve_xcom_backend()
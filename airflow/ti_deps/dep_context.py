@@ -17,6 +17,8 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import copy
+
 from airflow.ti_deps.deps.dag_ti_slots_available_dep import DagTISlotsAvailableDep
 from airflow.ti_deps.deps.dag_unpaused_dep import DagUnpausedDep
 from airflow.ti_deps.deps.dagrun_exists_dep import DagrunRunningDep
@@ -26,6 +28,7 @@ from airflow.ti_deps.deps.not_skipped_dep import NotSkippedDep
 from airflow.ti_deps.deps.runnable_exec_date_dep import RunnableExecDateDep
 from airflow.ti_deps.deps.valid_state_dep import ValidStateDep
 from airflow.ti_deps.deps.task_concurrency_dep import TaskConcurrencyDep
+from airflow.utils.db import provide_session
 from airflow.utils.state import State
 
 
@@ -66,6 +69,10 @@ class DepContext(object):
     :type ignore_task_deps: bool
     :param ignore_ti_state: Ignore the task instance's previous failure/success
     :type ignore_ti_state: bool
+    :param dagrun_state_summary: Summary of the task instance states of the DagRun
+        of the task instances being evaluated. When given, dependencies on upstream
+        states are resolved from it instead of being queried from the database.
+    :type dagrun_state_summary: airflow.models.dagrun.DagRunStateSummary
     """
     def __init__(
             self,
@@ -76,7 +83,8 @@ class DepContext(object):
             ignore_in_retry_period=False,
             ignore_in_reschedule_period=False,
             ignore_task_deps=False,
-            ignore_ti_state=False):
+            ignore_ti_state=False,
+            dagrun_state_summary=None):
         self.deps = deps or set()
         self.flag_upstream_failed = flag_upstream_failed
         self.ignore_all_deps = ignore_all_deps
@@ -85,6 +93,47 @@ class DepContext(object):
         self.ignore_in_reschedule_period = ignore_in_reschedule_period
         self.ignore_task_deps = ignore_task_deps
         self.ignore_ti_state = ignore_ti_state
+        self.dagrun_state_summary = dagrun_state_summary
+
+
+@provide_session
+def evaluate_many(tis, dep_context=None, session=None):
+    """
+    Evaluates the dependencies of many task instances at once. The task instance
+    states of each DagRun involved are fetched with a single query and summarized
+    (see airflow.models.dagrun.DagRunStateSummary), and the trigger rule, previous
+    dagrun and task concurrency dependencies of all its task instances are
+    resolved against that summary instead of querying the database per task
+    instance.
+
+    :param tis: the task instances to evaluate, with their task set
+    :type tis: list[airflow.models.TaskInstance]
+    :param dep_context: the context the dependencies are evaluated in
+    :type dep_context: DepContext
+    :param session: database session
+    :type session: sqlalchemy.orm.session.Session
+    :return: a map from task instance key to the dependency statuses that did
+        not pass, an empty list meaning all dependencies are met
+    :rtype: dict[tuple, list[airflow.ti_deps.deps.base_ti_dep.TIDepStatus]]
+    """
+    from airflow.models.dagrun import DagRunStateSummary  # Avoid circular import
+
+    dep_context = dep_context or DepContext()
+    run_contexts = {}
+    failed_dep_statuses = {}
+    for ti in tis:
+        run = (ti.dag_id, ti.execution_date)
+        if run not in run_contexts:
+            run_context = copy.copy(dep_context)
+            if (dep_context.dagrun_state_summary is None or
+                    not dep_context.dagrun_state_summary.covers(ti)):
+                run_context.dagrun_state_summary = DagRunStateSummary.from_db(
+                    ti.task.dag, ti.execution_date, session=session)
+            run_contexts[run] = run_context
+
+        failed_dep_statuses[ti.key] = list(ti.get_failed_dep_statuses(
+            dep_context=run_contexts[run], session=session))
+    return failed_dep_statuses
 
 
 # In order to be able to get queued a task must have one of these states
@@ -44,6 +44,12 @@ class PrevDagrunDep(BaseTIDep):
                 reason="The task did not have depends_on_past set.")
             return
 
+        # Resolve the previous dagrun from the DagRun state summary if one was given
+        state_summary = dep_context.dagrun_state_summary
+        if (state_summary is None or not state_summary.covers(ti) or
+                not state_summary.has_dagrun(session=session)):
+            state_summary = None
+
         # Don't depend on the previous task instance if we are the first task
         dag = ti.task.dag
         if dag.catchup:
@@ -57,15 +63,21 @@ class PrevDagrunDep(BaseTIDep):
                     reason="This task instance was the first task instance for its task.")
                 return
         else:
-            dr = ti.get_dagrun()
-            last_dagrun = dr.get_previous_dagrun() if dr else None
+            if state_summary is not None:
+                last_dagrun = state_summary.get_previous_dagrun(session=session)
+            else:
+                dr = ti.get_dagrun()
+                last_dagrun = dr.get_previous_dagrun() if dr else None
 
             if not last_dagrun:
                 yield self._passing_status(
                     reason="This task instance was the first task instance for its task.")
                 return
 
-        previous_ti = ti.previous_ti
+        if state_summary is not None:
+            previous_ti = state_summary.get_previous_ti(ti.task_id, session=session)
+        else:
+            previous_ti = ti.previous_ti
         if not previous_ti:
             yield self._failing_status(
                 reason="depends_on_past is true for this task's DAG, but the previous "
@@ -79,8 +91,13 @@ class PrevDagrunDep(BaseTIDep):
                        "state.".format(previous_ti, previous_ti.state))
 
         previous_ti.task = ti.task
-        if (ti.task.wait_for_downstream and
-                not previous_ti.are_dependents_done(session=session)):
-            yield self._failing_status(
-                reason="The tasks downstream of the previous task instance {0} haven't "
-                       "completed.".format(previous_ti))
+        if ti.task.wait_for_downstream:
+            if state_summary is not None:
+                dependents_done = state_summary.are_previous_dependents_done(
+                    ti.task_id, session=session)
+            else:
+                dependents_done = previous_ti.are_dependents_done(session=session)
+            if not dependents_done:
+                yield self._failing_status(
+                    reason="The tasks downstream of the previous task instance {0} "
+                           "haven't completed.".format(previous_ti))
@@ -35,7 +35,14 @@ class TaskConcurrencyDep(BaseTIDep):
             yield self._passing_status(reason="Task concurrency is not set.")
             return
 
-        if ti.get_num_running_task_instances(session) >= ti.task.task_concurrency:
+        state_summary = dep_context.dagrun_state_summary
+        if state_summary is not None and state_summary.covers(ti):
+            num_running = state_summary.get_num_running_task_instances(
+                ti.task_id, session=session)
+        else:
+            num_running = ti.get_num_running_task_instances(session)
+
+        if num_running >= ti.task.task_concurrency:
             yield self._failing_status(reason="The max task concurrency "
                                               "has been reached.")
             return
@@ -36,7 +36,6 @@ class TriggerRuleDep(BaseTIDep):
 
     @provide_session
     def _get_dep_statuses(self, ti, session, dep_context):
-        TI = airflow.models.TaskInstance
         TR = airflow.utils.trigger_rule.TriggerRule
 
         # Checking that all upstream dependencies have succeeded
@@ -49,9 +48,38 @@ class TriggerRuleDep(BaseTIDep):
             yield self._passing_status(reason="The task had a dummy trigger rule set.")
             return
 
-        # TODO(unknown): this query becomes quite expensive with dags that have many
-        # tasks. It should be refactored to let the task report to the dag run and get the
-        # aggregates from there.
+        state_summary = dep_context.dagrun_state_summary
+        if state_summary is not None and state_summary.covers(ti):
+            successes, skipped, failed, upstream_failed, done = \
+                state_summary.upstream_counts(ti.task_id)
+        else:
+            successes, skipped, failed, upstream_failed, done = \
+                self._get_upstream_counts(ti, session)
+
+        old_state = ti.state
+        dep_statuses = list(self._evaluate_trigger_rule(
+            ti=ti,
+            successes=successes,
+            skipped=skipped,
+            failed=failed,
+            upstream_failed=upstream_failed,
+            done=done,
+            flag_upstream_failed=dep_context.flag_upstream_failed,
+            session=session))
+        # Let the downstream tasks see the state flagged by the trigger rule
+        if state_summary is not None and ti.state != old_state:
+            state_summary.update(ti.task_id, ti.state)
+
+        for dep_status in dep_statuses:
+            yield dep_status
+
+    @staticmethod
+    def _get_upstream_counts(ti, session):
+        """
+        Queries the number of successful, skipped, failed, upstream_failed and done
+        upstream task instances of the given task instance.
+        """
+        TI = airflow.models.TaskInstance
         qry = (
             session
             .query(
@@ -74,18 +102,7 @@ class TriggerRuleDep(BaseTIDep):
                     State.UPSTREAM_FAILED, State.SKIPPED]),
             )
         )
-
-        successes, skipped, failed, upstream_failed, done = qry.first()
-        for dep_status in self._evaluate_trigger_rule(
-                ti=ti,
-                successes=successes,
-                skipped=skipped,
-                failed=failed,
-                upstream_failed=upstream_failed,
-                done=done,
-                flag_upstream_failed=dep_context.flag_upstream_failed,
-                session=session):
-            yield dep_status
+        return qry.first()
 
     @provide_session
     def _evaluate_trigger_rule(
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+
+from airflow import configuration as conf
+from airflow.settings import Stats
+
+
+class TTLCache(object):
+    """
+    Process-local cache of values read from the metadata database. Entries
+    expire ttl seconds after they were stored, and the least recently used
+    entries are evicted when the cache is full. The hits and misses are
+    counted in the ``<name>_cache_hits`` and ``<name>_cache_misses`` metrics.
+
+    :param name: the name of the cache, used in the metrics
+    :type name: str
+    :param ttl: the number of seconds to keep the entries, 0 disables the cache
+    :type ttl: float
+    :param maxsize: the maximum number of entries
+    :type maxsize: int
+    """
+
+    MISSING = object()
+
+    def __init__(self, name, ttl, maxsize):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key):
+        """
+        :param key: the key of the entry
+        :return: the value of the entry, TTLCache.MISSING if there is no
+            entry or it expired
+        """
+        if not self.enabled:
+            return self.MISSING
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                # Move it to the end, as the most recently used
+                self._entries[key] = entry
+                value = entry[1]
+            else:
+                value = self.MISSING
+        if value is self.MISSING:
+            Stats.incr('{}_cache_misses'.format(self.name))
+        else:
+            Stats.incr('{}_cache_hits'.format(self.name))
+        return value
+
+    def put(self, key, value):
+        """
+        :param key: the key of the entry
+        :param value: the value to store
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Remove an entry, or all the entries.
+
+        :param key: the key of the entry, None for all the entries
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+def get_metadata_cache(name):
+    """
+    :param name: the name of the cache, used in the metrics
+    :type name: str
+    :return: a cache configured with [core] metadata_cache_ttl and
+        metadata_cache_size
+    :rtype: TTLCache
+    """
+    return TTLCache(name,
+                    ttl=conf.getfloat('core', 'metadata_cache_ttl'),
+                    maxsize=conf.getint('core', 'metadata_cache_size'))
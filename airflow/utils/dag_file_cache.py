@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import namedtuple
+
+from airflow import configuration as conf
+from airflow.configuration import mkdir_p
+from airflow.utils.dag_processing import list_py_file_paths
+from airflow.utils.log.logging_mixin import LoggingMixin
+from airflow.version import version
+
+
+class DagStructure(namedtuple('DagStructure', [
+        'dag_id', 'fileloc', 'task_ids', 'concurrency', 'task_concurrency',
+        'schedule_interval', 'parent_dag_id'])):
+    """
+    The structure of a DAG, as found the last time its file was parsed. Unlike
+    the DAG itself it can be loaded without executing the DAG file.
+    """
+
+    @classmethod
+    def from_dag(cls, dag):
+        """
+        :param dag: the DAG
+        :type dag: airflow.models.DAG
+        :rtype: DagStructure
+        """
+        return cls(
+            dag_id=dag.dag_id,
+            fileloc=dag.fileloc,
+            task_ids=[task.task_id for task in dag.tasks],
+            concurrency=dag.concurrency,
+            task_concurrency={task.task_id: task.task_concurrency
+                              for task in dag.tasks
+                              if task.task_concurrency is not None},
+            schedule_interval=dag._schedule_interval,
+            parent_dag_id=dag.parent_dag.dag_id if dag.is_subdag else None)
+
+
+class DagFileCache(LoggingMixin):
+    """
+    On-disk cache of the structure of the DAGs defined in each DAG file. An
+    entry is only valid for the content of the file and the version of
+    Airflow it was written for, and is replaced when the file is parsed again
+    after it changed.
+
+    Each entry holds two pickles: a header with the Airflow version, the path,
+    modification time, size and content hash of the file, then the structure
+    of its DAGs. The header alone is read to check or prune the entry.
+
+    :param cache_folder: the folder to keep the cache in
+    :type cache_folder: unicode
+    """
+
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+
+    @staticmethod
+    def _content_hash(filepath):
+        sha1 = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    def _cache_path(self, filepath):
+        return os.path.join(
+            self.cache_folder,
+            hashlib.sha1(filepath.encode('utf-8')).hexdigest() + '.pickle')
+
+    @staticmethod
+    def _read_header(f):
+        """
+        :return: the Airflow version, the path, modification time, size and
+            content hash of the file of an entry
+        :rtype: tuple
+        """
+        return pickle.load(f)
+
+    def get(self, filepath):
+        """
+        :param filepath: the path to the DAG file
+        :type filepath: unicode
+        :return: the structure of the DAGs defined in the file, None if the
+            file was not parsed since it last changed
+        :rtype: list[DagStructure]
+        """
+        try:
+            with open(self._cache_path(filepath), 'rb') as f:
+                cached_version, _, _, _, content_hash = self._read_header(f)
+                if (cached_version == version and
+                        content_hash == self._content_hash(filepath)):
+                    return pickle.load(f)
+        except (IOError, OSError):
+            pass
+        except Exception:
+            self.log.exception("Could not read the cached DAGs of %s", filepath)
+        return None
+
+    def put(self, filepath, dags):
+        """
+        Cache the structure of the DAGs defined in a DAG file, unless the
+        entry of the file is still valid.
+
+        :param filepath: the path to the DAG file
+        :type filepath: unicode
+        :param dags: the DAGs defined in the file
+        :type dags: list[airflow.models.DAG]
+        """
+        try:
+            stat = os.stat(filepath)
+            cache_path = self._cache_path(filepath)
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached_version, _, mtime, size, content_hash = self._read_header(f)
+            except (IOError, OSError):
+                cached_version = None
+            if cached_version == version:
+                # The file is hashed only when it was touched since the entry
+                # was written
+                if (mtime, size) == (stat.st_mtime, stat.st_size):
+                    return
+                if content_hash == self._content_hash(filepath):
+                    return
+
+            header = (version, filepath, stat.st_mtime, stat.st_size,
+                      self._content_hash(filepath))
+            mkdir_p(self.cache_folder)
+            # Write to a temporary file first so that readers never see a
+            # partially written entry.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_folder)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(header, f, protocol=2)
+                pickle.dump([DagStructure.from_dag(dag) for dag in dags], f,
+                            protocol=2)
+            os.rename(tmp_path, cache_path)
+        except Exception:
+            self.log.exception("Could not cache the DAGs of %s", filepath)
+
+    def prune(self, dag_folder, file_paths):
+        """
+        Remove the entries of the files in a folder that are not among the
+        given files, as they were deleted.
+
+        :param dag_folder: the folder the files were listed in
+        :type dag_folder: unicode
+        :param file_paths: the paths to the DAG files in the folder
+        :type file_paths: list[unicode]
+        """
+        if not os.path.isdir(self.cache_folder):
+            return
+        dag_folder = os.path.join(os.path.abspath(dag_folder), '')
+        file_paths = {os.path.abspath(file_path) for file_path in file_paths}
+        for name in os.listdir(self.cache_folder):
+            if not name.endswith('.pickle'):
+                continue
+            cache_path = os.path.join(self.cache_folder, name)
+            try:
+                with open(cache_path, 'rb') as f:
+                    _, filepath, _, _, _ = self._read_header(f)
+                filepath = os.path.abspath(filepath)
+                if filepath.startswith(dag_folder) and filepath not in file_paths:
+                    self.log.debug("Removing the cached DAGs of %s", filepath)
+                    os.remove(cache_path)
+            except (IOError, OSError):
+                pass
+            except Exception:
+                self.log.warning("Removing the unreadable cache entry %s", cache_path)
+                try:
+                    os.remove(cache_path)
+                except (IOError, OSError):
+                    pass
+
+
+def get_dag_file_cache():
+    """
+    :return: the cache configured with [core] dag_file_cache_folder, None if
+        it is not set
+    :rtype: DagFileCache
+    """
+    cache_folder = conf.get('core', 'dag_file_cache_folder')
+    if not cache_folder:
+        return None
+    return DagFileCache(os.path.expanduser(cache_folder))
+
+
+def collect_dag_structures(dag_folder, include_examples, safe_mode):
+    """
+    Collect the structure of the DAGs defined in a folder. The files that did
+    not change since they were last parsed are not executed, the others are
+    parsed with a DagBag.
+
+    :param dag_folder: the folder to look for DAGs in
+    :type dag_folder: unicode
+    :param include_examples: whether to include the examples that ship with
+        airflow
+    :type include_examples: bool
+    :param safe_mode: whether to skip the files that don't look like they
+        define DAGs
+    :type safe_mode: bool
+    :return: the structure of the DAGs
+    :rtype: list[DagStructure]
+    """
+    from airflow.models import DagBag  # Avoid circular import
+
+    dag_file_cache = get_dag_file_cache()
+    file_paths = list_py_file_paths(dag_folder, safe_mode=safe_mode,
+                                    include_examples=include_examples)
+    if dag_file_cache and os.path.isdir(dag_folder):
+        dag_file_cache.prune(dag_folder, file_paths)
+
+    dags = []
+    for filepath in file_paths:
+        cached_dags = dag_file_cache.get(filepath) if dag_file_cache else None
+        if cached_dags is None:
+            dagbag = DagBag(filepath, include_examples=False, safe_mode=safe_mode)
+            cached_dags = [DagStructure.from_dag(dag) for dag in dagbag.dags.values()]
+        dags.extend(cached_dags)
+    return dags
@@ -22,6 +22,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import heapq
+import itertools
 import logging
 import multiprocessing
 import os
@@ -53,6 +55,7 @@ from airflow.models import errors
 from airflow.utils import timezone
 from airflow.utils.db import provide_session
 from airflow.utils.log.logging_mixin import LoggingMixin
+from airflow.utils.module_loading import import_string
 from airflow.utils.state import State
 
 
@@ -295,8 +298,25 @@ def correct_maybe_zipped(fileloc):
 COMMENT_PATTERN = re.compile(r"\s*#.*")
 
 
+def _might_contain_dag(file_path, safe_mode):
+    """
+    Whether a file is a Python file or zip archive, and, in safe mode, whether
+    a heuristic guesses that the Python file contains an Airflow DAG definition.
+    """
+    mod_name, file_ext = os.path.splitext(
+        os.path.split(file_path)[-1])
+    if file_ext != '.py' and not zipfile.is_zipfile(file_path):
+        return False
+
+    if safe_mode and not zipfile.is_zipfile(file_path):
+        with open(file_path, 'rb') as fp:
+            content = fp.read()
+            return all([s in content for s in (b'DAG', b'airflow')])
+    return True
+
+
 def list_py_file_paths(directory, safe_mode=True,
-                       include_examples=None):
+                       include_examples=None, stat_cache=None):
     """
     Traverse a directory and look for Python files.
 
@@ -304,6 +324,12 @@ def list_py_file_paths(directory, safe_mode=True,
     :type directory: unicode
     :param safe_mode: whether to use a heuristic to determine whether a file
         contains Airflow DAG definitions
+    :param stat_cache: map from file path to the modification time and size
+        of the file and whether it might contain DAG definitions, as found by
+        the previous traversal. Files whose modification time and size did not
+        change are not read again. The map is updated in place and must always
+        be used with the same safe_mode.
+    :type stat_cache: dict[unicode, (float, int, bool)]
     :return: a list of paths to Python files in the specified directory
     :rtype: list[unicode]
     """
@@ -316,6 +342,7 @@ def list_py_file_paths(directory, safe_mode=True,
         return [directory]
     elif os.path.isdir(directory):
         patterns_by_dir = {}
+        examined_file_paths = set()
         for root, dirs, files in os.walk(directory, followlinks=True):
             patterns = patterns_by_dir.get(root, [])
             ignore_file = os.path.join(root, '.airflowignore')
@@ -345,21 +372,22 @@ def list_py_file_paths(directory, safe_mode=True,
                     file_path = os.path.join(root, f)
                     if not os.path.isfile(file_path):
                         continue
-                    mod_name, file_ext = os.path.splitext(
-                        os.path.split(file_path)[-1])
-                    if file_ext != '.py' and not zipfile.is_zipfile(file_path):
-                        continue
                     if any([re.findall(p, file_path) for p in patterns]):
                         continue
 
-                    # Heuristic that guesses whether a Python file contains an
-                    # Airflow DAG definition.
-                    might_contain_dag = True
-                    if safe_mode and not zipfile.is_zipfile(file_path):
-                        with open(file_path, 'rb') as fp:
-                            content = fp.read()
-                            might_contain_dag = all(
-                                [s in content for s in (b'DAG', b'airflow')])
+                    if stat_cache is None:
+                        might_contain_dag = _might_contain_dag(file_path, safe_mode)
+                    else:
+                        stat = os.stat(file_path)
+                        cached_stat = stat_cache.get(file_path)
+                        if (cached_stat is not None and
+                                cached_stat[:2] == (stat.st_mtime, stat.st_size)):
+                            might_contain_dag = cached_stat[2]
+                        else:
+                            might_contain_dag = _might_contain_dag(file_path, safe_mode)
+                        stat_cache[file_path] = (stat.st_mtime, stat.st_size,
+                                                 might_contain_dag)
+                        examined_file_paths.add(file_path)
 
                     if not might_contain_dag:
                         continue
@@ -368,6 +396,9 @@ def list_py_file_paths(directory, safe_mode=True,
                 except Exception:
                     log = LoggingMixin().log
                     log.exception("Error while examining %s", f)
+        if stat_cache is not None:
+            for file_path in set(stat_cache) - examined_file_paths:
+                del stat_cache[file_path]
     if include_examples:
         import airflow.example_dags
         example_dag_folder = airflow.example_dags.__path__[0]
@@ -375,6 +406,130 @@ def list_py_file_paths(directory, safe_mode=True,
     return file_paths
 
 
+class DagDirectoryWatcher(LoggingMixin):
+    """
+    Lists the Python files that could contain DAG definitions in a directory,
+    and which of them were added or modified since the previous listing. The
+    modification time and size of the files are cached so that files which
+    did not change are not read again.
+
+    :param directory: the directory to watch
+    :type directory: unicode
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._stat_cache = {}
+        self._file_paths = None
+
+    def has_changes(self):
+        """
+        :return: whether the directory is known to have changed since it was
+            last listed. This can not be known without listing it again.
+        :rtype: bool
+        """
+        return False
+
+    def list_file_paths(self):
+        """
+        List the directory again.
+
+        :return: the paths to the Python files in the directory, and the paths
+            that were added or modified since the previous listing
+        :rtype: (list[unicode], list[unicode])
+        """
+        previous_stats = {file_path: stat[:2]
+                          for file_path, stat in self._stat_cache.items()}
+        file_paths = list_py_file_paths(self._directory,
+                                        stat_cache=self._stat_cache)
+        changed_file_paths = []
+        if self._file_paths is not None:
+            changed_file_paths = [
+                file_path for file_path in file_paths
+                if file_path in self._stat_cache and
+                previous_stats.get(file_path) != self._stat_cache[file_path][:2]]
+        self._file_paths = file_paths
+        return file_paths, changed_file_paths
+
+    def close(self):
+        pass
+
+
+class InotifyDagDirectoryWatcher(DagDirectoryWatcher):
+    """
+    Lists the directory again only when inotify reported a change in it. This
+    requires Linux and the inotify_simple package. Note that inotify does not
+    report changes made to network file systems by other hosts.
+
+    :param directory: the directory to watch
+    :type directory: unicode
+    """
+
+    def __init__(self, directory):
+        super(InotifyDagDirectoryWatcher, self).__init__(directory)
+        from inotify_simple import INotify, flags
+        self._flags = flags
+        # MODIFY and ATTRIB catch the files edited in place and touched, which
+        # the DagDirectoryWatcher reports by their modification time
+        self._watch_mask = (flags.CREATE | flags.CLOSE_WRITE | flags.MODIFY |
+                            flags.ATTRIB | flags.DELETE | flags.MOVED_FROM |
+                            flags.MOVED_TO | flags.DELETE_SELF)
+        self._inotify = INotify()
+        # Map from watch descriptor to the watched directory
+        self._watched_directories = {}
+        self._changed = True
+        self._watch(directory)
+
+    def _watch(self, directory):
+        for root, _, _ in os.walk(directory, followlinks=True):
+            watch_descriptor = self._inotify.add_watch(root, self._watch_mask)
+            self._watched_directories[watch_descriptor] = root
+
+    def has_changes(self):
+        for event in self._inotify.read(timeout=0):
+            self._changed = True
+            if event.mask & self._flags.IGNORED:
+                self._watched_directories.pop(event.wd, None)
+            elif (event.mask & self._flags.ISDIR and
+                    event.mask & (self._flags.CREATE | self._flags.MOVED_TO) and
+                    event.wd in self._watched_directories):
+                self._watch(os.path.join(self._watched_directories[event.wd],
+                                         event.name))
+        return self._changed
+
+    def list_file_paths(self):
+        self.has_changes()
+        if not self._changed:
+            return self._file_paths, []
+        # Changes happening while listing are picked up by the next listing
+        self._changed = False
+        return super(InotifyDagDirectoryWatcher, self).list_file_paths()
+
+    def close(self):
+        self._inotify.close()
+
+
+def get_dag_directory_watcher(directory):
+    """
+    :param directory: the directory to watch
+    :type directory: unicode
+    :return: the watcher configured with [scheduler] dag_dir_watcher
+    :rtype: DagDirectoryWatcher
+    """
+    watcher = conf.get('scheduler', 'dag_dir_watcher')
+    if watcher == 'inotify':
+        if os.path.isdir(directory):
+            try:
+                return InotifyDagDirectoryWatcher(directory)
+            except (ImportError, OSError):
+                LoggingMixin().log.exception(
+                    "Could not watch %s with inotify, polling it instead",
+                    directory)
+    elif watcher != 'poll':
+        raise AirflowException("Unknown DAG directory watcher {}".format(watcher))
+    return DagDirectoryWatcher(directory)
+
+
 class AbstractDagFileProcessor(object):
     """
     Processes a DAG file. See SchedulerJob.process_file() for more details.
@@ -455,6 +610,56 @@ DagParsingStat = namedtuple('DagParsingStat',
                             ['file_paths', 'all_pids', 'done',
                              'all_files_processed', 'result_count'])
 
+# What the DagFileProcessorManager knows about a DAG file when queuing it:
+# whether it was modified since it was last processed, how long (in seconds)
+# it took to process last time, how many active DAGs it defined and when it
+# finished processing last time. The last three are None if the file was
+# never processed.
+DagFileStat = namedtuple('DagFileStat',
+                         ['mtime_changed', 'last_runtime', 'num_dags',
+                          'last_finish_time'])
+
+
+def default_file_parsing_sort_key(file_path, file_stat):
+    """
+    Default ordering of the DAG files waiting to be processed: files that were
+    modified (or never processed) first, then files defining active DAGs, and
+    the quickest files to process first among those.
+
+    :param file_path: the path to the DAG file
+    :type file_path: unicode
+    :param file_stat: what is known about the DAG file
+    :type file_stat: DagFileStat
+    :return: the sort key, files with the lowest keys are processed first
+    """
+    return (not file_stat.mtime_changed,
+            file_stat.num_dags == 0,
+            file_stat.last_runtime or 0.0)
+
+
+# Number of processors in a row that may fail on a DAG file with failure
+# callbacks before the scheduler handles the callbacks itself
+MAX_FAILURE_CALLBACK_ATTEMPTS = 2
+
+
+class FailureCallbackRequest(namedtuple(
+        'FailureCallbackRequest', ['full_filepath', 'simple_task_instance', 'msg'])):
+    """
+    Request to handle the failure of a task instance, running its callbacks and
+    retries, in the next processor of the DAG file of the task instance. The
+    processor has the DAG parsed already.
+    """
+
+
+class FailureCallbackResult(namedtuple(
+        'FailureCallbackResult', ['request', 'handled'])):
+    """
+    Reported by the DAG file processor manager for each FailureCallbackRequest
+    it was sent: whether a processor of the DAG file handled it. The scheduler
+    sets the task instances of the requests that were not handled to FAILED
+    itself.
+    """
+
 
 class DagParsingSignal(enum.Enum):
     AGENT_HEARTBEAT = 'agent_heartbeat'
@@ -519,6 +724,11 @@ class DagFileProcessorAgent(LoggingMixin):
         # Initialized as true so we do not deactivate w/o any actual DAG parsing.
         self._all_files_processed = True
         self._result_count = 0
+        # Map from task instance key to the failure callbacks sent to the
+        # manager that it has not reported back on yet
+        self._pending_failure_callbacks = {}
+        # Failure callbacks the manager could not handle
+        self._unhandled_failure_callbacks = []
 
     def start(self):
         """
@@ -541,6 +751,40 @@ class DagFileProcessorAgent(LoggingMixin):
         """
         self._parent_signal_conn.send(DagParsingSignal.AGENT_HEARTBEAT)
 
+    def send_failure_callbacks(self, failure_callbacks):
+        """
+        Send requests to handle task instance failures to the manager, which
+        hands each of them to the next processor of its DAG file.
+
+        :param failure_callbacks: the requests
+        :type failure_callbacks: list[FailureCallbackRequest]
+        """
+        for request in failure_callbacks:
+            if self.done:
+                # The manager exited, nobody would handle the request
+                self._unhandled_failure_callbacks.append(request)
+                continue
+            self._pending_failure_callbacks[request.simple_task_instance.key] = request
+            self._parent_signal_conn.send(request)
+
+    def harvest_unhandled_failure_callbacks(self, all_pending=False):
+        """
+        Harvest the failure callbacks the manager could not handle. Their task
+        instances have to be set to failed by the caller.
+
+        :param all_pending: whether to include the failure callbacks the
+            manager did not report back on yet, e.g. because it is terminated
+        :type all_pending: bool
+        :return: the failure callbacks
+        :rtype: list[FailureCallbackRequest]
+        """
+        unhandled = self._unhandled_failure_callbacks
+        self._unhandled_failure_callbacks = []
+        if all_pending or self.done:
+            unhandled.extend(self._pending_failure_callbacks.values())
+            self._pending_failure_callbacks = {}
+        return unhandled
+
     def wait_until_finished(self):
         """
         Should only be used when launched DAG file processor manager in sync mode.
@@ -604,7 +848,10 @@ class DagFileProcessorAgent(LoggingMixin):
             try:
                 result = self._result_queue.get_nowait()
                 try:
-                    simple_dags.append(result)
+                    if isinstance(result, FailureCallbackResult):
+                        self._failure_callback_done(result)
+                    else:
+                        simple_dags.append(result)
                 finally:
                     self._result_queue.task_done()
             except Empty:
@@ -614,6 +861,18 @@ class DagFileProcessorAgent(LoggingMixin):
 
         return simple_dags
 
+    def _failure_callback_done(self, result):
+        """
+        Forget a failure callback the manager reported back on.
+
+        :param result: the report of the manager
+        :type result: FailureCallbackResult
+        """
+        request = result.request
+        self._pending_failure_callbacks.pop(request.simple_task_instance.key, None)
+        if not result.handled:
+            self._unhandled_failure_callbacks.append(request)
+
     def _heartbeat_manager(self):
         """
         Heartbeat DAG file processor and start it if it is not alive.
@@ -621,6 +880,13 @@ class DagFileProcessorAgent(LoggingMixin):
         """
         if self._process and not self._process.is_alive() and not self.done:
             self.start()
+            # The failure callbacks the previous manager did not report back
+            # on are lost with it
+            pending_failure_callbacks = list(self._pending_failure_callbacks.values())
+            if pending_failure_callbacks:
+                self.log.info("Sending %s failure callbacks to the restarted manager",
+                              len(pending_failure_callbacks))
+                self.send_failure_callbacks(pending_failure_callbacks)
 
     def _sync_metadata(self):
         """
@@ -699,9 +965,11 @@ class DagFileProcessorManager(LoggingMixin):
     in parallel to process them and put the results to a multiprocessing.Queue
     for DagFileProcessorAgent to harvest. The parallelism is limited and as the
     processors finish, more are launched. The files are processed over and
-    over again, but no more often than the specified interval.
+    over again, but no more often than the specified interval. The files
+    waiting to be processed are kept in a priority queue ordered by the
+    ``[scheduler] file_parsing_sort_key`` callable.
 
-    :type _file_path_queue: list[unicode]
+    :type _file_path_queue: list[(object, int, unicode)]
     :type _processors: dict[unicode, AbstractDagFileProcessor]
     :type _last_runtime: dict[unicode, float]
     :type _last_finish_time: dict[unicode, datetime.datetime]
@@ -726,8 +994,9 @@ class DagFileProcessorManager(LoggingMixin):
             for unlimited.
         :type max_runs: int
         :param processor_factory: function that creates processors for DAG
-            definition files. Arguments are (dag_definition_path)
-        :type processor_factory: (unicode, unicode, list) -> (AbstractDagFileProcessor)
+            definition files. Arguments are (dag_definition_path, zombies,
+            failure_callbacks)
+        :type processor_factory: (unicode, list, list) -> (AbstractDagFileProcessor)
         :param signal_conn: connection to communicate signal with processor agent.
         :type signal_conn: airflow.models.connection.Connection
         :param stat_queue: the queue to use for passing back parsing stat to agent.
@@ -738,7 +1007,9 @@ class DagFileProcessorManager(LoggingMixin):
         :type async_mode: bool
         """
         self._file_paths = file_paths
+        # Heap of (sort key, sequence number, file path)
         self._file_path_queue = []
+        self._file_path_queue_counter = itertools.count()
         self._dag_directory = dag_directory
         self._max_runs = max_runs
         self._processor_factory = processor_factory
@@ -760,6 +1031,10 @@ class DagFileProcessorManager(LoggingMixin):
         # 30 seconds.
         self.print_stats_interval = conf.getint('scheduler',
                                                 'print_stats_interval')
+        # Ordering of the files waiting to be processed.
+        sort_key = conf.get('scheduler', 'file_parsing_sort_key')
+        self._file_parsing_sort_key = (import_string(sort_key) if sort_key
+                                       else default_file_parsing_sort_key)
         # How many seconds do we wait for tasks to heartbeat before mark them as zombies.
         self._zombie_threshold_secs = (
             conf.getint('scheduler', 'scheduler_zombie_task_threshold'))
@@ -769,6 +1044,20 @@ class DagFileProcessorManager(LoggingMixin):
         self._last_runtime = {}
         # Map from file path to the last finish time
         self._last_finish_time = {}
+        # Map from file path to its modification time when it was last processed
+        self._last_mtime = {}
+        # Map from file path to the number of active DAGs it defined
+        self._num_dags = {}
+        # Map from file path to the time it was queued for processing
+        self._queued_time = {}
+        # Map from file path to the failure callbacks for its next processor
+        self._failure_callbacks = defaultdict(list)
+        # Map from file path to the failure callbacks its running processor
+        # was given. They are kept until the processor finishes.
+        self._processor_failure_callbacks = {}
+        # Map from file path to the number of processors in a row that failed
+        # while they had failure callbacks to handle
+        self._failure_callback_attempts = defaultdict(int)
         self._last_zombie_query_time = timezone.utcnow()
         # Last time that the DAG dir was traversed to look for files
         self.last_dag_dir_refresh_time = timezone.utcnow()
@@ -784,6 +1073,7 @@ class DagFileProcessorManager(LoggingMixin):
         # How often to scan the DAGs directory for new files. Default to 5 minutes.
         self.dag_dir_list_interval = conf.getint('scheduler',
                                                  'dag_dir_list_interval')
+        self._dag_dir_watcher = get_dag_directory_watcher(dag_directory)
 
         self._log = logging.getLogger('airflow.processor_manager')
 
@@ -828,14 +1118,16 @@ class DagFileProcessorManager(LoggingMixin):
         while True:
             loop_start_time = time.time()
 
-            if self._signal_conn.poll():
+            while self._signal_conn.poll():
                 agent_signal = self._signal_conn.recv()
                 if agent_signal == DagParsingSignal.TERMINATE_MANAGER:
                     self.terminate()
-                    break
+                    return
                 elif agent_signal == DagParsingSignal.END_MANAGER:
                     self.end()
                     sys.exit(os.EX_OK)
+                elif isinstance(agent_signal, FailureCallbackRequest):
+                    self._add_failure_callback(agent_signal)
 
             self._refresh_dag_dir()
 
@@ -848,6 +1140,9 @@ class DagFileProcessorManager(LoggingMixin):
             all_files_processed = all(self.get_last_finish_time(x) is not None
                                       for x in self.file_paths)
             max_runs_reached = self.max_runs_reached()
+            if max_runs_reached:
+                # The manager exits, the scheduler handles the rest
+                self._report_pending_failure_callbacks()
 
             dag_parsing_stat = DagParsingStat(self._file_paths,
                                               self.get_all_pids(),
@@ -881,6 +1176,8 @@ class DagFileProcessorManager(LoggingMixin):
             elif agent_signal == DagParsingSignal.END_MANAGER:
                 self.end()
                 sys.exit(os.EX_OK)
+            elif isinstance(agent_signal, FailureCallbackRequest):
+                self._add_failure_callback(agent_signal)
             elif agent_signal == DagParsingSignal.AGENT_HEARTBEAT:
 
                 self._refresh_dag_dir()
@@ -894,6 +1191,9 @@ class DagFileProcessorManager(LoggingMixin):
                 all_files_processed = all(self.get_last_finish_time(x) is not None
                                           for x in self.file_paths)
                 max_runs_reached = self.max_runs_reached()
+                if max_runs_reached:
+                    # The manager exits, the scheduler handles the rest
+                    self._report_pending_failure_callbacks()
 
                 dag_parsing_stat = DagParsingStat(self._file_paths,
                                                   self.get_all_pids(),
@@ -911,26 +1211,95 @@ class DagFileProcessorManager(LoggingMixin):
                     self._signal_conn.send(DagParsingSignal.MANAGER_DONE)
                     break
 
+    def _add_failure_callback(self, request):
+        """
+        Keep a failure callback for the next processor of its DAG file, and
+        queue the file right away unless it is queued or being processed.
+
+        :param request: the failure callback
+        :type request: FailureCallbackRequest
+        """
+        file_path = request.full_filepath
+        if file_path not in self._file_paths:
+            self.log.warning("Can not handle the failure callback of %s, its file "
+                             "%s is not in the DAG directory", request.simple_task_instance.key,
+                             file_path)
+            self._report_failure_callbacks([request], handled=False)
+            return
+        self._failure_callbacks[file_path].append(request)
+        if (file_path not in self._processors and
+                file_path not in self._queued_time):
+            self._queue_file_path(file_path, timezone.utcnow())
+
+    def _report_failure_callbacks(self, requests, handled):
+        """
+        Report to the agent whether failure callbacks were handled.
+
+        :param requests: the failure callbacks
+        :type requests: list[FailureCallbackRequest]
+        :param handled: whether a processor handled them
+        :type handled: bool
+        """
+        for request in requests:
+            self._result_queue.put(FailureCallbackResult(request, handled))
+
+    def _report_pending_failure_callbacks(self):
+        """
+        Report all the failure callbacks that were not handled yet as not
+        handled, before the manager exits.
+        """
+        pending_requests = []
+        for requests in self._failure_callbacks.values():
+            pending_requests.extend(requests)
+        for requests in self._processor_failure_callbacks.values():
+            pending_requests.extend(requests)
+        self._failure_callbacks.clear()
+        self._processor_failure_callbacks.clear()
+        self._report_failure_callbacks(pending_requests, handled=False)
+
     def _refresh_dag_dir(self):
         """
-        Refresh file paths from dag dir if we haven't done it for too long.
+        Refresh file paths from dag dir if we haven't done it for too long, or
+        if the watcher reported changes in it. Files added or modified since
+        the previous refresh are queued for processing right away.
         """
         elapsed_time_since_refresh = (timezone.utcnow() -
                                       self.last_dag_dir_refresh_time).total_seconds()
-        if elapsed_time_since_refresh > self.dag_dir_list_interval:
+        if (elapsed_time_since_refresh > self.dag_dir_list_interval or
+                self._dag_dir_watcher.has_changes()):
             # Build up a list of Python files that could contain DAGs
             self.log.info("Searching for files in %s", self._dag_directory)
-            self._file_paths = list_py_file_paths(self._dag_directory)
+            self._file_paths, changed_file_paths = \
+                self._dag_dir_watcher.list_file_paths()
             self.last_dag_dir_refresh_time = timezone.utcnow()
             self.log.info("There are %s files in %s", len(self._file_paths), self._dag_directory)
             self.set_file_paths(self._file_paths)
 
+            queued_file_paths = set(x[2] for x in self._file_path_queue)
+            now = timezone.utcnow()
+            for file_path in changed_file_paths:
+                if (file_path not in self._processors and
+                        file_path not in queued_file_paths and
+                        self._run_count[file_path] != self._max_runs):
+                    self.log.info("Queuing modified file %s", file_path)
+                    self._queue_file_path(file_path, now)
+
             try:
                 self.log.debug("Removing old import errors")
                 self.clear_nonexistent_import_errors()
             except Exception:
                 self.log.exception("Error removing old import errors")
 
+            # Avoid circular import
+            from airflow.utils.dag_file_cache import get_dag_file_cache
+            dag_file_cache = get_dag_file_cache()
+            if dag_file_cache and os.path.isdir(self._dag_directory):
+                try:
+                    self.log.debug("Removing the cached DAGs of deleted files")
+                    dag_file_cache.prune(self._dag_directory, self._file_paths)
+                except Exception:
+                    self.log.exception("Error removing the cached DAGs of deleted files")
+
     def _print_stat(self):
         """
         Occasionally print out stats about how fast the files are getting processed
@@ -1111,7 +1480,16 @@ class DagFileProcessorManager(LoggingMixin):
         """
         self._file_paths = new_file_paths
         self._file_path_queue = [x for x in self._file_path_queue
-                                 if x in new_file_paths]
+                                 if x[2] in new_file_paths]
+        heapq.heapify(self._file_path_queue)
+        self._queued_time = {x: t for x, t in self._queued_time.items()
+                             if x in new_file_paths}
+        for file_path in list(self._failure_callbacks):
+            if file_path not in new_file_paths:
+                self.log.warning("Can not handle the failure callbacks of deleted "
+                                 "file %s", file_path)
+                self._report_failure_callbacks(self._failure_callbacks.pop(file_path),
+                                               handled=False)
         # Stop processors that are working on deleted files
         filtered_processors = {}
         for file_path, processor in self._processors.items():
@@ -1120,6 +1498,8 @@ class DagFileProcessorManager(LoggingMixin):
             else:
                 self.log.warning("Stopping processor for %s", file_path)
                 processor.terminate()
+                self._report_failure_callbacks(
+                    self._processor_failure_callbacks.pop(file_path, []), handled=False)
         self._processors = filtered_processors
 
     def processing_count(self):
@@ -1173,13 +1553,26 @@ class DagFileProcessorManager(LoggingMixin):
 
         # Collect all the DAGs that were found in the processed files
         simple_dags = []
+        now = timezone.utcnow()
         for file_path, processor in finished_processors.items():
+            failure_callbacks = self._processor_failure_callbacks.pop(file_path, [])
             if processor.result is None:
                 self.log.warning(
                     "Processor for %s exited with return code %s.",
                     processor.file_path, processor.exit_code
                 )
+                if failure_callbacks:
+                    self._retry_failure_callbacks(file_path, failure_callbacks)
             else:
+                self._failure_callback_attempts.pop(file_path, None)
+                self._report_failure_callbacks(failure_callbacks, handled=True)
+            # Failure callbacks that came in while the file was processed, or
+            # that its processor did not handle
+            if (file_path in self._failure_callbacks and
+                    file_path not in self._queued_time):
+                self._queue_file_path(file_path, now)
+            if processor.result is not None:
+                self._num_dags[file_path] = len(processor.result)
                 for simple_dag in processor.result:
                     simple_dags.append(simple_dag)
 
@@ -1218,15 +1611,19 @@ class DagFileProcessorManager(LoggingMixin):
                 "\n\t".join(files_paths_to_queue)
             )
 
-            self._file_path_queue.extend(files_paths_to_queue)
+            for file_path in files_paths_to_queue:
+                self._queue_file_path(file_path, now)
 
         zombies = self._find_zombies()
 
         # Start more processors if we have enough slots and files to process
         while (self._parallelism - len(self._processors) > 0 and
                len(self._file_path_queue) > 0):
-            file_path = self._file_path_queue.pop(0)
-            processor = self._processor_factory(file_path, zombies)
+            file_path = self._pop_file_path()
+            failure_callbacks = self._failure_callbacks.pop(file_path, [])
+            if failure_callbacks:
+                self._processor_failure_callbacks[file_path] = failure_callbacks
+            processor = self._processor_factory(file_path, zombies, failure_callbacks)
 
             processor.start()
             self.log.debug(
@@ -1240,6 +1637,82 @@ class DagFileProcessorManager(LoggingMixin):
 
         return simple_dags
 
+    def _retry_failure_callbacks(self, file_path, failure_callbacks):
+        """
+        Give the failure callbacks of a processor that failed to the next
+        processor of the file, or report them as not handled if the previous
+        processor failed as well.
+
+        :param file_path: the path to the DAG file
+        :type file_path: unicode
+        :param failure_callbacks: the failure callbacks the processor was given
+        :type failure_callbacks: list[FailureCallbackRequest]
+        """
+        self._failure_callback_attempts[file_path] += 1
+        if self._failure_callback_attempts[file_path] >= MAX_FAILURE_CALLBACK_ATTEMPTS:
+            self.log.error("Can not handle the failure callbacks of %s, its "
+                           "processors failed %s times", file_path,
+                           self._failure_callback_attempts[file_path])
+            del self._failure_callback_attempts[file_path]
+            self._report_failure_callbacks(failure_callbacks, handled=False)
+        else:
+            self._failure_callbacks[file_path][:0] = failure_callbacks
+
+    @staticmethod
+    def _get_mtime(file_path):
+        try:
+            return os.path.getmtime(file_path)
+        except OSError:
+            return None
+
+    def get_file_stat(self, file_path):
+        """
+        :param file_path: the path to the file
+        :type file_path: unicode
+        :return: what is known about the file to order the processing queue
+        :rtype: DagFileStat
+        """
+        last_mtime = self._last_mtime.get(file_path)
+        return DagFileStat(
+            mtime_changed=(last_mtime is None or
+                           self._get_mtime(file_path) != last_mtime),
+            last_runtime=self.get_last_runtime(file_path),
+            num_dags=self._num_dags.get(file_path),
+            last_finish_time=self.get_last_finish_time(file_path))
+
+    def _queue_file_path(self, file_path, now):
+        """
+        Push a file to the processing queue according to its sort key.
+
+        :param file_path: the path to the file
+        :type file_path: unicode
+        :param now: the time the file is queued at
+        :type now: datetime.datetime
+        """
+        sort_key = self._file_parsing_sort_key(file_path,
+                                               self.get_file_stat(file_path))
+        heapq.heappush(self._file_path_queue,
+                       (sort_key, next(self._file_path_queue_counter), file_path))
+        self._queued_time[file_path] = now
+
+    def _pop_file_path(self):
+        """
+        Pop the file to process next from the processing queue and record the
+        time it waited in the queue.
+
+        :return: the path to the file
+        :rtype: unicode
+        """
+        _, _, file_path = heapq.heappop(self._file_path_queue)
+        self._last_mtime[file_path] = self._get_mtime(file_path)
+        queued_time = self._queued_time.pop(file_path, None)
+        if queued_time:
+            file_name = os.path.basename(file_path)
+            file_name = os.path.splitext(file_name)[0].replace(os.sep, '.')
+            Stats.timing('dag_processing.queue_wait.{}'.format(file_name),
+                         timezone.utcnow() - queued_time)
+        return file_path
+
     @provide_session
     def _find_zombies(self, session):
         """
@@ -1304,6 +1777,7 @@ class DagFileProcessorManager(LoggingMixin):
         Kill all child processes on exit since we don't want to leave
         them as orphaned.
         """
+        self._dag_dir_watcher.close()
         pids_to_kill = self.get_all_pids()
         if len(pids_to_kill) > 0:
             # First try SIGTERM
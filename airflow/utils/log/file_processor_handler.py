@@ -63,6 +63,9 @@ class FileProcessorHandler(logging.Handler):
         :param filename: filename in which the dag is located
         """
         local_loc = self._init_file(filename)
+        # DAG file processor workers process many files in the same process
+        if self.handler is not None:
+            self.handler.close()
         self.handler = logging.FileHandler(local_loc)
         self.handler.setFormatter(self.formatter)
         self.handler.setLevel(self.level)
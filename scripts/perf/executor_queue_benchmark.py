@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Microbenchmark of the queue of tasks of the executors: the time it takes to
+queue a number of tasks and to pick the highest priority ones over a number
+of heartbeats, with the IndexedPriorityQueue and with the previous approach
+of sorting the whole queue on every heartbeat.
+
+To Run:
+    $ python scripts/perf/executor_queue_benchmark.py [num_tasks] [open_slots] [heartbeats]
+
+Defaults to 100000 tasks, 32 open slots and 10 heartbeats.
+"""
+from __future__ import print_function
+
+import random
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from airflow.executors.base_executor import IndexedPriorityQueue
+
+
+def make_tasks(num_tasks):
+    date = datetime(2019, 1, 1)
+    return [(('perf_dag', 'task_{}'.format(i), date, 1),
+             (['airflow', 'run'], random.randint(1, 100), 'default', None))
+            for i in range(num_tasks)]
+
+
+def trigger_sorted(queued_tasks, open_slots):
+    sorted_queue = sorted(
+        [(k, v) for k, v in queued_tasks.items()],
+        key=lambda x: x[1][1],
+        reverse=True)
+    for i in range(min((open_slots, len(queued_tasks)))):
+        key, _ = sorted_queue.pop(0)
+        queued_tasks.pop(key)
+
+
+def trigger_heap(queued_tasks, open_slots):
+    for i in range(min((open_slots, len(queued_tasks)))):
+        queued_tasks.pop_highest_priority()
+
+
+def run(name, queued_tasks, trigger, tasks, open_slots, heartbeats):
+    start = time.time()
+    for key, value in tasks:
+        queued_tasks[key] = value
+    queue_time = time.time() - start
+
+    start = time.time()
+    for _ in range(heartbeats):
+        trigger(queued_tasks, open_slots)
+    trigger_time = time.time() - start
+
+    print("{:<22} queue: {:8.3f}s  trigger: {:8.3f}ms per heartbeat".format(
+        name, queue_time, 1000.0 * trigger_time / heartbeats))
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    open_slots = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    heartbeats = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    tasks = make_tasks(num_tasks)
+    print("{} tasks, {} open slots, {} heartbeats".format(
+        num_tasks, open_slots, heartbeats))
+    run('OrderedDict + sort', OrderedDict(), trigger_sorted, tasks,
+        open_slots, heartbeats)
+    run('IndexedPriorityQueue', IndexedPriorityQueue(), trigger_heap, tasks,
+        open_slots, heartbeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Benchmark of the throughput of the executors: a number of no-op tasks are
+queued on an executor, which is heartbeat like the scheduler does until all
+of them finished. For each executor it reports:
+
+1. Throughput - tasks finished per second.
+2. Queue-to-start latency - p50 and p99 of the time from queueing a task to
+   the executor handing it to its workers (the heartbeat it left
+   ``queued_tasks``).
+3. Scheduler CPU - the CPU time spent in the executor heartbeats per task, in
+   the benchmark process only.
+
+The executors run self-contained:
+
+- sequential, local: as configured.
+- celery: a filesystem broker and a SQLite result backend in a temporary
+  folder, with worker processes started by the benchmark. Requires celery.
+- dask: a local Dask cluster. Requires distributed.
+- kubernetes: a fake Kubernetes client that reports each pod as succeeded as
+  soon as it is created. Requires the kubernetes package and an initialized
+  metadata database (``airflow initdb``), task instances are created for the
+  tasks.
+
+To Run:
+    $ python scripts/perf/executor_throughput_benchmark.py [num_tasks] [parallelism] [executor ...]
+
+Defaults to 200 tasks, a parallelism of 8, and the sequential and local
+executors.
+"""
+from __future__ import print_function
+
+import contextlib
+import itertools
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from airflow.utils.state import State
+
+DAG_ID = 'executor_throughput_benchmark'
+EXECUTION_DATE = datetime(2019, 1, 1)
+COMMAND = ['true']
+HEARTBEAT_INTERVAL = 0.01
+MAX_RUNTIME_SECS = 300
+
+BenchmarkTaskInstance = namedtuple('BenchmarkTaskInstance', ['key', 'executor_config'])
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentile(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+@contextlib.contextmanager
+def sequential_executor(keys, parallelism):
+    from airflow.executors.sequential_executor import SequentialExecutor
+    executor = SequentialExecutor()
+    executor.start()
+    yield executor
+
+
+@contextlib.contextmanager
+def local_executor(keys, parallelism):
+    from airflow.executors.local_executor import LocalExecutor
+    executor = LocalExecutor(parallelism=parallelism)
+    executor.start()
+    yield executor
+
+
+def _run_celery_worker(stop_event):
+    from celery.contrib.testing.worker import start_worker
+    from airflow.executors.celery_executor import app
+    # The test worker expects the ping task to be registered
+    import celery.contrib.testing.tasks  # noqa: F401
+
+    with start_worker(app=app, perform_ping_check=False, loglevel='ERROR'):
+        stop_event.wait()
+
+
+@contextlib.contextmanager
+def celery_executor(keys, parallelism):
+    folder = tempfile.mkdtemp()
+    # The configuration of Celery is read when the executor module is imported
+    for data_folder in ['data_folder_in', 'data_folder_out', 'processed_folder']:
+        os.environ['AIRFLOW__CELERY_BROKER_TRANSPORT_OPTIONS__' + data_folder.upper()] = folder
+    os.environ['AIRFLOW__CELERY__BROKER_URL'] = 'filesystem://'
+    os.environ['AIRFLOW__CELERY__RESULT_BACKEND'] = \
+        'db+sqlite:///' + os.path.join(folder, 'results.db')
+    from airflow.executors.celery_executor import CeleryExecutor
+
+    stop_event = multiprocessing.Event()
+    workers = [multiprocessing.Process(target=_run_celery_worker, args=(stop_event,))
+               for _ in range(parallelism)]
+    for worker in workers:
+        worker.start()
+    try:
+        executor = CeleryExecutor()
+        executor.parallelism = parallelism
+        executor.start()
+        yield executor
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+        shutil.rmtree(folder)
+
+
+@contextlib.contextmanager
+def dask_executor(keys, parallelism):
+    from distributed import LocalCluster
+    from airflow.executors.dask_executor import DaskExecutor
+
+    cluster = LocalCluster(n_workers=parallelism, threads_per_worker=1)
+    try:
+        executor = DaskExecutor(cluster_address=cluster.scheduler_address)
+        executor.start()
+        yield executor
+        executor.client.close()
+    finally:
+        cluster.close()
+
+
+class FakeKubeClient(object):
+    """
+    Kubernetes client that reports each pod as succeeded to the executor as
+    soon as it is created, in place of the job watcher. Like the job watcher,
+    it reports a succeeded pod with a None state, the task sets its own state.
+    """
+
+    def __init__(self):
+        self.watcher_queue = None
+        self._resource_versions = itertools.count(1)
+
+    def create_namespaced_pod(self, body, namespace, **kwargs):
+        metadata = body['metadata']
+        self.watcher_queue.put((metadata['name'], None, metadata['labels'],
+                                str(next(self._resource_versions))))
+
+    def delete_namespaced_pod(self, name, namespace, body, **kwargs):
+        pass
+
+    def list_namespaced_pod(self, namespace, **kwargs):
+        return namedtuple('PodList', ['items'])([])
+
+
+class FakeKubernetesJobWatcher(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return True
+
+
+@contextlib.contextmanager
+def kubernetes_executor(keys, parallelism):
+    os.environ.setdefault('AIRFLOW__KUBERNETES__DAGS_IN_IMAGE', 'True')
+    from airflow.contrib.executors import kubernetes_executor as kube_module
+    from airflow.models import DAG, TaskInstance
+    from airflow.operators.dummy_operator import DummyOperator
+    from airflow.utils.db import create_session
+
+    fake_kube_client = FakeKubeClient()
+    get_kube_client = kube_module.get_kube_client
+    job_watcher = kube_module.KubernetesJobWatcher
+    kube_module.get_kube_client = lambda: fake_kube_client
+    kube_module.KubernetesJobWatcher = FakeKubernetesJobWatcher
+    try:
+        executor = kube_module.KubernetesExecutor()
+        executor.parallelism = parallelism
+        executor.start()
+        fake_kube_client.watcher_queue = executor.kube_scheduler.watcher_queue
+
+        # The executor looks up the task instances of the finished pods
+        dag = DAG(DAG_ID, start_date=EXECUTION_DATE)
+        with create_session() as session:
+            for _, task_id, execution_date, _ in keys:
+                ti = TaskInstance(DummyOperator(task_id=task_id, dag=dag), execution_date)
+                ti.state = State.QUEUED
+                session.merge(ti)
+        yield executor
+    finally:
+        kube_module.get_kube_client = get_kube_client
+        kube_module.KubernetesJobWatcher = job_watcher
+        with create_session() as session:
+            session.query(TaskInstance).filter(TaskInstance.dag_id == DAG_ID).delete()
+
+
+EXECUTORS = {
+    'sequential': sequential_executor,
+    'local': local_executor,
+    'celery': celery_executor,
+    'dask': dask_executor,
+    'kubernetes': kubernetes_executor,
+}
+
+
+def run(name, num_tasks, parallelism):
+    keys = [(DAG_ID, 'task_{}'.format(i), EXECUTION_DATE, 1) for i in range(num_tasks)]
+    with EXECUTORS[name](keys, parallelism) as executor:
+        queued = {}
+        for key in keys:
+            executor.queue_command(BenchmarkTaskInstance(key, {}), COMMAND)
+            queued[key] = time.time()
+
+        started = {}
+        finished = {}
+        failed = 0
+        heartbeat_cpu = 0.0
+        start = time.time()
+        while len(finished) < num_tasks and time.time() - start < MAX_RUNTIME_SECS:
+            cpu_start = cpu_time()
+            executor.heartbeat()
+            heartbeat_cpu += cpu_time() - cpu_start
+
+            now = time.time()
+            for key in queued:
+                if key not in started and key not in executor.queued_tasks:
+                    started[key] = now
+            for key, state in executor.get_event_buffer().items():
+                finished[key] = now
+                # The Kubernetes executor reports succeeded pods with a None
+                # state
+                if state in (State.FAILED, State.UPSTREAM_FAILED):
+                    failed += 1
+            if len(finished) < num_tasks:
+                executor.wait_for_events(HEARTBEAT_INTERVAL)
+        executor.end()
+
+    duration = max(finished.values()) - start if finished else float('nan')
+    latencies = [1000.0 * (started[key] - queued[key]) for key in started]
+    print("{:<12} {:8.1f} tasks/s  queue-to-start p50 {:8.1f}ms p99 {:8.1f}ms  "
+          "cpu {:6.2f}ms per task ({} failed, {} unfinished)".format(
+              name, len(finished) / duration, percentile(latencies, 50),
+              percentile(latencies, 99), 1000.0 * heartbeat_cpu / num_tasks,
+              failed, num_tasks - len(finished)))
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    parallelism = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    names = sys.argv[3:] or ['sequential', 'local']
+
+    print("{} tasks, parallelism of {}".format(num_tasks, parallelism))
+    for name in names:
+        run(name, num_tasks, parallelism)
+
+
+if __name__ == "__main__":
+    main()
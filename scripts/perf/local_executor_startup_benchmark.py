@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Benchmark of the latency of the LocalExecutor workers for short tasks: the time
+it takes a worker to run ``airflow run --local`` for a DummyOperator task,
+starting a new interpreter for each task and with
+``[core] local_executor_fork_tasks`` forking the worker.
+
+Requires an initialized metadata database (``airflow initdb``).
+
+To Run:
+    $ python scripts/perf/local_executor_startup_benchmark.py [num_tasks]
+
+Defaults to 20 tasks.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+import time
+
+from airflow.executors.local_executor import LocalWorker
+from airflow.utils.state import State
+
+DAG_ID = 'local_executor_startup_benchmark'
+
+DAG_FILE_CONTENT = textwrap.dedent("""
+    from datetime import datetime
+    from airflow import DAG
+    from airflow.operators.dummy_operator import DummyOperator
+
+    dag = DAG('{dag_id}', start_date=datetime(2019, 1, 1), schedule_interval=None)
+    for i in range({num_tasks}):
+        DummyOperator(task_id='task_{{}}'.format(i), dag=dag)
+""")
+
+
+class ResultList(list):
+    def put(self, result):
+        self.append(result)
+
+
+def run(name, dag_file, num_tasks, fork_tasks):
+    results = ResultList()
+    worker = LocalWorker(results)
+    worker.fork_tasks = fork_tasks
+
+    start = time.time()
+    for i in range(num_tasks):
+        command = ['airflow', 'run', DAG_ID, 'task_{}'.format(i),
+                   '2019-01-01T00:00:00', '--local', '--force',
+                   '--ignore_all_dependencies', '-sd', dag_file]
+        worker.execute_work('task_{}'.format(i), command)
+    duration = time.time() - start
+
+    failed = len([state for _, state in results if state != State.SUCCESS])
+    print("{:<12} {:8.1f}ms per task ({} failed)".format(
+        name, 1000.0 * duration / num_tasks, failed))
+
+
+def main():
+    num_tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    dag_folder = tempfile.mkdtemp()
+    try:
+        dag_file = os.path.join(dag_folder, 'startup_benchmark_dag.py')
+        with open(dag_file, 'w') as f:
+            f.write(DAG_FILE_CONTENT.format(dag_id=DAG_ID, num_tasks=num_tasks))
+
+        print("{} tasks".format(num_tasks))
+        run('subprocess', dag_file, num_tasks, fork_tasks=False)
+        run('fork', dag_file, num_tasks, fork_tasks=True)
+    finally:
+        shutil.rmtree(dag_folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -208,6 +208,7 @@ hive = [
     'hmsclient>=0.1.0',
     'pyhive>=0.6.0',
 ]
+inotify = ['inotify_simple>=1.1.8']
 jdbc = ['jaydebeapi>=1.1.1']
 jenkins = ['python-jenkins>=1.0.0']
 jira = ['JIRA>1.0.7']
@@ -381,6 +382,7 @@ def do_setup():
             'grpc': grpc,
             'hdfs': hdfs,
             'hive': hive,
+            'inotify': inotify,
             'jdbc': jdbc,
             'jira': jira,
             'kerberos': kerberos,
@@ -21,6 +21,7 @@ import uuid
 import re
 import string
 import random
+import threading
 from urllib3 import HTTPResponse
 from datetime import datetime
 
@@ -29,9 +30,11 @@ try:
     from kubernetes.client.rest import ApiException
     from airflow import configuration
     from airflow.configuration import conf
+    from airflow.contrib.executors.kubernetes_executor import AdaptiveBatchSize
     from airflow.contrib.executors.kubernetes_executor import AirflowKubernetesScheduler
     from airflow.contrib.executors.kubernetes_executor import KubernetesExecutor
     from airflow.contrib.executors.kubernetes_executor import KubeConfig
+    from airflow.contrib.executors.kubernetes_executor import KubernetesPodIndex
     from airflow.contrib.executors.kubernetes_executor import KubernetesExecutorConfig
     from airflow.contrib.kubernetes.worker_configuration import WorkerConfiguration
     from airflow.exceptions import AirflowConfigException
@@ -41,6 +44,49 @@ except ImportError:
     AirflowKubernetesScheduler = None  # type: ignore
 
 
+class FakeKubeClient(object):
+    """
+    Kubernetes client keeping the pods in memory. The first pod creations can
+    be throttled, or fail with a connection error.
+    """
+
+    def __init__(self, throttled_creations=0, failed_creations=0):
+        self.pods = set()
+        self.pod_labels = {}
+        self.deleted_pods = set()
+        self.list_calls = 0
+        self.throttled_creations = throttled_creations
+        self.failed_creations = failed_creations
+        self._lock = threading.Lock()
+
+    def create_namespaced_pod(self, body, namespace, **kwargs):
+        with self._lock:
+            if self.throttled_creations > 0:
+                self.throttled_creations -= 1
+                raise ApiException(status=429, reason='Too Many Requests')
+            if self.failed_creations > 0:
+                self.failed_creations -= 1
+                raise IOError('Connection reset by peer')
+            self.pods.add(body['metadata']['name'])
+            self.pod_labels[body['metadata']['name']] = body['metadata'].get('labels', {})
+
+    def delete_namespaced_pod(self, name, namespace, body, **kwargs):
+        with self._lock:
+            self.pods.discard(name)
+            self.deleted_pods.add(name)
+
+    def list_namespaced_pod(self, namespace, **kwargs):
+        with self._lock:
+            self.list_calls += 1
+            items = []
+            for name in self.pods:
+                pod = mock.Mock()
+                pod.metadata.name = name
+                pod.metadata.labels = self.pod_labels.get(name, {})
+                items.append(pod)
+            return mock.Mock(items=items)
+
+
 class TestAirflowKubernetesScheduler(unittest.TestCase):
     @staticmethod
     def _gen_random_string(seed, str_len):
@@ -695,6 +741,89 @@ class TestKubernetesExecutor(unittest.TestCase):
         assert mock_kube_client.create_namespaced_pod.called
         self.assertTrue(kubernetesExecutor.task_queue.empty())
 
+    @unittest.skipIf(AirflowKubernetesScheduler is None,
+                     'kubernetes python package is not installed')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.KubernetesJobWatcher')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.get_kube_client')
+    def test_create_pods_adapts_batch_size(self, mock_get_kube_client,
+                                           mock_kubernetes_job_watcher):
+        fake_kube_client = FakeKubeClient(throttled_creations=2)
+        mock_get_kube_client.return_value = fake_kube_client
+        executor = KubernetesExecutor()
+        executor.kube_config.worker_pods_creation_batch_size = 4
+        executor.kube_config.worker_pods_creation_max_batch_size = 8
+        executor.start()
+
+        for i in range(20):
+            executor.execute_async(key=('dag', 'task_{}'.format(i), datetime.utcnow(), 1),
+                                   command='command', executor_config={})
+
+        # Two creations of the first batch are throttled and re-queued
+        executor.sync()
+        self.assertEqual(2, len(fake_kube_client.pods))
+        self.assertEqual(2, executor._pod_creation_batch_size.value)
+
+        # Full batches grow the batch size
+        executor.sync()
+        self.assertEqual(4, len(fake_kube_client.pods))
+        self.assertEqual(3, executor._pod_creation_batch_size.value)
+        executor.sync()
+        self.assertEqual(7, len(fake_kube_client.pods))
+        self.assertEqual(4, executor._pod_creation_batch_size.value)
+        self.assertEqual(13, executor.task_queue.qsize())
+
+    @unittest.skipIf(AirflowKubernetesScheduler is None,
+                     'kubernetes python package is not installed')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.KubernetesJobWatcher')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.get_kube_client')
+    def test_create_pods_requeues_on_any_error(self, mock_get_kube_client,
+                                               mock_kubernetes_job_watcher):
+        fake_kube_client = FakeKubeClient(failed_creations=2)
+        mock_get_kube_client.return_value = fake_kube_client
+        executor = KubernetesExecutor()
+        executor.kube_config.worker_pods_creation_batch_size = 4
+        executor.kube_config.worker_pods_creation_max_batch_size = 8
+        executor.start()
+
+        for i in range(4):
+            executor.execute_async(key=('dag', 'task_{}'.format(i), datetime.utcnow(), 1),
+                                   command='command', executor_config={})
+
+        # The failed creations are re-queued, but not taken for throttling
+        executor.sync()
+        self.assertEqual(2, len(fake_kube_client.pods))
+        self.assertEqual(2, executor.task_queue.qsize())
+        self.assertEqual(4, executor._pod_creation_batch_size.value)
+
+        executor.sync()
+        self.assertEqual(4, len(fake_kube_client.pods))
+        self.assertTrue(executor.task_queue.empty())
+
+    @unittest.skipIf(AirflowKubernetesScheduler is None,
+                     'kubernetes python package is not installed')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.KubernetesJobWatcher')
+    @mock.patch('airflow.contrib.executors.kubernetes_executor.get_kube_client')
+    def test_sync_deletes_finished_pods(self, mock_get_kube_client,
+                                        mock_kubernetes_job_watcher):
+        fake_kube_client = FakeKubeClient()
+        mock_get_kube_client.return_value = fake_kube_client
+        executor = KubernetesExecutor()
+        executor.kube_config.delete_worker_pods = True
+        executor.start()
+
+        running_key = ('dag', 'running_task', datetime.utcnow(), 1)
+        success_key = ('dag', 'success_task', datetime.utcnow(), 1)
+        executor.running[running_key] = 'command'
+        executor.running[success_key] = 'command'
+        executor.result_queue.put((running_key, State.RUNNING, 'running_pod', '1'))
+        executor.result_queue.put((success_key, State.SUCCESS, 'success_pod', '2'))
+        executor.sync()
+
+        self.assertEqual({'success_pod'}, fake_kube_client.deleted_pods)
+        self.assertEqual(State.RUNNING, executor.event_buffer[running_key])
+        self.assertEqual(State.SUCCESS, executor.event_buffer[success_key])
+        self.assertEqual([running_key], list(executor.running))
+
     @mock.patch('airflow.contrib.executors.kubernetes_executor.KubeConfig')
     @mock.patch('airflow.contrib.executors.kubernetes_executor.KubernetesExecutor.sync')
     @mock.patch('airflow.executors.base_executor.BaseExecutor.trigger_tasks')
@@ -744,5 +873,57 @@ class TestKubernetesExecutor(unittest.TestCase):
         mock_delete_pod.assert_called_with('pod_id')
 
 
+class TestKubernetesPodIndex(unittest.TestCase):
+    @unittest.skipIf(AirflowKubernetesScheduler is None,
+                     'kubernetes python package is not installed')
+    def test_has_pod(self):
+        execution_date = datetime(2019, 1, 1)
+        labels = {
+            'dag_id': 'dag',
+            'task_id': 'task',
+            'execution_date':
+                AirflowKubernetesScheduler._datetime_to_label_safe_datestring(execution_date),
+            'airflow-worker': 'worker-uuid',
+        }
+        fake_kube_client = FakeKubeClient()
+        fake_kube_client.pods.add('listed_pod')
+        fake_kube_client.pod_labels['listed_pod'] = labels
+        pod_index = KubernetesPodIndex(fake_kube_client, 'default', 'worker-uuid')
+
+        # The pods are listed once, on first use
+        self.assertEqual(0, fake_kube_client.list_calls)
+        self.assertTrue(pod_index.has_pod('dag', 'task', execution_date))
+        self.assertFalse(pod_index.has_pod('dag', 'other_task', execution_date))
+        self.assertEqual(1, fake_kube_client.list_calls)
+
+        other_labels = dict(labels, task_id='other_task')
+        pod_index.add('created_pod', other_labels)
+        self.assertTrue(pod_index.has_pod('dag', 'other_task', execution_date))
+        pod_index.remove('created_pod')
+        self.assertFalse(pod_index.has_pod('dag', 'other_task', execution_date))
+        pod_index.remove('listed_pod')
+        self.assertFalse(pod_index.has_pod('dag', 'task', execution_date))
+        self.assertEqual(1, fake_kube_client.list_calls)
+
+
+class TestAdaptiveBatchSize(unittest.TestCase):
+    @unittest.skipIf(AirflowKubernetesScheduler is None,
+                     'kubernetes python package is not installed')
+    def test_update(self):
+        batch_size = AdaptiveBatchSize(initial=8, maximum=16, target_latency=1.0)
+        batch_size.update(8, [0.1] * 8, throttled=False)
+        self.assertEqual(10, batch_size.value)
+        # Partial batches don't grow the batch size
+        batch_size.update(3, [0.1] * 3, throttled=False)
+        self.assertEqual(10, batch_size.value)
+        batch_size.update(10, [0.1] * 9, throttled=True)
+        self.assertEqual(5, batch_size.value)
+        batch_size.update(5, [0.1, 2.0], throttled=False)
+        self.assertEqual(2, batch_size.value)
+        for _ in range(20):
+            batch_size.update(batch_size.value, [0.1] * batch_size.value, throttled=False)
+        self.assertEqual(16, batch_size.value)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -629,6 +629,26 @@ class CoreTest(unittest.TestCase):
         t.execute = verify_templated_field
         t.run(start_date=DEFAULT_DATE, end_date=DEFAULT_DATE, ignore_ti_state=True)
 
+    def test_template_variables_fetched_at_once(self):
+        """
+        Test that the variables referenced by the templates are read in one query
+        """
+        Variable.set("a_variable", 'a value')
+        Variable.set("json_variable", {'foo': 'bar'}, serialize_json=True)
+
+        t = OperatorSubclass(
+            task_id='test_complex_template',
+            some_templated_field=['{{ var.value.a_variable }}',
+                                  '{{ var.json.json_variable.foo }}'],
+            dag=self.dag)
+        ti = TaskInstance(task=t, execution_date=DEFAULT_DATE)
+        with mock.patch.object(Variable, 'get_many', wraps=Variable.get_many) as get_many, \
+                mock.patch.object(Variable, 'get', wraps=Variable.get) as get:
+            ti.render_templates()
+        get_many.assert_called_once_with({'a_variable', 'json_variable'})
+        get.assert_not_called()
+        self.assertEqual(t.some_templated_field, ['a value', 'bar'])
+
     def test_template_non_bool(self):
         """
         Test templates can handle objects with no sense of truthiness
@@ -2572,6 +2592,12 @@ class ConnectionTest(unittest.TestCase):
         self.assertIsNone(c.password)
         self.assertIsNone(c.port)
 
+    def test_get_many_connections(self):
+        conns = BaseHook.get_many_connections(['test_uri', 'sqlite_default', 'missing_conn'])
+        self.assertEqual({'test_uri', 'sqlite_default'}, set(conns))
+        self.assertEqual('ec2.compute.com', conns['test_uri'][0].host)
+        self.assertEqual('sqlite', conns['sqlite_default'][0].conn_type)
+
     def test_param_setup(self):
         c = Connection(conn_id='local_mysql', conn_type='mysql',
                        host='localhost', login='airflow',
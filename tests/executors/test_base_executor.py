@@ -20,7 +20,7 @@
 import unittest
 from tests.compat import mock
 
-from airflow.executors.base_executor import BaseExecutor
+from airflow.executors.base_executor import BaseExecutor, IndexedPriorityQueue
 from airflow.utils.state import State
 
 from datetime import datetime
@@ -54,3 +54,32 @@ class BaseExecutorTest(unittest.TestCase):
                  mock.call('executor.queued_tasks', mock.ANY),
                  mock.call('executor.running_tasks', mock.ANY)]
         mock_stats_gauge.assert_has_calls(calls)
+
+    def test_trigger_tasks_by_priority(self):
+        executor = BaseExecutor()
+        executor.execute_async = mock.Mock()
+        date = datetime.utcnow()
+        simple_ti = mock.Mock(executor_config={})
+        for task_id, priority in [("low", 1), ("high", 3), ("mid", 2), ("high2", 3)]:
+            key = ("my_dag", task_id, date, 1)
+            executor.queued_tasks[key] = (task_id, priority, None, simple_ti)
+
+        executor.trigger_tasks(3)
+
+        self.assertEqual(["high", "high2", "mid"],
+                         [c[1]['command'] for c in executor.execute_async.call_args_list])
+        self.assertEqual([("my_dag", "low", date, 1)], list(executor.queued_tasks))
+
+    def test_indexed_priority_queue(self):
+        queue = IndexedPriorityQueue()
+        for i, priority in enumerate([1, 5, 3, 5, 2]):
+            queue[i] = ('command', priority, None, None)
+        queue[2] = ('command', 0, None, None)
+        del queue[4]
+
+        self.assertEqual([0, 1, 2, 3], list(queue))
+        self.assertEqual([1, 3], [key for key, _ in queue.peek_highest_priority(2)])
+        self.assertEqual(4, len(queue))
+        self.assertEqual([1, 3, 0, 2],
+                         [queue.pop_highest_priority()[0] for _ in range(4)])
+        self.assertRaises(KeyError, queue.pop_highest_priority)
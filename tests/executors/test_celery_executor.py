@@ -21,6 +21,8 @@ import unittest
 from multiprocessing import Pool
 
 import mock
+from celery.backends.base import KeyValueStoreBackend
+from celery.backends.database import DatabaseBackend
 from celery.contrib.testing.worker import start_worker
 
 from airflow.executors import celery_executor
@@ -125,6 +127,132 @@ class CeleryExecutorTest(unittest.TestCase):
         self.assertIn(celery_executor.CELERY_FETCH_ERR_MSG_HEADER, args[0])
         self.assertIn('AttributeError', args[1])
 
+    @mock.patch('airflow.executors.celery_executor.Pool')
+    def test_sync_pool_is_reused(self, mock_pool):
+        mock_pool.return_value.map_async.return_value.get.return_value = [
+            ('key', celery_states.PENDING)]
+        executor = CeleryExecutor()
+        executor.tasks = {'key': mock.Mock()}
+        executor.last_state = {'key': celery_states.PENDING}
+
+        executor.sync()
+        executor.sync()
+        mock_pool.assert_called_once_with(processes=executor._sync_parallelism)
+        self.assertEqual(2, mock_pool.return_value.map_async.call_count)
+
+        executor.end()
+        mock_pool.return_value.close.assert_called_once_with()
+        self.assertIsNone(executor._sync_pool)
+
+    @mock.patch('airflow.executors.celery_executor.Pool')
+    def test_timeout_sending_tasks(self, mock_pool):
+        mock_result = mock.Mock()
+        results = mock.Mock()
+        results.next.side_effect = [('key1', 'command1', mock_result),
+                                    celery_executor.TimeoutError(),
+                                    celery_executor.TimeoutError(),
+                                    ('key2', 'command2', mock_result)]
+        mock_pool.return_value.imap_unordered.return_value = results
+        executor = CeleryExecutor()
+        executor.queued_tasks['key1'] = ('command1', 1, 'queue', 'simple_ti')
+        executor.queued_tasks['key2'] = ('command2', 1, 'queue', 'simple_ti')
+
+        executor.trigger_tasks(2)
+        self.assertEqual(['key1'], list(executor.running))
+        self.assertEqual(['key2'], list(executor.queued_tasks))
+
+        # The task being sent is not sent again until its result is known
+        executor.trigger_tasks(2)
+        self.assertEqual(1, mock_pool.return_value.imap_unordered.call_count)
+        mock_pool.return_value.terminate.assert_not_called()
+
+        executor.trigger_tasks(2)
+        self.assertEqual(1, mock_pool.return_value.imap_unordered.call_count)
+        self.assertEqual(['key1', 'key2'], sorted(executor.running))
+        self.assertEqual(0, len(executor.queued_tasks))
+        self.assertIsNone(executor._pending_send)
+
+    @mock.patch('airflow.executors.celery_executor.Pool')
+    def test_give_up_sending_tasks(self, mock_pool):
+        results = mock.Mock()
+        results.next.side_effect = celery_executor.TimeoutError()
+        mock_pool.return_value.imap_unordered.return_value = results
+        executor = CeleryExecutor()
+        executor.queued_tasks['key'] = ('command', 1, 'queue', 'simple_ti')
+
+        with mock.patch.object(executor, '_pool_timeout', return_value=0):
+            executor.trigger_tasks(1)
+        # Celery may have received the task, it is failed rather than sent again
+        mock_pool.return_value.terminate.assert_called_once_with()
+        self.assertEqual(0, len(executor.queued_tasks))
+        self.assertEqual({'key': State.FAILED}, executor.event_buffer)
+        self.assertIsNone(executor._pending_send)
+
+    @mock.patch('airflow.executors.celery_executor.app')
+    def test_bulk_state_fetch_key_value_store_backend(self, mock_app):
+        mock_backend = mock.MagicMock(spec=KeyValueStoreBackend)
+        mock_backend.get_key_for_task.side_effect = lambda task_id: 'meta-' + task_id
+        mock_backend.mget.side_effect = lambda keys: [
+            'success-meta' if key == 'meta-id1' else None for key in keys]
+        mock_backend.decode_result.return_value = {'status': celery_states.SUCCESS}
+        mock_app.backend = mock_backend
+
+        executor = CeleryExecutor()
+        executor._bulk_state_fetch = True
+        executor.tasks = {'success': mock.Mock(task_id='id1'),
+                          'pending': mock.Mock(task_id='id2')}
+        executor.last_state = {'success': celery_states.PENDING,
+                               'pending': celery_states.PENDING}
+        executor.running = {'success': 'command', 'pending': 'command'}
+
+        with mock.patch.object(executor, '_get_sync_pool') as mock_get_sync_pool:
+            executor.sync()
+            mock_get_sync_pool.assert_not_called()
+
+        self.assertEqual(1, mock_backend.mget.call_count)
+        self.assertEqual(['meta-id1', 'meta-id2'],
+                         sorted(mock_backend.mget.call_args[0][0]))
+        self.assertEqual({'success': State.SUCCESS}, executor.event_buffer)
+        self.assertEqual(['pending'], list(executor.tasks))
+
+    @mock.patch('airflow.executors.celery_executor.BULK_STATE_FETCH_CHUNK_SIZE', 2)
+    @mock.patch('airflow.executors.celery_executor.app')
+    def test_bulk_state_fetch_database_backend(self, mock_app):
+        mock_backend = mock.MagicMock(spec=DatabaseBackend)
+        mock_query = mock_backend.ResultSession.return_value.query.return_value
+        mock_query.filter.return_value.all.side_effect = [
+            [('id1', celery_states.SUCCESS)], [('id3', celery_states.FAILURE)]]
+        mock_app.backend = mock_backend
+
+        executor = CeleryExecutor()
+        executor.tasks = {'success': mock.Mock(task_id='id1'),
+                          'pending': mock.Mock(task_id='id2'),
+                          'failure': mock.Mock(task_id='id3')}
+
+        # The task ids are looked up in chunks
+        self.assertEqual(
+            {'success': celery_states.SUCCESS,
+             'pending': celery_states.PENDING,
+             'failure': celery_states.FAILURE},
+            dict(executor._fetch_states_in_bulk()))
+        self.assertEqual(2, mock_query.filter.call_count)
+
+    @mock.patch('airflow.executors.celery_executor.Pool')
+    def test_bulk_state_fetch_falls_back_to_pool(self, mock_pool):
+        mock_pool.return_value.map_async.return_value.get.return_value = [
+            ('key', celery_states.SUCCESS)]
+        executor = CeleryExecutor()
+        executor._bulk_state_fetch = True
+        executor.tasks = {'key': mock.Mock()}
+        executor.last_state = {'key': celery_states.PENDING}
+        executor.running = {'key': 'command'}
+
+        with mock.patch.object(executor, '_fetch_states_in_bulk',
+                               return_value=None):
+            executor.sync()
+        self.assertEqual(1, mock_pool.return_value.map_async.call_count)
+        self.assertEqual({'key': State.SUCCESS}, executor.event_buffer)
+
     @mock.patch('airflow.executors.celery_executor.CeleryExecutor.sync')
     @mock.patch('airflow.executors.celery_executor.CeleryExecutor.trigger_tasks')
     @mock.patch('airflow.settings.Stats.gauge')
@@ -24,6 +24,7 @@ from airflow import configuration
 from airflow.models import DagBag
 from airflow.jobs import BackfillJob
 from airflow.utils import timezone
+from airflow.utils.state import State
 
 from datetime import timedelta
 
@@ -39,6 +40,7 @@ try:
     )
     SKIP_DASK = False
 except ImportError:
+    DaskExecutor = None
     SKIP_DASK = True
 
 if 'sqlite' in configuration.conf.get('core', 'sql_alchemy_conn'):
@@ -127,6 +129,49 @@ class DaskExecutorTest(BaseDaskTest):
         self.cluster.close(timeout=5)
 
 
+class DaskExecutorSubmitTest(unittest.TestCase):
+
+    def tearDown(self):
+        configuration.conf.set('dask', 'queue_resources', 'False')
+
+    @unittest.skipIf(DaskExecutor is None, 'distributed is not installed')
+    @mock.patch('airflow.executors.dask_executor.distributed.Client')
+    def test_priority_queue_and_completion(self, mock_client):
+        configuration.conf.set('dask', 'queue_resources', 'True')
+        futures = []
+
+        def submit(func, **kwargs):
+            future = mock.Mock(done=mock.Mock(return_value=False))
+            futures.append((future, kwargs))
+            return future
+
+        mock_client.return_value.submit.side_effect = submit
+        executor = DaskExecutor(cluster_address='127.0.0.1:8786')
+        executor.start()
+        for key, priority, queue in [('low', 1, executor.default_queue),
+                                     ('high', 10, 'gpu')]:
+            executor.queue_command(mock.Mock(key=key, executor_config={}),
+                                   ['true'], priority=priority, queue=queue)
+        executor.heartbeat()
+
+        (high_future, high_kwargs), (low_future, low_kwargs) = futures
+        self.assertEqual({'pure': False, 'priority': 10, 'resources': {'gpu': 1}},
+                         high_kwargs)
+        self.assertEqual({'pure': False, 'priority': 1}, low_kwargs)
+
+        # Only the futures the client reported as done are processed
+        low_future.done.return_value = True
+        low_future.exception.return_value = None
+        low_future.cancelled.return_value = False
+        (done_callback,), _ = low_future.add_done_callback.call_args
+        done_callback(low_future)
+        executor.sync()
+
+        self.assertEqual({'low': State.SUCCESS}, executor.event_buffer)
+        self.assertEqual(['high'], list(executor.running))
+        high_future.done.assert_not_called()
+
+
 class DaskExecutorTLSTest(BaseDaskTest):
 
     def setUp(self):
@@ -17,10 +17,12 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import select
+import time
 import unittest
 from tests.compat import mock
 
-from airflow.executors.local_executor import LocalExecutor
+from airflow.executors.local_executor import LocalExecutor, LocalWorker
 from airflow.utils.state import State
 
 
@@ -64,6 +66,69 @@ class LocalExecutorTest(unittest.TestCase):
         test_parallelism = 2
         self.execution_parallelism(parallelism=test_parallelism)
 
+    def test_wait_for_events(self):
+        executor = LocalExecutor(parallelism=1)
+        executor.start()
+
+        executor.running['success'] = True
+        executor.execute_async(key='success', command=['true', 'some_parameter'])
+        start = time.time()
+        executor.wait_for_events(timeout=30)
+        self.assertLess(time.time() - start, 30)
+
+        executor.sync()
+        self.assertEqual(executor.event_buffer['success'], State.SUCCESS)
+        executor.end()
+
+    def test_event_fileno(self):
+        executor = LocalExecutor(parallelism=1)
+        executor.start()
+        fileno = executor.event_fileno()
+        self.assertEqual(([], [], []), select.select([fileno], [], [], 0))
+
+        executor.running['success'] = True
+        executor.execute_async(key='success', command=['true', 'some_parameter'])
+        self.assertEqual([fileno], select.select([fileno], [], [], 30)[0])
+
+        # Reading the results drains the pipe
+        executor.sync()
+        self.assertEqual(executor.event_buffer['success'], State.SUCCESS)
+        self.assertEqual(([], [], []), select.select([fileno], [], [], 0))
+        executor.end()
+
+    @mock.patch('airflow.executors.local_executor.LocalWorker._get_dag')
+    @mock.patch('airflow.bin.cli.run')
+    def test_execute_work_in_fork(self, mock_run, mock_get_dag):
+        mock_get_dag.return_value = None
+        command = ['airflow', 'run', 'example_bash_operator', 'runme_0',
+                   '2019-01-01T00:00:00', '--local']
+        result_queue = mock.MagicMock()
+        worker = LocalWorker(result_queue)
+        worker.fork_tasks = True
+
+        worker.execute_work('success', command)
+        result_queue.put.assert_called_once_with(('success', State.SUCCESS))
+
+        result_queue.reset_mock()
+        mock_run.side_effect = Exception('Task failed')
+        worker.execute_work('fail', command)
+        result_queue.put.assert_called_once_with(('fail', State.FAILED))
+
+    def test_execute_work_in_fork_bad_command(self):
+        result_queue = mock.MagicMock()
+        worker = LocalWorker(result_queue)
+        worker.fork_tasks = True
+
+        # argparse exits on the command, the worker reports the task as failed
+        worker.execute_work('fail', ['airflow', 'run', '--no_such_argument'])
+        result_queue.put.assert_called_once_with(('fail', State.FAILED))
+
+        result_queue.reset_mock()
+        with mock.patch.object(worker, '_get_dag', side_effect=SystemExit(1)):
+            worker.execute_work('fail', ['airflow', 'run', 'example_bash_operator',
+                                         'runme_0', '2019-01-01T00:00:00', '--local'])
+        result_queue.put.assert_called_once_with(('fail', State.FAILED))
+
     @mock.patch('airflow.executors.local_executor.LocalExecutor.sync')
     @mock.patch('airflow.executors.base_executor.BaseExecutor.trigger_tasks')
     @mock.patch('airflow.settings.Stats.gauge')
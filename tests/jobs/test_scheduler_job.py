@@ -39,6 +39,7 @@ from airflow import AirflowException, models, settings
 from airflow import configuration
 from airflow.executors import BaseExecutor
 from airflow.jobs import BackfillJob, SchedulerJob
+from airflow.jobs.scheduler_job import ConcurrencyLedger
 from airflow.models import DAG, DagBag, DagModel, DagRun, Pool, SlaMiss, \
     TaskInstance as TI, errors
 from airflow.operators.bash_operator import BashOperator
@@ -198,6 +199,44 @@ class SchedulerJobTest(unittest.TestCase):
         ti1.refresh_from_db()
         self.assertEqual(ti1.state, State.SUCCESS)
 
+    def test_process_executor_events_sends_failure_callbacks(self):
+        dag_id = "test_process_executor_events_sends_failure_callbacks"
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE)
+        task1 = DummyOperator(dag=dag, task_id='dummy_task_1')
+        task2 = DummyOperator(dag=dag, task_id='dummy_task_2')
+        dagbag = self._make_simple_dag_bag([dag])
+
+        scheduler = SchedulerJob()
+        scheduler.processor_agent = mock.MagicMock()
+        session = settings.Session()
+
+        ti1 = TI(task1, DEFAULT_DATE)
+        ti1.state = State.QUEUED
+        ti2 = TI(task2, DEFAULT_DATE)
+        ti2.state = State.SUCCESS
+        session.merge(ti1)
+        session.merge(ti2)
+        session.commit()
+
+        executor = TestExecutor(do_update=False)
+        executor.event_buffer[ti1.key] = State.FAILED
+        executor.event_buffer[ti2.key] = State.SUCCESS
+        scheduler.executor = executor
+
+        scheduler._process_executor_events(simple_dag_bag=dagbag)
+        # The failure is handled by the processor of the DAG file
+        ti1.refresh_from_db()
+        self.assertEqual(ti1.state, State.QUEUED)
+        scheduler.processor_agent.send_failure_callbacks.assert_called_once_with(
+            [mock.ANY])
+        request = scheduler.processor_agent.send_failure_callbacks.call_args[0][0][0]
+        self.assertEqual(request.full_filepath, dag.fileloc)
+        self.assertEqual(request.simple_task_instance.key, ti1.key)
+
+        scheduler._handle_failure_callbacks({dag_id: dag}, [request])
+        ti1.refresh_from_db()
+        self.assertEqual(ti1.state, State.FAILED)
+
     def test_execute_task_instances_is_paused_wont_execute(self):
         dag_id = 'SchedulerJobTest.test_execute_task_instances_is_paused_wont_execute'
         task_id_1 = 'dummy_task'
@@ -635,6 +674,245 @@ class SchedulerJobTest(unittest.TestCase):
 
         self.assertEqual(1, len(res))
 
+    def test_find_executable_task_instances_set_based_pool(self):
+        dag_id = 'SchedulerJobTest.test_find_executable_task_instances_set_based_pool'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE, concurrency=16)
+        task1 = DummyOperator(dag=dag, task_id='dummy', pool='a')
+        task2 = DummyOperator(dag=dag, task_id='dummydummy', pool='b')
+        dagbag = self._make_simple_dag_bag([dag])
+
+        scheduler = SchedulerJob()
+        scheduler.set_based_scheduling = True
+        session = settings.Session()
+
+        dr1 = scheduler.create_dag_run(dag)
+        dr2 = scheduler.create_dag_run(dag)
+
+        tis = ([
+            TI(task1, dr1.execution_date),
+            TI(task2, dr1.execution_date),
+            TI(task1, dr2.execution_date),
+            TI(task2, dr2.execution_date)
+        ])
+        for ti in tis:
+            ti.state = State.SCHEDULED
+            session.merge(ti)
+        session.add(models.Pool(pool='a', slots=1, description='haha'))
+        session.add(models.Pool(pool='b', slots=100, description='haha'))
+        session.commit()
+
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        session.commit()
+        res_keys = [ti.key for ti in res]
+        self.assertEqual(3, len(res_keys))
+        self.assertIn(tis[0].key, res_keys)
+        self.assertIn(tis[1].key, res_keys)
+        self.assertIn(tis[3].key, res_keys)
+
+    def test_find_executable_task_instances_set_based_priority_and_limit(self):
+        dag_id = 'SchedulerJobTest.test_find_executable_task_instances_set_based_priority'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE, concurrency=16)
+        task1 = DummyOperator(dag=dag, task_id='low', priority_weight=1)
+        task2 = DummyOperator(dag=dag, task_id='high', priority_weight=10)
+        task3 = DummyOperator(dag=dag, task_id='running', task_concurrency=1)
+        dagbag = self._make_simple_dag_bag([dag])
+
+        scheduler = SchedulerJob()
+        scheduler.set_based_scheduling = True
+        scheduler.max_tis_per_loop = 1
+        session = settings.Session()
+
+        dr = scheduler.create_dag_run(dag)
+        ti1 = TI(task1, dr.execution_date)
+        ti2 = TI(task2, dr.execution_date)
+        ti3 = TI(task3, dr.execution_date)
+        ti1.state = State.SCHEDULED
+        ti2.state = State.SCHEDULED
+        ti3.state = State.RUNNING
+        session.merge(ti1)
+        session.merge(ti2)
+        session.merge(ti3)
+        session.commit()
+
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual([ti2.key], [ti.key for ti in res])
+
+        scheduler.max_tis_per_loop = 0
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual([ti2.key, ti1.key], [ti.key for ti in res])
+
+        # Executable task instances can be queued like regular ones
+        simple_tis = scheduler._change_state_for_executable_task_instances(
+            res, [State.SCHEDULED], session=session)
+        self.assertEqual(2, len(simple_tis))
+        session.close()
+
+    def test_find_executable_task_instances_set_based_limit_after_pool(self):
+        dag_id = 'SchedulerJobTest.test_find_executable_task_instances_set_based_limit_after_pool'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE, concurrency=16)
+        task1 = DummyOperator(dag=dag, task_id='high', pool='a', priority_weight=10)
+        task2 = DummyOperator(dag=dag, task_id='low', pool='b', priority_weight=1)
+        dagbag = self._make_simple_dag_bag([dag])
+
+        scheduler = SchedulerJob()
+        scheduler.set_based_scheduling = True
+        scheduler.max_tis_per_loop = 2
+        session = settings.Session()
+
+        dr1 = scheduler.create_dag_run(dag)
+        dr2 = scheduler.create_dag_run(dag)
+        dr3 = scheduler.create_dag_run(dag)
+        tis = ([
+            TI(task1, dr1.execution_date),
+            TI(task1, dr2.execution_date),
+            TI(task1, dr3.execution_date),
+            TI(task2, dr1.execution_date),
+        ])
+        for ti in tis:
+            ti.state = State.SCHEDULED
+            session.merge(ti)
+        session.add(models.Pool(pool='a', slots=1, description='haha'))
+        session.add(models.Pool(pool='b', slots=100, description='haha'))
+        session.commit()
+
+        # The candidates of the full pool do not use up the limit
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual([tis[0].key, tis[3].key], [ti.key for ti in res])
+        session.close()
+
+    def test_find_executable_task_instances_set_based_skips_full_dags(self):
+        dag_id = 'SchedulerJobTest.test_find_executable_task_instances_set_based_full_dag'
+        full_dag = DAG(dag_id=dag_id + '_full', start_date=DEFAULT_DATE, concurrency=1)
+        running_task = DummyOperator(dag=full_dag, task_id='running')
+        high_task = DummyOperator(dag=full_dag, task_id='high', priority_weight=10)
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE, concurrency=16)
+        low_task = DummyOperator(dag=dag, task_id='low', priority_weight=1)
+        dagbag = self._make_simple_dag_bag([full_dag, dag])
+
+        scheduler = SchedulerJob()
+        scheduler.set_based_scheduling = True
+        scheduler.max_tis_per_loop = 1
+        session = settings.Session()
+
+        full_dr = scheduler.create_dag_run(full_dag)
+        dr = scheduler.create_dag_run(dag)
+        running_ti = TI(running_task, full_dr.execution_date)
+        running_ti.state = State.RUNNING
+        session.merge(running_ti)
+        high_ti = TI(high_task, full_dr.execution_date)
+        high_ti.state = State.SCHEDULED
+        session.merge(high_ti)
+        low_ti = TI(low_task, dr.execution_date)
+        low_ti.state = State.SCHEDULED
+        session.merge(low_ti)
+        session.commit()
+
+        # The candidates of the full DAG are not read, one page is enough
+        with mock.patch.object(SchedulerJob, '_after_executable_ti') as after:
+            res = scheduler._find_executable_task_instances(
+                dagbag,
+                states=[State.SCHEDULED],
+                session=session)
+            after.assert_not_called()
+        self.assertEqual([low_ti.key], [ti.key for ti in res])
+        session.close()
+
+    def test_concurrency_ledger(self):
+        dag_id = 'SchedulerJobTest.test_concurrency_ledger'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE)
+        task1 = DummyOperator(dag=dag, task_id='dummy1', pool='a')
+        task2 = DummyOperator(dag=dag, task_id='dummy2')
+        session = settings.Session()
+
+        ti1 = TI(task1, DEFAULT_DATE)
+        ti2 = TI(task2, DEFAULT_DATE)
+        ti1.state = State.RUNNING
+        ti2.state = State.SCHEDULED
+        session.merge(ti1)
+        session.merge(ti2)
+        session.commit()
+
+        ledger = ConcurrencyLedger(reconcile_interval=3600)
+        pool_map, dag_map, task_map = ledger.get_usage_maps(session=session)
+        self.assertEqual(1, pool_map['a'])
+        self.assertEqual(1, dag_map[dag_id])
+        self.assertEqual(1, task_map[(dag_id, 'dummy1')])
+        self.assertEqual(0, task_map[(dag_id, 'dummy2')])
+
+        # Updates are applied in memory, the database is not consulted
+        ledger.occupy(ti2)
+        ledger.occupy(ti2)
+        ledger.release(ti1.dag_id, ti1.task_id, ti1.execution_date)
+        pool_map, dag_map, task_map = ledger.get_usage_maps(session=session)
+        self.assertEqual(0, pool_map['a'])
+        self.assertEqual(1, pool_map[None])
+        self.assertEqual(1, dag_map[dag_id])
+        self.assertEqual(1, task_map[(dag_id, 'dummy2')])
+
+        # Returned maps are copies
+        dag_map[dag_id] += 10
+        self.assertEqual(1, ledger.get_usage_maps(session=session)[1][dag_id])
+
+        ledger.invalidate()
+        pool_map, dag_map, task_map = ledger.get_usage_maps(session=session)
+        self.assertEqual(1, pool_map['a'])
+        self.assertEqual(0, pool_map[None])
+        session.close()
+
+    def test_find_executable_task_instances_concurrency_ledger(self):
+        dag_id = 'SchedulerJobTest.test_find_executable_task_instances_concurrency_ledger'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE, concurrency=1)
+        task1 = DummyOperator(dag=dag, task_id='dummy')
+        dagbag = self._make_simple_dag_bag([dag])
+
+        scheduler = SchedulerJob()
+        scheduler.concurrency_ledger = ConcurrencyLedger(reconcile_interval=3600)
+        session = settings.Session()
+
+        dr1 = scheduler.create_dag_run(dag)
+        dr2 = scheduler.create_dag_run(dag)
+        ti1 = TI(task1, dr1.execution_date)
+        ti2 = TI(task1, dr2.execution_date)
+        ti1.state = State.SCHEDULED
+        ti2.state = State.SCHEDULED
+        session.merge(ti1)
+        session.merge(ti2)
+        session.commit()
+
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual(1, len(res))
+
+        scheduler._change_state_for_executable_task_instances(
+            res, [State.SCHEDULED], session=session)
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual(0, len(res))
+
+        scheduler.concurrency_ledger.release(ti1.dag_id, ti1.task_id, ti1.execution_date)
+        res = scheduler._find_executable_task_instances(
+            dagbag,
+            states=[State.SCHEDULED],
+            session=session)
+        self.assertEqual([ti2.key], [ti.key for ti in res])
+        session.close()
+
     def test_change_state_for_executable_task_instances_no_tis(self):
         scheduler = SchedulerJob()
         session = settings.Session()
@@ -1409,6 +1687,46 @@ class SchedulerJobTest(unittest.TestCase):
             (dag.dag_id, dag_task1.task_id, DEFAULT_DATE, TRY_NUMBER)
         )
 
+    def test_scheduler_process_task_instances_bulk(self):
+        """
+        Test if _process_task_instances_bulk schedules the task instances of
+        the DAG runs of all the given DAGs.
+        """
+        dag1 = DAG(
+            dag_id='test_scheduler_process_task_instances_bulk_1',
+            start_date=DEFAULT_DATE)
+        dag1_task1 = DummyOperator(task_id='dummy', dag=dag1, owner='airflow')
+        dag1_task2 = DummyOperator(task_id='dummy2', dag=dag1, owner='airflow')
+        dag1_task1.set_downstream(dag1_task2)
+        dag2 = DAG(
+            dag_id='test_scheduler_process_task_instances_bulk_2',
+            start_date=DEFAULT_DATE)
+        dag2_task1 = DummyOperator(task_id='dummy', dag=dag2, owner='airflow')
+
+        with create_session() as session:
+            session.merge(DagModel(dag_id=dag1.dag_id))
+            session.merge(DagModel(dag_id=dag2.dag_id))
+
+        scheduler = SchedulerJob()
+        dag1.clear()
+        dag2.clear()
+        self.assertIsNotNone(scheduler.create_dag_run(dag1))
+        dr2 = scheduler.create_dag_run(dag2)
+        self.assertIsNotNone(dr2)
+
+        with create_session() as session:
+            # Remove a task instance so verify_integrity recreates it
+            session.query(TI).filter(TI.dag_id == dag2.dag_id).delete()
+
+        tis_out = []
+        scheduler._process_task_instances_bulk([dag1, dag2], tis_out)
+
+        self.assertEqual(
+            sorted([(dag1.dag_id, dag1_task1.task_id, DEFAULT_DATE, TRY_NUMBER),
+                    (dag2.dag_id, dag2_task1.task_id, DEFAULT_DATE, TRY_NUMBER)]),
+            sorted(tis_out))
+        self.assertEqual(1, len(dr2.get_task_instances()))
+
     def test_scheduler_do_not_schedule_removed_task(self):
         dag = DAG(
             dag_id='test_scheduler_do_not_schedule_removed_task',
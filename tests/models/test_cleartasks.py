@@ -19,10 +19,13 @@
 
 import datetime
 import os
+import shutil
+import tempfile
 import unittest
 
 from airflow import settings, configuration
 from airflow.models import DAG, TaskInstance as TI, clear_task_instances, XCom
+from airflow.models.xcom import FileSystemXCom
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.utils import timezone
 from airflow.utils.state import State
@@ -336,3 +339,75 @@ class ClearTasksTest(unittest.TestCase):
 
         for result in results:
             self.assertEqual(result.value, json_obj)
+
+    def test_file_system_xcom(self):
+        folder = tempfile.mkdtemp()
+        default_folder = configuration.conf.get("core", "xcom_filesystem_folder")
+        configuration.conf.set("core", "xcom_filesystem_folder", folder)
+        try:
+            execution_date = timezone.utcnow()
+            json_obj = {"key": "value"}
+            for key, value in [("xcom_test6", json_obj), ("xcom_test7", b"payload")]:
+                FileSystemXCom.set(key=key,
+                                   value=value,
+                                   dag_id="test_dag6",
+                                   task_id="test_task6",
+                                   execution_date=execution_date)
+
+            # Only a reference to the file is stored in the database
+            session = settings.Session()
+            (stored_value,) = session.query(XCom.value).filter(
+                XCom.key == "xcom_test6").one()
+            session.close()
+            self.assertTrue(stored_value.startswith(FileSystemXCom.REFERENCE_PREFIX))
+
+            self.assertEqual(json_obj, FileSystemXCom.get_one(
+                key="xcom_test6", execution_date=execution_date))
+            self.assertEqual(b"payload", FileSystemXCom.get_one(
+                key="xcom_test7", execution_date=execution_date))
+            # The values are not read when the XComs are loaded
+            (result,) = FileSystemXCom.get_many(key="xcom_test6",
+                                                execution_date=execution_date)
+            self.assertTrue(os.path.isfile(result.value))
+        finally:
+            configuration.conf.set("core", "xcom_filesystem_folder", default_folder)
+            shutil.rmtree(folder)
+
+    def test_file_system_xcom_purge(self):
+        folder = tempfile.mkdtemp()
+        default_folder = configuration.conf.get("core", "xcom_filesystem_folder")
+        configuration.conf.set("core", "xcom_filesystem_folder", folder)
+        try:
+            execution_date = timezone.utcnow()
+
+            def push(key, value):
+                FileSystemXCom.set(key=key,
+                                   value=value,
+                                   dag_id="test_dag7",
+                                   task_id="test_task7",
+                                   execution_date=execution_date)
+                (xcom,) = FileSystemXCom.get_many(key=key,
+                                                  execution_date=execution_date)
+                return xcom
+
+            # Pushing a value again keeps its file, or replaces it
+            first = push("xcom_test8", {"key": "value"})
+            self.assertEqual(first.value, push("xcom_test8", {"key": "other"}).value)
+            self.assertTrue(os.path.isfile(first.value))
+            replaced = push("xcom_test8", b"payload")
+            self.assertFalse(os.path.isfile(first.value))
+            self.assertTrue(os.path.isfile(replaced.value))
+
+            FileSystemXCom.delete(replaced)
+            self.assertFalse(os.path.isfile(replaced.value))
+
+            cleared = push("xcom_test9", b"payload")
+            FileSystemXCom.clear(execution_date=execution_date,
+                                 task_id="test_task7",
+                                 dag_id="test_dag7")
+            self.assertFalse(os.path.isfile(cleared.value))
+            self.assertEqual([], FileSystemXCom.get_many(key="xcom_test9",
+                                                         execution_date=execution_date))
+        finally:
+            configuration.conf.set("core", "xcom_filesystem_folder", default_folder)
+            shutil.rmtree(folder)
@@ -20,12 +20,17 @@
 import datetime
 import unittest
 
+import mock
+
 from airflow import settings, models
 from airflow.jobs import BackfillJob
 from airflow.models import DAG, DagRun, clear_task_instances
+from airflow.models.dagrun import DagRunStateSummary
 from airflow.models import TaskInstance as TI
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.python_operator import ShortCircuitOperator
+from airflow.ti_deps.dep_context import DepContext, evaluate_many
+from airflow.ti_deps.deps.task_concurrency_dep import TaskConcurrencyDep
 from airflow.utils import timezone
 from airflow.utils.state import State
 from airflow.utils.trigger_rule import TriggerRule
@@ -242,6 +247,93 @@ class DagRunTest(unittest.TestCase):
         dr.update_state()
         self.assertEqual(dr.state, State.FAILED)
 
+    def test_dagrun_state_summary(self):
+        dag = DAG('test_dagrun_state_summary', start_date=DEFAULT_DATE)
+        with dag:
+            op1 = DummyOperator(task_id='A')
+            op2 = DummyOperator(task_id='B')
+            op3 = DummyOperator(task_id='C')
+            op1.set_downstream(op3)
+            op2.set_downstream(op3)
+
+        tis = [TI(op1, DEFAULT_DATE, state=State.SUCCESS),
+               TI(op2, DEFAULT_DATE, state=State.RUNNING),
+               TI(op3, DEFAULT_DATE)]
+        summary = DagRunStateSummary(dag, DEFAULT_DATE, tis)
+        self.assertTrue(summary.covers(tis[2]))
+        self.assertEqual(1, summary.state_counts[State.SUCCESS])
+        self.assertEqual(1, summary.state_counts[State.NONE])
+        self.assertEqual((1, 0, 0, 0, 1), summary.upstream_counts('C'))
+        self.assertEqual((0, 0, 0, 0, 0), summary.upstream_counts('A'))
+
+        summary.update('B', State.FAILED)
+        self.assertEqual(0, summary.state_counts[State.RUNNING])
+        self.assertEqual((1, 0, 1, 0, 2), summary.upstream_counts('C'))
+
+        summary.update('A', State.UP_FOR_RETRY)
+        self.assertEqual((0, 0, 1, 0, 1), summary.upstream_counts('C'))
+        self.assertEqual(State.UP_FOR_RETRY, summary.get_state('A'))
+
+    def test_evaluate_many(self):
+        session = settings.Session()
+        dag = DAG('test_evaluate_many', start_date=DEFAULT_DATE)
+        with dag:
+            op1 = DummyOperator(task_id='A')
+            op2 = DummyOperator(task_id='B')
+            op3 = DummyOperator(task_id='C')
+            op4 = DummyOperator(task_id='D')
+            DummyOperator(task_id='E', task_concurrency=1)
+            op1.set_downstream(op3)
+            op2.set_downstream(op3)
+            op3.set_downstream(op4)
+        dag.clear()
+
+        dr = self.create_dag_run(dag, task_states={'A': State.SUCCESS,
+                                                   'B': State.FAILED},
+                                 execution_date=DEFAULT_DATE)
+        tis = sorted(dr.get_task_instances(state=(State.NONE,), session=session),
+                     key=lambda ti: ti.task_id)
+        for ti in tis:
+            ti.task = dag.get_task(ti.task_id)
+
+        failed = evaluate_many(tis, DepContext(flag_upstream_failed=True),
+                               session=session)
+        tis = {ti.task_id: ti for ti in tis}
+        self.assertTrue(failed[tis['C'].key])
+        self.assertEqual(State.UPSTREAM_FAILED, tis['C'].state)
+        # D sees the state C was flagged with in the same evaluation
+        self.assertTrue(failed[tis['D'].key])
+        self.assertEqual(State.UPSTREAM_FAILED, tis['D'].state)
+        self.assertEqual([], failed[tis['E'].key])
+        session.close()
+
+    def test_evaluate_many_task_concurrency(self):
+        session = settings.Session()
+        dag = DAG('test_evaluate_many_task_concurrency', start_date=DEFAULT_DATE)
+        with dag:
+            DummyOperator(task_id='A', task_concurrency=1)
+            DummyOperator(task_id='B', task_concurrency=2)
+        dag.clear()
+
+        self.create_dag_run(dag, task_states={'A': State.RUNNING, 'B': State.RUNNING},
+                            execution_date=DEFAULT_DATE)
+        dr = self.create_dag_run(dag, execution_date=DEFAULT_DATE + datetime.timedelta(days=1))
+        tis = sorted(dr.get_task_instances(session=session), key=lambda ti: ti.task_id)
+        for ti in tis:
+            ti.task = dag.get_task(ti.task_id)
+
+        # The running task instances of all DagRuns are counted with the
+        # summary, not per task instance
+        with mock.patch.object(TI, 'get_num_running_task_instances') as mock_count:
+            failed = evaluate_many(tis, DepContext(deps={TaskConcurrencyDep()}),
+                                   session=session)
+            mock_count.assert_not_called()
+        tis = {ti.task_id: ti for ti in tis}
+        self.assertEqual(["The max task concurrency has been reached."],
+                         [status.reason for status in failed[tis['A'].key]])
+        self.assertEqual([], failed[tis['B'].key])
+        session.close()
+
     def test_dagrun_no_deadlock_with_shutdown(self):
         session = settings.Session()
         dag = DAG('test_dagrun_no_deadlock_with_shutdown',
@@ -474,6 +566,26 @@ class DagRunTest(unittest.TestCase):
         self.assertIsNotNone(dr_database.end_date)
         self.assertEqual(dr.end_date, dr_database.end_date)
 
+    def test_verify_integrity_creates_missing_task_instances(self):
+        dag = DAG('test_verify_integrity_creates_missing_task_instances',
+                  start_date=DEFAULT_DATE)
+        with dag:
+            DummyOperator(task_id='A')
+        dag.clear()
+        dagrun = self.create_dag_run(dag, execution_date=DEFAULT_DATE)
+        self.assertEqual(['A'], [ti.task_id for ti in dagrun.get_task_instances()])
+
+        with dag:
+            DummyOperator(task_id='B')
+            DummyOperator(task_id='C')
+        dagrun.dag = dag
+        tis = dagrun.get_task_instances()
+        dagrun.verify_integrity(tis=tis)
+
+        self.assertEqual(['A', 'B', 'C'], sorted(ti.task_id for ti in tis))
+        self.assertEqual(['A', 'B', 'C'],
+                         sorted(ti.task_id for ti in dagrun.get_task_instances()))
+
     def test_get_task_instance_on_empty_dagrun(self):
         """
         Make sure that a proper value is returned when a dagrun has no task instances
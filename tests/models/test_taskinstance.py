@@ -680,6 +680,89 @@ class TaskInstanceTest(unittest.TestCase):
             task_ids=['test_xcom_1', 'test_xcom_2'], key='foo')
         self.assertEqual(result, ('bar', 'baz'))
 
+    def test_xcom_pull_many_task_ids(self):
+        """
+        Test that pulling from many tasks makes one query, and that the values
+        pulled while rendering templates are cached until the task instance
+        pushes an XCom.
+        """
+        dag = models.DAG(
+            dag_id='test_xcom', schedule_interval='@monthly',
+            start_date=timezone.datetime(2016, 6, 1, 0, 0, 0))
+        exec_date = timezone.utcnow()
+        tis = []
+        for i in range(3):
+            task = DummyOperator(task_id='test_xcom_many_{}'.format(i), dag=dag,
+                                 owner='airflow')
+            tis.append(TI(task=task, execution_date=exec_date))
+        tis[0].xcom_push(key='foo', value='bar_0')
+        tis[2].xcom_push(key='foo', value='bar_2')
+        task_ids = ['test_xcom_many_2', 'test_xcom_many_1', 'test_xcom_many_0']
+
+        with patch.object(models.XCom, 'get_one') as mock_get_one:
+            self.assertEqual(('bar_2', None, 'bar_0'),
+                             tis[0].xcom_pull(task_ids=task_ids, key='foo'))
+            mock_get_one.assert_not_called()
+
+        # Values are cached while rendering, until the task instance pushes
+        tis[0]._xcom_cache = {}
+        tis[0].xcom_pull(task_ids=task_ids, key='foo')
+        tis[2].xcom_push(key='foo', value='baz_2')
+        with patch.object(models.XCom, 'get_one') as mock_get_one:
+            self.assertEqual('bar_2', tis[0].xcom_pull(task_ids='test_xcom_many_2', key='foo'))
+            mock_get_one.assert_not_called()
+        tis[0].xcom_push(key='foo', value='baz_0')
+        self.assertEqual(('baz_2', None, 'baz_0'),
+                         tis[0].xcom_pull(task_ids=task_ids, key='foo'))
+
+        # Callers get copies of the cached values
+        tis[1].xcom_push(key='foo', value=['bar_1'])
+        tis[0]._xcom_cache = {}
+        tis[0].xcom_pull(task_ids='test_xcom_many_1', key='foo').append('baz_1')
+        self.assertEqual(['bar_1'], tis[0].xcom_pull(task_ids='test_xcom_many_1', key='foo'))
+        tis[0]._xcom_cache = None
+
+    def test_xcom_pull_not_cached_outside_rendering(self):
+        """
+        Test that a task pulling an XCom that is not pushed yet sees it once it
+        is pushed, e.g. a sensor waiting for it.
+        """
+        dag = models.DAG(
+            dag_id='test_xcom', schedule_interval='@monthly',
+            start_date=timezone.datetime(2016, 6, 1, 0, 0, 0))
+        exec_date = timezone.utcnow()
+        pulling_ti = TI(task=DummyOperator(task_id='test_xcom_pulling', dag=dag,
+                                           owner='airflow'),
+                        execution_date=exec_date)
+        pushing_ti = TI(task=DummyOperator(task_id='test_xcom_pushing', dag=dag,
+                                           owner='airflow'),
+                        execution_date=exec_date)
+
+        pulling_ti.render_templates()
+        self.assertIsNone(pulling_ti._xcom_cache)
+        self.assertIsNone(pulling_ti.xcom_pull(task_ids='test_xcom_pushing', key='foo'))
+        pushing_ti.xcom_push(key='foo', value='bar')
+        self.assertEqual('bar', pulling_ti.xcom_pull(task_ids='test_xcom_pushing', key='foo'))
+
+    def test_xcom_push_many(self):
+        dag = models.DAG(
+            dag_id='test_xcom', schedule_interval='@monthly',
+            start_date=timezone.datetime(2016, 6, 1, 0, 0, 0))
+        task = DummyOperator(task_id='test_xcom_push_many', dag=dag, owner='airflow')
+        ti = TI(task=task, execution_date=timezone.utcnow())
+
+        ti.xcom_push_many({'foo': 'bar', 'baz': [1, 2]})
+        ti.xcom_push_many({'foo': 'qux'})
+        self.assertEqual('qux', ti.xcom_pull(task_ids='test_xcom_push_many', key='foo'))
+        self.assertEqual([1, 2], ti.xcom_pull(task_ids='test_xcom_push_many', key='baz'))
+        self.assertEqual(2, len(models.XCom.get_many(
+            execution_date=ti.execution_date, task_ids='test_xcom_push_many',
+            dag_ids='test_xcom')))
+
+        with self.assertRaises(ValueError):
+            ti.xcom_push_many({'foo': 'bar'},
+                              execution_date=ti.execution_date - datetime.timedelta(days=1))
+
     def test_xcom_pull_after_success(self):
         """
         tests xcom set/clear relative to a task in a 'success' rerun scenario
@@ -24,6 +24,7 @@ from mock import patch
 
 from airflow import settings
 from airflow.models import crypto, Variable
+from airflow.utils.cache import TTLCache
 
 
 class VariableTest(unittest.TestCase):
@@ -83,3 +84,57 @@ class VariableTest(unittest.TestCase):
         self.assertTrue(test_var.is_encrypted)
         self.assertEqual(test_var.val, 'value')
         self.assertEqual(Fernet(key2).decrypt(test_var._val.encode()), b'value')
+
+    def test_variable_cache(self):
+        """
+        Test that cached variables are not read from the database again
+        """
+        Variable.set('cached_key', 'value')
+        with patch.object(Variable, '_cache', TTLCache('variable', ttl=60, maxsize=10)):
+            self.assertEqual('value', Variable.get('cached_key'))
+            self.assertEqual('default', Variable.get('missing_key', default_var='default'))
+            with patch.object(settings, 'Session') as mock_session:
+                self.assertEqual('value', Variable.get('cached_key'))
+                self.assertEqual('default', Variable.get('missing_key', default_var='default'))
+                mock_session.return_value.query.assert_not_called()
+
+            # Setting a variable invalidates its entry
+            Variable.set('cached_key', 'new_value')
+            self.assertEqual('new_value', Variable.get('cached_key'))
+
+    def test_variable_get_many(self):
+        """
+        Test getting a number of variables at once
+        """
+        Variable.set('many_key_1', 'value_1')
+        Variable.set('many_key_2', {'foo': 'bar'}, serialize_json=True)
+        self.assertEqual({'many_key_1': 'value_1', 'many_key_2': '{"foo": "bar"}'},
+                         Variable.get_many(['many_key_1', 'many_key_2', 'missing_key']))
+        self.assertEqual({'many_key_2': {'foo': 'bar'}},
+                         Variable.get_many(['many_key_2'], deserialize_json=True))
+
+    def test_variable_get_many_cache(self):
+        """
+        Test that cached variables are not read from the database again
+        """
+        Variable.set('many_key_1', 'value_1')
+        with patch.object(Variable, '_cache', TTLCache('variable', ttl=60, maxsize=10)):
+            Variable.get_many(['many_key_1', 'missing_key'])
+            with patch.object(settings, 'Session') as mock_session:
+                self.assertEqual({'many_key_1': 'value_1'},
+                                 Variable.get_many(['many_key_1', 'missing_key']))
+                with self.assertRaises(KeyError):
+                    Variable.get('missing_key')
+                mock_session.return_value.query.assert_not_called()
+
+    def test_variable_get_by_prefix(self):
+        """
+        Test getting the variables whose key starts with a prefix
+        """
+        Variable.set('prefix_1', 'value_1')
+        Variable.set('prefix_2', 'value_2')
+        Variable.set('prefiy_3', 'value_3')
+        Variable.set('prefix%', 'value_4')
+        self.assertEqual({'prefix_1': 'value_1', 'prefix_2': 'value_2'},
+                         Variable.get_by_prefix('prefix_'))
+        self.assertEqual({'prefix%': 'value_4'}, Variable.get_by_prefix('prefix%'))
@@ -20,7 +20,9 @@
 import unittest
 from datetime import datetime
 
-from airflow.models import BaseOperator, TaskInstance
+from airflow.models import DAG, BaseOperator, TaskInstance
+from airflow.models.dagrun import DagRunStateSummary
+from airflow.ti_deps.dep_context import DepContext
 from airflow.utils.trigger_rule import TriggerRule
 from airflow.ti_deps.deps.trigger_rule_dep import TriggerRuleDep
 from airflow.utils.db import create_session
@@ -361,3 +363,36 @@ class TriggerRuleDepTest(unittest.TestCase):
 
         self.assertEqual(len(dep_statuses), 1)
         self.assertFalse(dep_statuses[0].passed)
+
+    def test_dagrun_state_summary(self):
+        """
+        Upstream states are read from the DagRun state summary when one is given,
+        and states flagged by the trigger rule are recorded in it
+        """
+        dag = DAG('test_dagrun_state_summary', start_date=datetime(2015, 1, 1))
+        upstream = BaseOperator(task_id='upstream', dag=dag)
+        task = BaseOperator(task_id='test_task', dag=dag)
+        downstream = BaseOperator(task_id='downstream', dag=dag)
+        upstream.set_downstream(task)
+        task.set_downstream(downstream)
+
+        upstream_ti = TaskInstance(upstream, dag.start_date, state=State.FAILED)
+        ti = TaskInstance(task, dag.start_date)
+        downstream_ti = TaskInstance(downstream, dag.start_date)
+        summary = DagRunStateSummary(
+            dag, dag.start_date, [upstream_ti, ti, downstream_ti])
+
+        dep_context = DepContext(dagrun_state_summary=summary)
+        with create_session() as session:
+            dep_statuses = tuple(TriggerRuleDep()._get_dep_statuses(
+                ti, session, dep_context))
+        self.assertEqual(len(dep_statuses), 1)
+        self.assertFalse(dep_statuses[0].passed)
+        self.assertEqual(ti.state, State.NONE)
+
+        dep_context = DepContext(flag_upstream_failed=True,
+                                 dagrun_state_summary=summary)
+        with create_session() as session:
+            tuple(TriggerRuleDep()._get_dep_statuses(ti, session, dep_context))
+            self.assertEqual(ti.state, State.UPSTREAM_FAILED)
+            self.assertEqual((0, 0, 0, 1, 1), summary.upstream_counts('downstream'))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from mock import patch
+
+from airflow.utils.cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    @patch('airflow.utils.cache.Stats')
+    def test_get_and_put(self, mock_stats):
+        cache = TTLCache('test', ttl=60, maxsize=2)
+        self.assertIs(TTLCache.MISSING, cache.get('a'))
+        cache.put('a', 1)
+        cache.put('b', None)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        mock_stats.incr.assert_any_call('test_cache_misses')
+        mock_stats.incr.assert_any_call('test_cache_hits')
+
+        # The least recently used entry is evicted
+        cache.put('c', 3)
+        self.assertIs(TTLCache.MISSING, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+        cache.invalidate('c')
+        self.assertIs(TTLCache.MISSING, cache.get('c'))
+        cache.invalidate()
+        self.assertIs(TTLCache.MISSING, cache.get('b'))
+
+    @patch('airflow.utils.cache.time.time')
+    def test_expiry(self, mock_time):
+        cache = TTLCache('test', ttl=60, maxsize=2)
+        mock_time.return_value = 1000
+        cache.put('a', 1)
+        mock_time.return_value = 1059
+        self.assertEqual(1, cache.get('a'))
+        mock_time.return_value = 1060
+        self.assertIs(TTLCache.MISSING, cache.get('a'))
+
+    def test_disabled(self):
+        cache = TTLCache('test', ttl=0, maxsize=2)
+        cache.put('a', 1)
+        self.assertIs(TTLCache.MISSING, cache.get('a'))
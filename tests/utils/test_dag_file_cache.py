@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import textwrap
+import unittest
+from tempfile import mkdtemp
+
+from mock import patch
+
+from airflow import configuration
+from airflow.models import DagBag
+from airflow.utils.dag_file_cache import collect_dag_structures
+
+DAG_FILE_CONTENT = textwrap.dedent("""
+    from datetime import datetime
+    from airflow import DAG
+    from airflow.operators.dummy_operator import DummyOperator
+
+    dag = DAG('test_dag_file_cache', start_date=datetime(2019, 1, 1),
+              schedule_interval='@daily')
+    DummyOperator(task_id='dummy', dag=dag, task_concurrency=2)
+""")
+
+
+class DagFileCacheTest(unittest.TestCase):
+    def setUp(self):
+        configuration.load_test_config()
+        self.dag_folder = mkdtemp()
+        self.cache_folder = mkdtemp()
+        self.dag_file = os.path.join(self.dag_folder, 'test_dag.py')
+        with open(self.dag_file, 'w') as f:
+            f.write(DAG_FILE_CONTENT)
+        configuration.conf.set('core', 'dag_file_cache_folder', self.cache_folder)
+
+    def tearDown(self):
+        configuration.conf.set('core', 'dag_file_cache_folder', '')
+        shutil.rmtree(self.dag_folder)
+        shutil.rmtree(self.cache_folder)
+
+    def test_collect_dag_structures(self):
+        dags = collect_dag_structures(self.dag_folder, include_examples=False,
+                                      safe_mode=True)
+        self.assertEqual(1, len(dags))
+        self.assertEqual('test_dag_file_cache', dags[0].dag_id)
+        self.assertEqual(['dummy'], dags[0].task_ids)
+        self.assertEqual({'dummy': 2}, dags[0].task_concurrency)
+        self.assertEqual('@daily', dags[0].schedule_interval)
+
+        # The file did not change, it is not executed again
+        with patch.object(DagBag, 'process_file') as mock_process_file:
+            self.assertEqual(dags, collect_dag_structures(
+                self.dag_folder, include_examples=False, safe_mode=True))
+            mock_process_file.assert_not_called()
+
+        with open(self.dag_file, 'a') as f:
+            f.write("DummyOperator(task_id='other', dag=dag)\n")
+        dags = collect_dag_structures(self.dag_folder, include_examples=False,
+                                      safe_mode=True)
+        self.assertEqual(['dummy', 'other'], sorted(dags[0].task_ids))
+
+    def test_import_errors_are_not_cached(self):
+        with open(self.dag_file, 'a') as f:
+            f.write("raise Exception('broken')\n")
+        DagBag(self.dag_folder, include_examples=False)
+        self.assertEqual([], os.listdir(self.cache_folder))
+
+    def test_unchanged_files_are_not_cached_again(self):
+        DagBag(self.dag_folder, include_examples=False)
+        self.assertEqual(1, len(os.listdir(self.cache_folder)))
+
+        with patch('airflow.utils.dag_file_cache.tempfile.mkstemp') as mock_mkstemp:
+            DagBag(self.dag_folder, include_examples=False)
+            mock_mkstemp.assert_not_called()
+
+    def test_prune(self):
+        collect_dag_structures(self.dag_folder, include_examples=False,
+                               safe_mode=True)
+        self.assertEqual(1, len(os.listdir(self.cache_folder)))
+
+        os.remove(self.dag_file)
+        self.assertEqual([], collect_dag_structures(
+            self.dag_folder, include_examples=False, safe_mode=True))
+        self.assertEqual([], os.listdir(self.cache_folder))
@@ -18,6 +18,7 @@
 # under the License.
 
 import os
+import shutil
 import sys
 import tempfile
 import unittest
@@ -30,10 +31,13 @@ from airflow import configuration as conf
 from airflow.configuration import mkdir_p
 from airflow.jobs import DagFileProcessor
 from airflow.jobs import LocalTaskJob as LJ
+from airflow.jobs.scheduler_job import DagFileProcessorPool, PooledDagFileProcessor
 from airflow.models import DagBag, TaskInstance as TI
 from airflow.utils import timezone
-from airflow.utils.dag_processing import (DagFileProcessorAgent, DagFileProcessorManager,
-                                          SimpleTaskInstance, correct_maybe_zipped)
+from airflow.utils.dag_processing import (DagDirectoryWatcher, DagFileProcessorAgent,
+                                          DagFileProcessorManager, FailureCallbackRequest,
+                                          FailureCallbackResult, SimpleTaskInstance,
+                                          correct_maybe_zipped, list_py_file_paths)
 from airflow.utils.db import create_session
 from airflow.utils.state import State
 
@@ -176,6 +180,155 @@ class TestDagFileProcessorManager(unittest.TestCase):
         manager.set_file_paths(['abc.txt'])
         self.assertDictEqual(manager._processors, {'abc.txt': mock_processor})
 
+    def test_file_path_queue_priority(self):
+        file_paths = []
+        for _ in range(4):
+            with tempfile.NamedTemporaryFile(suffix='.py', delete=False) as f:
+                file_paths.append(f.name)
+        changed, slow, quick, no_dags = file_paths
+        manager = DagFileProcessorManager(
+            dag_directory='directory',
+            file_paths=file_paths,
+            max_runs=1,
+            processor_factory=MagicMock().return_value,
+            signal_conn=MagicMock(),
+            stat_queue=MagicMock(),
+            result_queue=MagicMock,
+            async_mode=True)
+
+        for file_path in file_paths:
+            manager._last_mtime[file_path] = os.path.getmtime(file_path)
+            manager._num_dags[file_path] = 1
+        manager._last_mtime[changed] -= 10
+        manager._last_runtime = {changed: 20.0, slow: 10.0, quick: 1.0, no_dags: 0.1}
+        manager._num_dags[no_dags] = 0
+
+        now = timezone.utcnow()
+        for file_path in reversed(file_paths):
+            manager._queue_file_path(file_path, now)
+        self.assertEqual([changed, quick, slow, no_dags],
+                         [manager._pop_file_path() for _ in file_paths])
+        self.assertEqual({}, manager._queued_time)
+
+        for file_path in file_paths:
+            os.remove(file_path)
+
+    def test_failure_callbacks_go_to_next_processor(self):
+        processor_factory = MagicMock()
+        manager = DagFileProcessorManager(
+            dag_directory='directory',
+            file_paths=['abc.txt', 'def.txt'],
+            max_runs=1,
+            processor_factory=processor_factory,
+            signal_conn=MagicMock(),
+            stat_queue=MagicMock(),
+            result_queue=MagicMock,
+            async_mode=True)
+
+        request = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        manager._add_failure_callback(request)
+        # The file is queued right away
+        self.assertEqual(['abc.txt'], [x[2] for x in manager._file_path_queue])
+
+        manager._parallelism = 1
+        manager.heartbeat()
+        processor_factory.assert_called_once_with('abc.txt', [], [request])
+        self.assertEqual({}, manager._failure_callbacks)
+        self.assertEqual({'abc.txt': [request]}, manager._processor_failure_callbacks)
+
+    def test_failure_callbacks_reported_when_handled(self):
+        processor = MagicMock(result=[])
+        result_queue = MagicMock()
+        manager = DagFileProcessorManager(
+            dag_directory='directory',
+            file_paths=['abc.txt', 'def.txt'],
+            max_runs=1,
+            processor_factory=MagicMock(return_value=processor),
+            signal_conn=MagicMock(),
+            stat_queue=MagicMock(),
+            result_queue=result_queue,
+            async_mode=True)
+        manager._parallelism = 1
+
+        request = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        manager._add_failure_callback(request)
+        processor.done = False
+        manager.heartbeat()
+        result_queue.put.assert_not_called()
+
+        processor.done = True
+        manager.heartbeat()
+        result_queue.put.assert_called_once_with(FailureCallbackResult(request, True))
+        self.assertEqual({}, manager._processor_failure_callbacks)
+
+    def test_failure_callbacks_retried_when_processor_fails(self):
+        processors = []
+
+        def processor_factory(file_path, zombies, failure_callbacks):
+            processor = MagicMock(done=False, result=None)
+            processors.append(processor)
+            return processor
+
+        result_queue = MagicMock()
+        manager = DagFileProcessorManager(
+            dag_directory='directory',
+            file_paths=['abc.txt'],
+            max_runs=-1,
+            processor_factory=processor_factory,
+            signal_conn=MagicMock(),
+            stat_queue=MagicMock(),
+            result_queue=result_queue,
+            async_mode=True)
+        manager._parallelism = 1
+
+        request = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        manager._add_failure_callback(request)
+        manager.heartbeat()
+        self.assertEqual(1, len(processors))
+
+        # The next processor of the file gets the callback again
+        processors[-1].done = True
+        manager.heartbeat()
+        self.assertEqual(2, len(processors))
+        self.assertEqual({'abc.txt': [request]}, manager._processor_failure_callbacks)
+        result_queue.put.assert_not_called()
+
+        # Then the scheduler handles it
+        processors[-1].done = True
+        manager.heartbeat()
+        result_queue.put.assert_called_once_with(FailureCallbackResult(request, False))
+        self.assertEqual({}, manager._processor_failure_callbacks)
+        self.assertEqual({}, manager._failure_callbacks)
+
+    def test_failure_callbacks_of_deleted_files_reported(self):
+        result_queue = MagicMock()
+        manager = DagFileProcessorManager(
+            dag_directory='directory',
+            file_paths=['abc.txt', 'def.txt'],
+            max_runs=1,
+            processor_factory=MagicMock(),
+            signal_conn=MagicMock(),
+            stat_queue=MagicMock(),
+            result_queue=result_queue,
+            async_mode=True)
+
+        waiting = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        running = FailureCallbackRequest('def.txt', MagicMock(), 'killed externally')
+        unknown = FailureCallbackRequest('ghi.txt', MagicMock(), 'killed externally')
+        manager._add_failure_callback(waiting)
+        manager._processors['def.txt'] = MagicMock()
+        manager._processor_failure_callbacks['def.txt'] = [running]
+        manager._add_failure_callback(unknown)
+        manager.set_file_paths([])
+
+        result_queue.put.assert_has_calls([
+            mock.call(FailureCallbackResult(unknown, False)),
+            mock.call(FailureCallbackResult(waiting, False)),
+            mock.call(FailureCallbackResult(running, False)),
+        ])
+        self.assertEqual({}, manager._failure_callbacks)
+        self.assertEqual({}, manager._processor_failure_callbacks)
+
     def test_find_zombies(self):
         manager = DagFileProcessorManager(
             dag_directory='directory',
@@ -216,6 +369,55 @@ class TestDagFileProcessorManager(unittest.TestCase):
             session.query(LJ).delete()
 
 
+class TestDagDirectoryWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dag_folder = tempfile.mkdtemp()
+        self.dag_file = os.path.join(self.dag_folder, 'dag.py')
+        self.other_file = os.path.join(self.dag_folder, 'other.py')
+        with open(self.dag_file, 'w') as f:
+            f.write('from airflow import DAG')
+        with open(self.other_file, 'w') as f:
+            f.write('import os')
+
+    def tearDown(self):
+        shutil.rmtree(self.dag_folder)
+
+    def test_list_py_file_paths_stat_cache(self):
+        stat_cache = {}
+        self.assertEqual([self.dag_file], list_py_file_paths(
+            self.dag_folder, include_examples=False, stat_cache=stat_cache))
+        self.assertEqual({self.dag_file, self.other_file}, set(stat_cache))
+        self.assertFalse(stat_cache[self.other_file][2])
+
+        with mock.patch('airflow.utils.dag_processing.open', create=True) as mock_open:
+            self.assertEqual([self.dag_file], list_py_file_paths(
+                self.dag_folder, include_examples=False, stat_cache=stat_cache))
+            mock_open.assert_not_called()
+
+        os.remove(self.other_file)
+        list_py_file_paths(self.dag_folder, include_examples=False,
+                           stat_cache=stat_cache)
+        self.assertEqual({self.dag_file}, set(stat_cache))
+
+    def test_list_file_paths_changed(self):
+        watcher = DagDirectoryWatcher(self.dag_folder)
+        file_paths, changed_file_paths = watcher.list_file_paths()
+        self.assertIn(self.dag_file, file_paths)
+        self.assertEqual([], changed_file_paths)
+
+        new_file = os.path.join(self.dag_folder, 'new_dag.py')
+        with open(new_file, 'w') as f:
+            f.write('from airflow import DAG')
+        with open(self.dag_file, 'a') as f:
+            f.write('\n')
+        file_paths, changed_file_paths = watcher.list_file_paths()
+        self.assertIn(new_file, file_paths)
+        self.assertEqual({self.dag_file, new_file}, set(changed_file_paths))
+
+        file_paths, changed_file_paths = watcher.list_file_paths()
+        self.assertEqual([], changed_file_paths)
+
+
 class TestDagFileProcessorAgent(unittest.TestCase):
     def setUp(self):
         # Make sure that the configure_logging is not cached
@@ -227,6 +429,36 @@ class TestDagFileProcessorAgent(unittest.TestCase):
         for m in [m for m in sys.modules if m not in self.old_modules]:
             del sys.modules[m]
 
+    def test_unhandled_failure_callbacks(self):
+        processor_agent = DagFileProcessorAgent('directory', [], 0, MagicMock(), True)
+        processor_agent._parent_signal_conn = MagicMock()
+        handled = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        unhandled = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        pending = FailureCallbackRequest('abc.txt', MagicMock(), 'killed externally')
+        try:
+            processor_agent.send_failure_callbacks([handled, unhandled, pending])
+            processor_agent._result_queue.put(FailureCallbackResult(handled, True))
+            processor_agent._result_queue.put(FailureCallbackResult(unhandled, False))
+            self.assertEqual([], processor_agent.harvest_simple_dags())
+
+            self.assertEqual([unhandled],
+                             processor_agent.harvest_unhandled_failure_callbacks())
+            self.assertEqual([], processor_agent.harvest_unhandled_failure_callbacks())
+            # E.g. when the manager is terminated
+            self.assertEqual(
+                [pending],
+                processor_agent.harvest_unhandled_failure_callbacks(all_pending=True))
+
+            # Nothing is sent to a manager that exited
+            processor_agent._done = True
+            processor_agent._parent_signal_conn.reset_mock()
+            processor_agent.send_failure_callbacks([pending])
+            processor_agent._parent_signal_conn.send.assert_not_called()
+            self.assertEqual([pending],
+                             processor_agent.harvest_unhandled_failure_callbacks())
+        finally:
+            processor_agent._manager.shutdown()
+
     def test_reload_module(self):
         """
         Configure the context to have core.logging_config_class set to a fake logging
@@ -236,11 +468,12 @@ class TestDagFileProcessorAgent(unittest.TestCase):
         with settings_context(SETTINGS_FILE_VALID):
             # Launch a process through DagFileProcessorAgent, which will try
             # reload the logging module.
-            def processor_factory(file_path, zombies):
+            def processor_factory(file_path, zombies, failure_callbacks):
                 return DagFileProcessor(file_path,
                                         False,
                                         [],
-                                        zombies)
+                                        zombies,
+                                        failure_callbacks)
 
             test_dag_path = os.path.join(TEST_DAG_FOLDER, 'test_scheduler_dags.py')
             async_mode = 'sqlite' not in conf.get('core', 'sql_alchemy_conn')
@@ -276,11 +509,12 @@ class TestDagFileProcessorAgent(unittest.TestCase):
             self.assertFalse(os.path.isfile(log_file_loc))
 
     def test_parse_once(self):
-        def processor_factory(file_path, zombies):
+        def processor_factory(file_path, zombies, failure_callbacks):
             return DagFileProcessor(file_path,
                                     False,
                                     [],
-                                    zombies)
+                                    zombies,
+                                    failure_callbacks)
 
         test_dag_path = os.path.join(TEST_DAG_FOLDER, 'test_scheduler_dags.py')
         async_mode = 'sqlite' not in conf.get('core', 'sql_alchemy_conn')
@@ -300,12 +534,56 @@ class TestDagFileProcessorAgent(unittest.TestCase):
         dag_ids = [result.dag_id for result in parsing_result]
         self.assertEqual(dag_ids.count('test_start_date_scheduling'), 1)
 
+    def test_parse_with_processor_pool(self):
+        processor_pool = DagFileProcessorPool(['airflow.operators.bash_operator'], 1, 0)
+
+        def processor_factory(file_path, zombies, failure_callbacks):
+            return PooledDagFileProcessor(processor_pool,
+                                          file_path,
+                                          False,
+                                          [],
+                                          zombies,
+                                          failure_callbacks)
+
+        test_dag_path = os.path.join(TEST_DAG_FOLDER, 'test_scheduler_dags.py')
+        async_mode = 'sqlite' not in conf.get('core', 'sql_alchemy_conn')
+        processor_agent = DagFileProcessorAgent(test_dag_path,
+                                                [test_dag_path],
+                                                2,
+                                                processor_factory,
+                                                async_mode)
+        processor_agent.start()
+        parsing_result = []
+        while not processor_agent.done:
+            if not async_mode:
+                processor_agent.heartbeat()
+                processor_agent.wait_until_finished()
+            parsing_result.extend(processor_agent.harvest_simple_dags())
+
+        dag_ids = [result.dag_id for result in parsing_result]
+        self.assertEqual(dag_ids.count('test_start_date_scheduling'), 2)
+
+    def test_processor_pool_terminate(self):
+        processor_pool = DagFileProcessorPool([], 0, 0)
+        worker = processor_pool.acquire()
+        # DAG files can start processes of their own
+        self.assertFalse(worker._process.daemon)
+        processor_pool.release(worker)
+        self.assertIs(worker, processor_pool.acquire())
+        processor_pool.release(worker)
+
+        processor_pool.terminate()
+        self.assertFalse(worker.is_alive())
+        self.assertIsNot(worker, processor_pool.acquire())
+        processor_pool.terminate()
+
     def test_launch_process(self):
-        def processor_factory(file_path, zombies):
+        def processor_factory(file_path, zombies, failure_callbacks):
             return DagFileProcessor(file_path,
                                     False,
                                     [],
-                                    zombies)
+                                    zombies,
+                                    failure_callbacks)
 
         test_dag_path = os.path.join(TEST_DAG_FOLDER, 'test_scheduler_dags.py')
         async_mode = 'sqlite' not in conf.get('core', 'sql_alchemy_conn')